@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Dict, Optional, Set
+
+
+ALL = "all"
+
+
+def topic_for(route_id: Optional[str]) -> str:
+    return ALL if not route_id or route_id.strip().lower() == "all" else route_id.strip()
+
+
+class Subscription:
+    def __init__(self, topic: str, maxsize: int) -> None:
+        self.topic = topic
+        self.queue: "asyncio.Queue[bytes]" = asyncio.Queue(maxsize=maxsize)
+        # Set when the subscriber fell too far behind and was dropped
+        self.overflowed = False
+
+
+class Broadcaster:
+    """Fan pre-encoded messages out to subscribers grouped by topic (route or 'all').
+
+    Messages are encoded once per topic by the publisher and the same bytes are
+    queued for every subscriber, so per-client cost is a queue put. A subscriber
+    whose queue fills up is dropped (``overflowed``) rather than slowing the feed;
+    it is expected to reconnect and refetch a snapshot.
+    """
+
+    def __init__(self, queue_size: int = 256) -> None:
+        self.queue_size = max(1, int(queue_size))
+        self._topics: Dict[str, Set[Subscription]] = {}
+        self.published = 0
+        self.dropped = 0
+
+    def subscribe(self, route_id: Optional[str] = None) -> Subscription:
+        sub = Subscription(topic_for(route_id), self.queue_size)
+        self._topics.setdefault(sub.topic, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        subs = self._topics.get(sub.topic)
+        if subs is not None:
+            subs.discard(sub)
+            if not subs:
+                del self._topics[sub.topic]
+
+    def topics(self) -> Set[str]:
+        return set(self._topics)
+
+    def subscriber_count(self) -> int:
+        return sum(len(s) for s in self._topics.values())
+
+    def publish(self, topic: str, message: bytes) -> int:
+        """Queue message for every subscriber of topic; returns subscribers reached."""
+        reached = 0
+        for sub in list(self._topics.get(topic, ())):
+            try:
+                sub.queue.put_nowait(message)
+                reached += 1
+            except asyncio.QueueFull:
+                sub.overflowed = True
+                self.unsubscribe(sub)
+                self.dropped += 1
+        self.published += 1
+        return reached
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": self.subscriber_count(),
+            "topics": len(self._topics),
+            "published": self.published,
+            "dropped": self.dropped,
+        }
@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Hashable, Optional, Tuple
+
+from .config import get_settings
+
+
+# Explicit `ts` values are bucketed so nearby timestamps share one entry
+TS_BUCKET_SEC = 15
+
+
+def normalize_route(route_id: Optional[str]) -> str:
+    """route_id as handlers should query and key it: stripped, or 'All'.
+
+    Handlers pass the result to both ``make_key`` and the compute function, so
+    two spellings that share a cache entry also share the same query.
+    """
+    route = (route_id or "").strip()
+    return "All" if not route or route.lower() == "all" else route
+
+
+def make_key(endpoint: str, window_sec: int, route_id: Optional[str] = None, ts: Optional[datetime] = None) -> Tuple:
+    """Normalized cache key: (endpoint, window seconds, route or 'all', ts bucket or 'now')."""
+    route = normalize_route(route_id)
+    route = "all" if route == "All" else route
+    bucket = "now" if ts is None else int(ts.timestamp()) // TS_BUCKET_SEC
+    return (endpoint, int(window_sec), route, bucket)
+
+
+class ResponseCache:
+    """Thread-safe TTL cache with least-recently-used eviction past max_entries.
+
+    Entries are dropped wholesale by ``clear()`` whenever new data is committed
+    (see ``storage.notify``); the TTL bounds staleness when no notification arrives.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl_sec: float = 10.0) -> None:
+        self.max_entries = max(1, int(max_entries))
+        self.ttl_sec = float(ttl_sec)
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] <= now:
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def peek(self, key: Hashable) -> Optional[Any]:
+        """Like get, but without counting a hit or miss or refreshing recency."""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] <= time.monotonic():
+                return None
+            return item[1]
+
+    def set(self, key: Hashable, value: Any, ttl_sec: Optional[float] = None) -> None:
+        expires = time.monotonic() + (self.ttl_sec if ttl_sec is None else float(ttl_sec))
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> int:
+        with self._lock:
+            n = len(self._data)
+            self._data.clear()
+            self.invalidations += 1
+            return n
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "max_entries": self.max_entries,
+                "ttl_sec": self.ttl_sec,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+_cache: Optional[ResponseCache] = None
+
+
+def get_response_cache() -> ResponseCache:
+    global _cache
+    if _cache is None:
+        s = get_settings()
+        _cache = ResponseCache(max_entries=s.API_CACHE_MAX_ENTRIES, ttl_sec=s.API_CACHE_TTL_SEC)
+    return _cache
@@ -19,10 +19,45 @@ class Settings(BaseSettings):
     # Prefer container mount path; for local host dev set via envs
     MTA_GTFS_STATIC_PATH: str = "/data/gtfs/mta_gtfs_static.zip"
     GTFS_STATIC_DIR: str = "/data/gtfs"
+    # Compiled GTFS index cache (the /data/gtfs mount is read-only for the API)
+    GTFS_CACHE_DIR: str = "/tmp/mta-gtfs-cache"
+    # How often the API checks the static feed for a new drop (0 disables hot reload)
+    GTFS_WATCH_SEC: float = 30.0
 
     # Logging
     LOG_LEVEL: str = "INFO"
 
+    # API response cache (invalidated by NOTIFY scores_changed; TTL bounds staleness)
+    API_CACHE_TTL_SEC: float = 10.0
+    API_CACHE_MAX_ENTRIES: int = 512
+    # Share one in-flight DB query among concurrent identical requests
+    API_COALESCE: bool = True
+    # How long a data watermark (ETag source) is reused before re-querying
+    API_WATERMARK_TTL_SEC: float = 1.0
+    # Serve large bodies as cached orjson bytes instead of validating them through response models
+    API_FAST_JSON: bool = True
+
+    # In-process NumPy store of recent scores (64 bytes/row; 0 disables). Summary,
+    # heatmap and anomalies windows inside HOT_STORE_WINDOW_SEC are answered from it
+    HOT_STORE_ROWS: int = 1_000_000
+    HOT_STORE_WINDOW_SEC: float = 3600.0
+    # Share the store between worker processes: one elected worker refreshes it every
+    # HOT_STORE_POLL_SEC (or on NOTIFY) and publishes a segment in this directory (use a
+    # tmpfs such as /dev/shm) that every worker maps read-only. Empty: a store per process
+    HOT_STORE_SHM_DIR: str = ""
+    HOT_STORE_POLL_SEC: float = 1.0
+    # How long a worker whose watermark is ahead of the segment waits for the leader to
+    # publish before answering from the DB
+    HOT_STORE_CATCHUP_SEC: float = 0.5
+
+    # Live stream (/api/stream): one feed polls for newly scored rows (or is woken by NOTIFY)
+    STREAM_POLL_SEC: float = 2.0
+    STREAM_MIN_SCORE: float = 0.6
+    # Heatmap deltas are aggregated over this window (matches the UI's 60m map)
+    STREAM_WINDOW_SEC: int = 3600
+    STREAM_QUEUE_SIZE: int = 256
+    STREAM_HEARTBEAT_SEC: float = 15.0
+
     class Config:
         env_file = None  # docker-compose passes envs; local can export or use a .env loader
 
@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+import hashlib
+import time
+from typing import Hashable, Optional
+
+from fastapi import Request, Response
+
+from .cache import TS_BUCKET_SEC
+
+
+# Data endpoints: clients may keep the body but must revalidate every time
+REVALIDATE = "no-cache"
+
+
+def make_etag(*parts: object) -> str:
+    """Weak ETag over the repr of parts (request key, data watermark, ...)."""
+    h = hashlib.sha1("|".join(repr(p) for p in parts).encode("utf-8")).hexdigest()[:16]
+    return f'W/"{h}"'
+
+
+def data_etag(key: Hashable, watermark: str, *extra: object, static: Optional[str] = None) -> str:
+    """ETag for a cached query result under the given data watermark.
+
+    Live ("now") windows slide even when no new rows arrive, so their tag also
+    rolls over every TS_BUCKET_SEC; explicit timestamps are already bucketed in key.
+    Bodies that join the GTFS static index (stop names, coordinates) pass its
+    ETag as ``static``, so a feed reload changes their tag too.
+    """
+    live = int(time.time()) // TS_BUCKET_SEC if isinstance(key, tuple) and key and key[-1] == "now" else None
+    if static is not None:
+        extra = extra + (static,)
+    return make_etag(key, watermark, live, *extra)
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Weak comparison of If-None-Match (which may list several tags, or '*') against etag."""
+    header: Optional[str] = request.headers.get("if-none-match")
+    if not header:
+        return False
+    want = etag[2:] if etag.startswith("W/") else etag
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag == "*":
+            return True
+        if (tag[2:] if tag.startswith("W/") else tag) == want:
+            return True
+    return False
+
+
+def not_modified(etag: str, cache_control: str = REVALIDATE) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control})
+
+
+def set_validators(response: Response, etag: str, cache_control: str = REVALIDATE) -> None:
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = cache_control
@@ -0,0 +1,45 @@
+"""Pre-encoded JSON responses for large bodies.
+
+Endpoints keep their response models for the OpenAPI schema, but the hot path
+returns bytes encoded once with orjson and cached next to the query result, so
+a cache hit costs neither pydantic validation nor re-serialization. The bodies
+are built by our own query code, so the models add no safety on this path.
+"""
+from __future__ import annotations
+
+from typing import Any, Callable, Hashable, Optional
+
+import orjson
+from fastapi import Response
+
+from .cache import get_response_cache
+from .etag import REVALIDATE
+from .singleflight import cached_query
+
+
+JSON_MEDIA_TYPE = "application/json"
+
+
+def dumps(obj: Any) -> bytes:
+    return orjson.dumps(obj)
+
+
+def json_response(body: bytes, etag: Optional[str] = None, cache_control: str = REVALIDATE) -> Response:
+    """Response for already-encoded JSON, carrying the endpoint's validators."""
+    headers = {"Cache-Control": cache_control}
+    if etag is not None:
+        headers["ETag"] = etag
+    return Response(content=body, media_type=JSON_MEDIA_TYPE, headers=headers)
+
+
+async def cached_json(key: tuple, fn: Callable[..., Any], *args: Any) -> bytes:
+    """Encoded body of ``cached_query(key, fn, *args)``, itself cached under key + ("json",).
+
+    Encoding is coalesced like the query, so a burst on a cold key encodes once.
+    """
+    json_key: Hashable = key + ("json",)
+    body = get_response_cache().get(json_key)
+    if body is None:
+        obj = await cached_query(key, fn, *args)
+        body = await cached_query(json_key, dumps, obj)
+    return body
@@ -0,0 +1,38 @@
+"""Advisory file locks (flock) for coordinating the API's worker processes.
+
+Locks belong to the open file, so they are released when the holder closes it
+or its process exits; a crashed worker never leaves a stale lock behind.
+"""
+from __future__ import annotations
+
+import fcntl
+import os
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+
+def try_lock(path: str) -> Optional[int]:
+    """Exclusive lock on path without waiting: the open fd to keep, or None if held elsewhere."""
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return None
+    return fd
+
+
+def unlock(fd: int) -> None:
+    fcntl.flock(fd, fcntl.LOCK_UN)
+    os.close(fd)
+
+
+@contextmanager
+def locked(path: str) -> Iterator[None]:
+    """Hold an exclusive lock on path for the block, waiting for other holders."""
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        unlock(fd)
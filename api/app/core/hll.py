@@ -0,0 +1,86 @@
+"""HyperLogLog sketches for approximate distinct counts.
+
+A sketch is 2**HLL_P one-byte registers; adding a value sets one register to
+the maximum of itself and the rank of the value's hash, and the union of two
+sketches is their register-wise maximum. So per-minute sketches can be merged
+over any window, and the estimate's relative error is about 1.04/sqrt(2**p)
+(1.6% for p=12) regardless of how many sketches were merged. Small counts
+(the subway has a few thousand stops and route/stop pairs) fall in the linear
+counting range, where the error is lower still.
+
+Sketches are stored as one precision byte followed by the zlib-compressed
+registers; minute sketches of a thousand values are mostly zero registers.
+"""
+from __future__ import annotations
+
+import hashlib
+import math
+import zlib
+from typing import Iterable, Optional
+
+import numpy as np
+
+
+HLL_P = 12
+
+
+def _hash64(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class HyperLogLog:
+    def __init__(self, p: int = HLL_P, registers: Optional[np.ndarray] = None) -> None:
+        self.p = int(p)
+        self.m = 1 << self.p
+        self.registers = registers if registers is not None else np.zeros(self.m, dtype=np.uint8)
+
+    def add(self, value: str) -> None:
+        h = _hash64(value)
+        idx = h >> (64 - self.p)
+        rest = h & ((1 << (64 - self.p)) - 1)
+        rank = (64 - self.p) - rest.bit_length() + 1
+        if rank > self.registers[idx]:
+            self.registers[idx] = rank
+
+    def update(self, values: Iterable[str]) -> "HyperLogLog":
+        for v in values:
+            self.add(v)
+        return self
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        if other.p != self.p:
+            raise ValueError(f"cannot merge HLL sketches of precision {self.p} and {other.p}")
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def count(self) -> int:
+        m = self.m
+        alpha = 0.7213 / (1.0 + 1.079 / m)
+        estimate = alpha * m * m / float(np.ldexp(1.0, -self.registers.astype(np.int32)).sum())
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            # Linear counting: exact-ish while most registers are still empty
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def to_bytes(self) -> bytes:
+        return bytes([self.p]) + zlib.compress(self.registers.tobytes(), 1)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "HyperLogLog":
+        p = data[0]
+        registers = np.frombuffer(zlib.decompress(data[1:]), dtype=np.uint8).copy()
+        if len(registers) != 1 << p:
+            raise ValueError("corrupt HLL sketch")
+        return cls(p, registers)
+
+
+def merged_count(sketches: Iterable[Optional[bytes]]) -> int:
+    """Estimated distinct count of the union of serialized sketches (None ones skipped)."""
+    union: Optional[HyperLogLog] = None
+    for data in sketches:
+        if not data:
+            continue
+        sk = HyperLogLog.from_bytes(data)
+        union = sk if union is None else union.merge(sk)
+    return union.count() if union is not None else 0
@@ -0,0 +1,107 @@
+"""Minimal Mapbox Vector Tile (v2.1) encoder for point layers.
+
+Only what the heatmap needs: one or more layers of POINT features with
+string/number/bool properties, written straight to protobuf wire format so no
+protobuf runtime or generated code is required.
+"""
+from __future__ import annotations
+
+import struct
+from typing import Any, Dict, Iterable, List, Mapping, Tuple
+
+
+EXTENT = 4096
+
+_GEOM_POINT = 1
+_CMD_MOVE_TO = 1
+
+
+def _varint(n: int) -> bytes:
+    out = bytearray()
+    n &= 0xFFFFFFFFFFFFFFFF
+    while True:
+        b = n & 0x7F
+        n >>= 7
+        if n:
+            out.append(b | 0x80)
+        else:
+            out.append(b)
+            return bytes(out)
+
+
+def _zigzag(n: int) -> int:
+    return (n << 1) ^ (n >> 63)
+
+
+def _key(field: int, wire: int) -> bytes:
+    return _varint((field << 3) | wire)
+
+
+def _bytes_field(field: int, payload: bytes) -> bytes:
+    return _key(field, 2) + _varint(len(payload)) + payload
+
+
+def _uint_field(field: int, n: int) -> bytes:
+    return _key(field, 0) + _varint(n)
+
+
+def _packed(field: int, values: Iterable[int]) -> bytes:
+    return _bytes_field(field, b"".join(_varint(v) for v in values))
+
+
+def _value(v: Any) -> bytes:
+    # Value message: 1 string, 3 double, 4 int64, 5 uint64, 7 bool
+    if isinstance(v, bool):
+        return _uint_field(7, int(v))
+    if isinstance(v, int):
+        return _uint_field(5, v) if v >= 0 else _uint_field(4, v)
+    if isinstance(v, float):
+        return _key(3, 1) + struct.pack("<d", v)
+    return _bytes_field(1, str(v).encode("utf-8"))
+
+
+Point = Tuple[int, int]
+
+
+def encode_layer(name: str, features: List[Tuple[int, Point, Mapping[str, Any]]], extent: int = EXTENT) -> bytes:
+    """Encode a layer of (feature id, (x, y) in tile units, properties) POINT features.
+
+    None-valued properties are omitted; keys and values are deduplicated per layer.
+    """
+    keys: Dict[str, int] = {}
+    values: Dict[Tuple[type, Any], int] = {}
+    encoded_values: List[bytes] = []
+    body = bytearray()
+    body += _uint_field(15, 2)
+    body += _bytes_field(1, name.encode("utf-8"))
+    for fid, (x, y), props in features:
+        tags: List[int] = []
+        for k, v in props.items():
+            if v is None:
+                continue
+            ki = keys.setdefault(k, len(keys))
+            vk = (type(v), v)
+            vi = values.get(vk)
+            if vi is None:
+                vi = values[vk] = len(encoded_values)
+                encoded_values.append(_value(v))
+            tags += (ki, vi)
+        feat = bytearray()
+        if fid is not None:
+            feat += _uint_field(1, fid)
+        if tags:
+            feat += _packed(2, tags)
+        feat += _uint_field(3, _GEOM_POINT)
+        feat += _packed(4, (_CMD_MOVE_TO | (1 << 3), _zigzag(int(x)), _zigzag(int(y))))
+        body += _bytes_field(2, bytes(feat))
+    for k in keys:
+        body += _bytes_field(3, k.encode("utf-8"))
+    for v in encoded_values:
+        body += _bytes_field(4, v)
+    body += _uint_field(5, extent)
+    return bytes(body)
+
+
+def encode_tile(layers: Mapping[str, List[Tuple[int, Point, Mapping[str, Any]]]], extent: int = EXTENT) -> bytes:
+    """Encode a tile from {layer name: features}; empty layers are skipped."""
+    return b"".join(_bytes_field(3, encode_layer(name, feats, extent)) for name, feats in layers.items() if feats)
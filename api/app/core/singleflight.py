@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from .cache import get_response_cache
+from .config import get_settings
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key into one threadpool call.
+
+    The first caller for a key starts the work as a task; callers arriving
+    while it runs await the same task and share its result (or exception).
+    The task is shielded, so a disconnecting client does not cancel the query
+    for everyone else.
+    """
+
+    def __init__(self) -> None:
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    async def do(self, key: Hashable, fn: Callable[..., Any], *args: Any) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(run_in_threadpool(fn, *args))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _t, k=key: self._inflight.pop(k, None))
+            self.leaders += 1
+        else:
+            self.followers += 1
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        return {"inflight": len(self._inflight), "leaders": self.leaders, "followers": self.followers}
+
+
+_group: Optional[SingleFlight] = None
+
+
+def get_flight_group() -> SingleFlight:
+    global _group
+    if _group is None:
+        _group = SingleFlight()
+    return _group
+
+
+def _compute_and_cache(key: Hashable, ttl_sec: Optional[float], fn: Callable[..., Any], *args: Any) -> Any:
+    result = fn(*args)
+    get_response_cache().set(key, result, ttl_sec=ttl_sec)
+    return result
+
+
+async def cached_query(key: Hashable, fn: Callable[..., Any], *args: Any, ttl_sec: Optional[float] = None) -> Any:
+    """Serve key from the response cache, else run fn(*args) once for all concurrent callers.
+
+    fn is synchronous (it runs DB queries) and is executed off the event loop.
+    ttl_sec overrides the cache's default TTL for this entry.
+    """
+    hit = get_response_cache().get(key)
+    if hit is not None:
+        return hit
+    if not get_settings().API_COALESCE:
+        return await run_in_threadpool(_compute_and_cache, key, ttl_sec, fn, *args)
+    return await get_flight_group().do(key, _compute_and_cache, key, ttl_sec, fn, *args)
@@ -0,0 +1,205 @@
+"""Web Mercator tile math and a spatial index of stop coordinates.
+
+Positions are kept as normalized Mercator coordinates (0..1 across the world,
+y growing south), so a tile z/x/y covers [x/2^z, (x+1)/2^z) on both axes and a
+lookup is a range query on the index.
+"""
+from __future__ import annotations
+
+import math
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from .mvt import EXTENT
+
+
+MAX_LAT = 85.0511287798
+# Points this far outside the tile (in tile units) are still drawn, so symbols
+# straddling a tile edge are not cut in half
+TILE_BUFFER = 64
+# Below this zoom, nearby points are merged into clusters
+CLUSTER_MAX_ZOOM = 12
+# Cluster cell size in screen pixels of a 512px tile
+CLUSTER_PX = 48
+# Line simplification tolerance in screen pixels of a 512px tile
+SIMPLIFY_PX = 0.5
+
+BBox = Tuple[float, float, float, float]
+
+
+def lonlat_to_unit(lon: float, lat: float) -> Tuple[float, float]:
+    lat = max(-MAX_LAT, min(MAX_LAT, lat))
+    x = (lon + 180.0) / 360.0
+    s = math.sin(math.radians(lat))
+    y = 0.5 - math.log((1 + s) / (1 - s)) / (4 * math.pi)
+    return x, y
+
+
+def unit_to_lonlat(x: float, y: float) -> Tuple[float, float]:
+    lon = x * 360.0 - 180.0
+    lat = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y))))
+    return lon, lat
+
+
+def tile_bounds(z: int, x: int, y: int, buffer: float = 0.0, extent: int = EXTENT) -> Tuple[float, float, float, float]:
+    """(x0, y0, x1, y1) of a tile in unit coordinates, grown by buffer tile units."""
+    n = float(1 << z)
+    pad = buffer / extent / n
+    return x / n - pad, y / n - pad, (x + 1) / n + pad, (y + 1) / n + pad
+
+
+def parse_bbox(bbox: Optional[str]) -> Optional[BBox]:
+    """'min_lon,min_lat,max_lon,max_lat' -> tuple; None when absent. Raises ValueError if malformed."""
+    if not bbox:
+        return None
+    parts = [float(p) for p in bbox.split(",")]
+    if len(parts) != 4 or parts[0] > parts[2] or parts[1] > parts[3]:
+        raise ValueError("bbox must be min_lon,min_lat,max_lon,max_lat")
+    return parts[0], parts[1], parts[2], parts[3]
+
+
+def simplify_line(points: Sequence[Tuple[float, float]], zoom: float, px: float = SIMPLIFY_PX) -> List[Tuple[float, float]]:
+    """Douglas-Peucker simplification of (lon, lat) points for display at zoom.
+
+    Distances are measured in Mercator space, so a vertex is dropped when it is
+    less than px screen pixels off the simplified line at that zoom.
+    """
+    if len(points) < 3:
+        return list(points)
+    xy = np.array([lonlat_to_unit(lon, lat) for lon, lat in points])
+    tol = px / (512.0 * (2.0 ** zoom))
+    keep = np.zeros(len(xy), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(xy) - 1)]
+    while stack:
+        i, j = stack.pop()
+        if j - i < 2:
+            continue
+        seg = xy[j] - xy[i]
+        rel = xy[i + 1 : j] - xy[i]
+        length = math.hypot(seg[0], seg[1])
+        if length == 0.0:
+            # Closed loop: distance to the shared endpoint
+            dist = np.hypot(rel[:, 0], rel[:, 1])
+        else:
+            dist = np.abs(seg[0] * rel[:, 1] - seg[1] * rel[:, 0]) / length
+        k = int(np.argmax(dist))
+        if dist[k] > tol:
+            k += i + 1
+            keep[k] = True
+            stack.append((i, k))
+            stack.append((k, j))
+    return [points[i] for i in np.nonzero(keep)[0]]
+
+
+def valid_tile(z: int, x: int, y: int) -> bool:
+    return 0 <= z <= 24 and 0 <= x < (1 << z) and 0 <= y < (1 << z)
+
+
+class StopIndex:
+    """Stops sorted by Mercator x for range lookups by tile or bbox.
+
+    Built once from the GTFS stop list; ``query`` bisects on x and filters y,
+    which for a city-sized stop set is a handful of comparisons per tile.
+    """
+
+    def __init__(self, stops: Sequence[Mapping[str, Any]]) -> None:
+        # Stop records by id, so request handlers do not rebuild this dict per call
+        self.by_id: Dict[str, Mapping[str, Any]] = {str(st["stop_id"]): st for st in stops if "stop_id" in st}
+        pts = []
+        for st in stops:
+            try:
+                ux, uy = lonlat_to_unit(float(st["lon"]), float(st["lat"]))
+            except (KeyError, TypeError, ValueError):
+                continue
+            pts.append((ux, uy, str(st["stop_id"])))
+        pts.sort()
+        self.xs: List[float] = [p[0] for p in pts]
+        self.ys: List[float] = [p[1] for p in pts]
+        self.ids: List[str] = [p[2] for p in pts]
+        self.position: Dict[str, int] = {sid: i for i, sid in enumerate(self.ids)}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def query(self, x0: float, y0: float, x1: float, y1: float) -> List[int]:
+        """Indices of stops with x0 <= x < x1 and y0 <= y < y1."""
+        lo = bisect_left(self.xs, x0)
+        hi = bisect_right(self.xs, x1)
+        ys = self.ys
+        return [i for i in range(lo, hi) if y0 <= ys[i] < y1 and self.xs[i] < x1]
+
+    def query_tile(self, z: int, x: int, y: int, buffer: float = TILE_BUFFER) -> List[int]:
+        return self.query(*tile_bounds(z, x, y, buffer))
+
+    def query_bbox(self, bbox: BBox) -> List[int]:
+        min_lon, min_lat, max_lon, max_lat = bbox
+        x0, y1 = lonlat_to_unit(min_lon, min_lat)
+        x1, y0 = lonlat_to_unit(max_lon, max_lat)
+        return self.query(x0, y0, x1, y1)
+
+    def ids_in_bbox(self, bbox: BBox) -> Set[str]:
+        return {self.ids[i] for i in self.query_bbox(bbox)}
+
+    def clusters(self, stop_ids: Iterable[str], zoom: float, cell_px: int = CLUSTER_PX) -> List[List[str]]:
+        """Group stops sharing a cell_px screen-pixel grid square at zoom (512px tiles).
+
+        Unknown stop ids are dropped. Groups come back in a stable order.
+        """
+        scale = 512.0 * (2.0 ** zoom) / cell_px
+        cells: Dict[Tuple[int, int], List[str]] = {}
+        for sid in stop_ids:
+            i = self.position.get(sid)
+            if i is None:
+                continue
+            cells.setdefault((int(self.xs[i] * scale), int(self.ys[i] * scale)), []).append(sid)
+        return [sorted(cells[k]) for k in sorted(cells)]
+
+    def centroid(self, stop_ids: Sequence[str]) -> Tuple[float, float]:
+        """(lon, lat) of the mean Mercator position of the given stops."""
+        pos = [self.position[sid] for sid in stop_ids]
+        return unit_to_lonlat(sum(self.xs[i] for i in pos) / len(pos), sum(self.ys[i] for i in pos) / len(pos))
+
+    def tile_point(self, i: int, z: int, x: int, y: int, extent: int = EXTENT) -> Tuple[int, int]:
+        n = float(1 << z)
+        return int(round((self.xs[i] * n - x) * extent)), int(round((self.ys[i] * n - y) * extent))
+
+
+def cluster_points(
+    points: Iterable[Tuple[int, Tuple[int, int], Mapping[str, Any]]],
+    cell: int,
+    score_key: str = "anomaly_score",
+) -> List[Tuple[int, Tuple[int, int], Dict[str, Any]]]:
+    """Merge points falling in the same cell-sized grid square (tile units).
+
+    Each cluster is drawn at its highest-scoring member and keeps that member's
+    properties, plus ``point_count`` and the mean score of its members.
+    """
+    cells: Dict[Tuple[int, int], List[Tuple[int, Tuple[int, int], Mapping[str, Any]]]] = {}
+    for p in points:
+        (px, py) = p[1]
+        cells.setdefault((px // cell, py // cell), []).append(p)
+    out: List[Tuple[int, Tuple[int, int], Dict[str, Any]]] = []
+    for members in cells.values():
+        best = max(members, key=lambda m: m[2].get(score_key) or 0.0)
+        props = dict(best[2])
+        if len(members) > 1:
+            props["point_count"] = len(members)
+            props[f"{score_key}_mean"] = sum((m[2].get(score_key) or 0.0) for m in members) / len(members)
+        out.append((best[0], best[1], props))
+    return out
+
+
+_index: Optional[StopIndex] = None
+_index_source: Optional[Sequence[Mapping[str, Any]]] = None
+
+
+def get_stop_index(stops: Sequence[Mapping[str, Any]]) -> StopIndex:
+    """Index for the given stop list, rebuilt only when the list object changes."""
+    global _index, _index_source
+    if _index is None or _index_source is not stops:
+        _index = StopIndex(stops)
+        _index_source = stops
+    return _index
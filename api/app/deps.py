@@ -1,3 +1,4 @@
+from functools import lru_cache
 from typing import Generator
 from datetime import timezone
 from zoneinfo import ZoneInfo
@@ -17,6 +18,16 @@ def get_db_session() -> Generator[None, None, None]:
 NY = ZoneInfo("America/New_York")
 
 
+def parse_window(window: str, default_sec: int) -> int:
+    """Query windows like '15m' or '2h' in seconds; default_sec for any other suffix."""
+    s = window.strip().lower()
+    if s.endswith("m"):
+        return int(s[:-1]) * 60
+    if s.endswith("h"):
+        return int(s[:-1]) * 3600
+    return default_sec
+
+
 def serialize_ts(dt):
     """Serialize a tz-aware datetime to canonical fields.
 
@@ -38,20 +49,30 @@ def serialize_ts(dt):
 def ts_pack(dt):
     if dt is None:
         return {"utc": None, "epoch_ms": None, "ny": None}
+    utc, epoch_ms, ny = _ts_fields(dt)
+    return {"utc": utc, "epoch_ms": epoch_ms, "ny": ny}
+
+
+# Rows of one collector poll share observed_ts, so most lookups are hits
+@lru_cache(maxsize=8192)
+def _ts_fields(dt):
     if dt.tzinfo is None:
         dt = dt.replace(tzinfo=timezone.utc)
     dt_utc = dt.astimezone(timezone.utc)
-    return {
-        "utc": dt_utc.isoformat(timespec="seconds").replace("+00:00", "Z"),
-        "epoch_ms": int(dt_utc.timestamp() * 1000),
-        "ny": dt.astimezone(NY).isoformat(timespec="seconds"),
-    }
+    return (
+        dt_utc.isoformat(timespec="seconds").replace("+00:00", "Z"),
+        int(dt_utc.timestamp() * 1000),
+        dt.astimezone(NY).isoformat(timespec="seconds"),
+    )
+
+
+@lru_cache(maxsize=None)
+def _prefixed_keys(prefix: str):
+    return (f"{prefix}_ts_utc", f"{prefix}_ts_epoch_ms", f"{prefix}_ts_ny")
 
 
 def pack_with_prefix(prefix: str, dt):
-    p = ts_pack(dt)
-    return {
-        f"{prefix}_ts_utc": p["utc"],
-        f"{prefix}_ts_epoch_ms": p["epoch_ms"],
-        f"{prefix}_ts_ny": p["ny"],
-    }
+    keys = _prefixed_keys(prefix)
+    if dt is None:
+        return dict.fromkeys(keys)
+    return dict(zip(keys, _ts_fields(dt)))
@@ -0,0 +1,571 @@
+"""Compiled GTFS static index.
+
+The static feed is compiled once into a compact binary file and the API
+memory-maps that file at startup. Compilation streams ``stop_times.txt`` and
+``trips.txt`` to find the routes serving each stop, resolves parent stations
+(platforms such as ``101N``/``101S`` roll up into ``101``), collects the
+route list and simplifies each route's ``shapes.txt`` polylines once per zoom
+level in ``SHAPE_ZOOMS``. The output is keyed by a SHA-1 of the source files, so an
+unchanged feed is never parsed twice. A small memo of (size, mtime) per source
+file skips re-hashing when nothing changed.
+
+Run ``python -m api.app.gtfs`` to precompile the cache ahead of time.
+"""
+from __future__ import annotations
+
+import csv
+import hashlib
+import io
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+import zipfile
+from array import array
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from .core.config import get_settings
+from .core.filelock import locked
+from .core.logging import get_logger
+from .core.tiles import simplify_line
+
+
+MAGIC = b"MTAGTFS\x02"
+# magic, string count, stop count, route-ref count, route count, shape line count, shape point count
+_HEADER = struct.Struct("<8sIIIIII")
+# lat, lon, stop_id, stop_name, parent (NO_REF if none), first route ref, route ref count
+_STOP = struct.Struct("<ddIIIII")
+# route_id, zoom, first point, point count
+_LINE = struct.Struct("<IIII")
+NO_REF = 0xFFFFFFFF
+
+# Zoom levels route shapes are simplified for; a request gets the closest level at or below its zoom
+SHAPE_ZOOMS = (9, 11, 13, 15)
+# Shape points are stored as integer microdegrees (about 0.1 m)
+COORD_SCALE = 1_000_000
+
+SOURCE_FILES = ("stops.txt", "routes.txt", "trips.txt", "stop_times.txt", "shapes.txt")
+_MEMO_FILE = "sources.json"
+
+
+@dataclass
+class GtfsSnapshot:
+    """Immutable view of the compiled feed; replaced as a whole, never mutated."""
+
+    key: str
+    stops: List[Dict]
+    routes: List[str]
+    parent_of: Dict[str, str] = field(default_factory=dict)
+    children_of: Dict[str, List[str]] = field(default_factory=dict)
+    # route_id -> zoom level -> polylines of [lon, lat] points
+    shapes: Dict[str, Dict[int, List[List[List[float]]]]] = field(default_factory=dict)
+    source: Optional[str] = None
+    from_cache: bool = False
+
+    @property
+    def etag(self) -> str:
+        return f'W/"stops-{len(self.stops)}-{self.key[:16]}"'
+
+    def station_of(self, stop_id: str) -> str:
+        return self.parent_of.get(stop_id, stop_id)
+
+    def shape(self, route_id: str, zoom: float) -> Optional[Tuple[int, List[List[List[float]]]]]:
+        """(level, polylines) of a route for zoom, or None when the feed has no shape for it."""
+        levels = self.shapes.get(route_id)
+        if not levels:
+            return None
+        level = max((z for z in levels if z <= zoom), default=min(levels))
+        return level, levels[level]
+
+
+EMPTY = GtfsSnapshot(key="empty", stops=[], routes=[])
+
+
+# --- source files --------------------------------------------------------
+
+
+def resolve_source(zip_path: Optional[str], dir_path: Optional[str]) -> Optional[str]:
+    """The zip if it exists and is valid, else the directory if it has stops.txt."""
+    if zip_path and os.path.exists(zip_path) and zipfile.is_zipfile(zip_path):
+        return zip_path
+    if dir_path and os.path.exists(os.path.join(dir_path, "stops.txt")):
+        return dir_path
+    return None
+
+
+def _source_paths(source: str) -> List[str]:
+    if os.path.isdir(source):
+        return [p for p in (os.path.join(source, n) for n in SOURCE_FILES) if os.path.exists(p)]
+    return [source]
+
+
+@contextmanager
+def _open_member(source: str, filename: str) -> Iterator[Optional[io.TextIOBase]]:
+    if os.path.isdir(source):
+        path = os.path.join(source, filename)
+        if not os.path.exists(path):
+            yield None
+            return
+        with open(path, "r", encoding="utf-8-sig", newline="") as f:
+            yield f
+        return
+    with zipfile.ZipFile(source) as zf:
+        name = next((i.filename for i in zf.infolist() if i.filename.endswith(filename)), None)
+        if name is None:
+            yield None
+            return
+        with zf.open(name, "r") as raw:
+            yield io.TextIOWrapper(raw, encoding="utf-8-sig", newline="")
+
+
+def _rows(source: str, filename: str, columns: Tuple[str, ...]) -> Iterator[Tuple[str, ...]]:
+    """Stream the given columns of a GTFS file as stripped strings ('' if the column is absent)."""
+    with _open_member(source, filename) as f:
+        if f is None:
+            get_logger(__name__).warning("{} not found in {}", filename, source)
+            return
+        reader = csv.reader(f)
+        header = [h.strip() for h in next(reader, [])]
+        idx = [header.index(c) if c in header else -1 for c in columns]
+        for row in reader:
+            yield tuple((row[i].strip() if 0 <= i < len(row) else "") for i in idx)
+
+
+def source_digest(source: str, cache_dir: Optional[str] = None) -> str:
+    """SHA-1 over the source files, reusing the memo in cache_dir when size/mtime match."""
+    paths = _source_paths(source)
+    stats = {p: os.stat(p) for p in paths}
+    memo_path = os.path.join(cache_dir, _MEMO_FILE) if cache_dir else None
+    memo: Dict[str, Dict] = {}
+    if memo_path and os.path.exists(memo_path):
+        try:
+            with open(memo_path, "r", encoding="utf-8") as f:
+                memo = json.load(f)
+        except (OSError, ValueError):
+            memo = {}
+    entry = memo.get(source)
+    fingerprint = [[p, stats[p].st_size, stats[p].st_mtime_ns] for p in paths]
+    if entry and entry.get("files") == fingerprint:
+        return entry["sha1"]
+    h = hashlib.sha1()
+    for p in paths:
+        h.update(os.path.basename(p).encode("utf-8"))
+        with open(p, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+    digest = h.hexdigest()
+    if memo_path:
+        memo[source] = {"files": fingerprint, "sha1": digest}
+        _atomic_write(memo_path, json.dumps(memo).encode("utf-8"))
+    return digest
+
+
+# --- compile -------------------------------------------------------------
+
+
+def compile_source(source: str, key: str) -> GtfsSnapshot:
+    """Parse the feed: stops with routes served, parent stations, route list."""
+    stops: List[Dict] = []
+    seen: Set[str] = set()
+    parent_of: Dict[str, str] = {}
+    for sid, name, lat_s, lon_s, parent in _rows(
+        source, "stops.txt", ("stop_id", "stop_name", "stop_lat", "stop_lon", "parent_station")
+    ):
+        if not sid or sid in seen:
+            continue
+        seen.add(sid)
+        try:
+            lat, lon = float(lat_s), float(lon_s)
+        except ValueError:
+            continue
+        if parent:
+            parent_of[sid] = parent
+        stops.append({"stop_id": sid, "stop_name": name, "lat": lat, "lon": lon, "routes": [], "parent_station": parent or None})
+
+    route_ids = sorted({rid for (rid,) in _rows(source, "routes.txt", ("route_id",)) if rid})
+    trip_route: Dict[str, str] = {}
+    route_shapes: Dict[str, Set[str]] = {}
+    for tid, rid, shape_id in _rows(source, "trips.txt", ("trip_id", "route_id", "shape_id")):
+        if tid and rid:
+            trip_route[tid] = rid
+            if shape_id:
+                route_shapes.setdefault(rid, set()).add(shape_id)
+
+    served: Dict[str, Set[str]] = {}
+    for tid, sid in _rows(source, "stop_times.txt", ("trip_id", "stop_id")):
+        rid = trip_route.get(tid)
+        if rid and sid:
+            served.setdefault(sid, set()).add(rid)
+    # Stations are served by every route calling at any of their platforms
+    for sid, parent in parent_of.items():
+        if sid in served:
+            served.setdefault(parent, set()).update(served[sid])
+    for st in stops:
+        st["routes"] = sorted(served.get(st["stop_id"], ()))
+    if not route_ids:
+        route_ids = sorted({r for rs in served.values() for r in rs})
+
+    shapes = _compile_shapes(source, route_shapes)
+    return _snapshot(key, stops, route_ids, source, from_cache=False, shapes=shapes)
+
+
+def _compile_shapes(source: str, route_shapes: Dict[str, Set[str]]) -> Dict[str, Dict[int, List[List[List[float]]]]]:
+    """Each route's shapes simplified per zoom level; identical simplified lines are kept once.
+
+    Northbound and southbound shapes usually trace the same track in opposite
+    order, so lines are oriented to start at their lower (lon, lat) end before
+    simplifying and comparing.
+    """
+    wanted = {sid for ids in route_shapes.values() for sid in ids}
+    if not wanted:
+        return {}
+    raw: Dict[str, List[Tuple[int, float, float]]] = {}
+    for shape_id, lat_s, lon_s, seq_s in _rows(
+        source, "shapes.txt", ("shape_id", "shape_pt_lat", "shape_pt_lon", "shape_pt_sequence")
+    ):
+        if shape_id not in wanted:
+            continue
+        try:
+            pt = (int(seq_s), float(lon_s), float(lat_s))
+        except ValueError:
+            continue
+        raw.setdefault(shape_id, []).append(pt)
+    lines = {sid: _oriented([(lon, lat) for _seq, lon, lat in sorted(pts)]) for sid, pts in raw.items()}
+    out: Dict[str, Dict[int, List[List[List[float]]]]] = {}
+    for rid in sorted(route_shapes):
+        ids = sorted(sid for sid in route_shapes[rid] if len(lines.get(sid, ())) >= 2)
+        if not ids:
+            continue
+        levels: Dict[int, List[List[List[float]]]] = {}
+        for zoom in SHAPE_ZOOMS:
+            seen: Set[Tuple[int, ...]] = set()
+            kept: List[List[List[float]]] = []
+            for sid in ids:
+                q = tuple(round(v * COORD_SCALE) for pt in simplify_line(lines[sid], zoom) for v in pt)
+                if q not in seen:
+                    seen.add(q)
+                    kept.append(_coords(q))
+            levels[zoom] = kept
+        out[rid] = levels
+    return out
+
+
+def _oriented(line: List[Tuple[float, float]]) -> List[Tuple[float, float]]:
+    return line[::-1] if line[-1] < line[0] else line
+
+
+def _coords(flat) -> List[List[float]]:
+    """[lon, lat] pairs from interleaved integer microdegrees."""
+    return [[flat[i] / COORD_SCALE, flat[i + 1] / COORD_SCALE] for i in range(0, len(flat), 2)]
+
+
+def _snapshot(
+    key: str,
+    stops: List[Dict],
+    routes: List[str],
+    source: Optional[str],
+    from_cache: bool,
+    shapes: Optional[Dict[str, Dict[int, List[List[List[float]]]]]] = None,
+) -> GtfsSnapshot:
+    parent_of = {st["stop_id"]: st["parent_station"] for st in stops if st.get("parent_station")}
+    children_of: Dict[str, List[str]] = {}
+    for child, parent in parent_of.items():
+        children_of.setdefault(parent, []).append(child)
+    for kids in children_of.values():
+        kids.sort()
+    return GtfsSnapshot(
+        key=key,
+        stops=stops,
+        routes=routes,
+        parent_of=parent_of,
+        children_of=children_of,
+        shapes=shapes or {},
+        source=source,
+        from_cache=from_cache,
+    )
+
+
+# --- binary cache --------------------------------------------------------
+
+
+def _atomic_write(path: str, data: bytes) -> None:
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def cache_path(cache_dir: str, key: str) -> str:
+    return os.path.join(cache_dir, f"gtfs-{key[:16]}.bin")
+
+
+def encode_snapshot(snap: GtfsSnapshot) -> bytes:
+    strings: List[bytes] = []
+    index: Dict[str, int] = {}
+
+    def ref(s: Optional[str]) -> int:
+        if s is None:
+            return NO_REF
+        i = index.get(s)
+        if i is None:
+            i = index[s] = len(strings)
+            strings.append(s.encode("utf-8"))
+        return i
+
+    records = bytearray()
+    route_refs = array("I")
+    for st in snap.stops:
+        first = len(route_refs)
+        route_refs.extend(ref(r) for r in st["routes"])
+        records += _STOP.pack(
+            st["lat"], st["lon"], ref(st["stop_id"]), ref(st["stop_name"]), ref(st.get("parent_station")),
+            first, len(st["routes"]),
+        )
+    routes = array("I", (ref(r) for r in snap.routes))
+    line_records = bytearray()
+    points = array("i")
+    n_lines = 0
+    for rid in sorted(snap.shapes):
+        for zoom, lines in sorted(snap.shapes[rid].items()):
+            for line in lines:
+                line_records += _LINE.pack(ref(rid), zoom, len(points) // 2, len(line))
+                points.extend(round(v * COORD_SCALE) for pt in line for v in pt)
+                n_lines += 1
+    offsets = array("I", [0])
+    for s in strings:
+        offsets.append(offsets[-1] + len(s))
+    header = _HEADER.pack(MAGIC, len(strings), len(snap.stops), len(route_refs), len(routes), n_lines, len(points) // 2)
+    # Arrays are native-endian; the cache lives next to the process that wrote it
+    return (
+        header + offsets.tobytes() + b"".join(strings) + bytes(records) + route_refs.tobytes() + routes.tobytes()
+        + bytes(line_records) + points.tobytes()
+    )
+
+
+def decode_snapshot(buf, key: str, source: Optional[str] = None) -> GtfsSnapshot:
+    magic, n_str, n_stops, n_refs, n_routes, n_lines, n_points = _HEADER.unpack_from(buf, 0)
+    if magic != MAGIC:
+        raise ValueError("not a compiled GTFS cache")
+    pos = _HEADER.size
+
+    def u32s(n: int) -> array:
+        nonlocal pos
+        out = array("I")
+        out.frombytes(buf[pos : pos + 4 * n])
+        pos += 4 * n
+        return out
+
+    offsets = u32s(n_str + 1)
+    blob = buf[pos : pos + offsets[n_str]]
+    strings = [blob[offsets[i] : offsets[i + 1]].decode("utf-8") for i in range(n_str)]
+    pos += offsets[n_str]
+    raw_stops = list(_STOP.iter_unpack(buf[pos : pos + _STOP.size * n_stops]))
+    pos += _STOP.size * n_stops
+    refs = u32s(n_refs)
+    route_list = [strings[i] for i in u32s(n_routes)]
+    raw_lines = list(_LINE.iter_unpack(buf[pos : pos + _LINE.size * n_lines]))
+    pos += _LINE.size * n_lines
+    points = array("i")
+    points.frombytes(buf[pos : pos + 8 * n_points])
+    shapes: Dict[str, Dict[int, List[List[List[float]]]]] = {}
+    for rid, zoom, first, count in raw_lines:
+        line = _coords(points[2 * first : 2 * (first + count)])
+        shapes.setdefault(strings[rid], {}).setdefault(zoom, []).append(line)
+    stops = []
+    for lat, lon, sid, name, parent, first, count in raw_stops:
+        stops.append(
+            {
+                "stop_id": strings[sid],
+                "stop_name": strings[name],
+                "lat": lat,
+                "lon": lon,
+                "routes": [strings[refs[j]] for j in range(first, first + count)],
+                "parent_station": None if parent == NO_REF else strings[parent],
+            }
+        )
+    return _snapshot(key, stops, route_list, source, from_cache=True, shapes=shapes)
+
+
+def load_cached(path: str, key: str, source: Optional[str] = None) -> GtfsSnapshot:
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        return decode_snapshot(mm, key, source)
+
+
+def _load_compiled(path: Optional[str], key: str, source: str, t0: float) -> Optional[GtfsSnapshot]:
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        snap = load_cached(path, key, source)
+    except (OSError, ValueError, struct.error) as e:
+        get_logger(__name__).warning("ignoring unreadable GTFS cache {}: {}", path, repr(e))
+        return None
+    get_logger(__name__).info(
+        "loaded compiled GTFS {} ({} stops) in {:.1f}ms", path, len(snap.stops), (time.perf_counter() - t0) * 1000
+    )
+    return snap
+
+
+def build_snapshot(source: Optional[str], cache_dir: Optional[str]) -> GtfsSnapshot:
+    """Load the compiled index for source, compiling and caching it on a miss."""
+    log = get_logger(__name__)
+    if source is None:
+        log.warning("no GTFS static feed found; stops and static routes are empty")
+        return EMPTY
+    t0 = time.perf_counter()
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+    key = source_digest(source, cache_dir)
+    path = cache_path(cache_dir, key) if cache_dir else None
+    snap = _load_compiled(path, key, source, t0)
+    if snap is not None:
+        return snap
+    if not path:
+        snap = compile_source(source, key)
+    else:
+        # Workers starting together (or seeing the same new drop) queue here; the first
+        # compiles and the rest load its output, so stop_times.txt is parsed once per host
+        with locked(f"{path}.lock"):
+            snap = _load_compiled(path, key, source, t0)
+            if snap is not None:
+                return snap
+            snap = compile_source(source, key)
+            try:
+                _atomic_write(path, encode_snapshot(snap))
+            except OSError as e:
+                log.warning("could not write GTFS cache {}: {}", path, repr(e))
+    log.info("compiled GTFS {} ({} stops, {} routes) in {:.0f}ms", source, len(snap.stops), len(snap.routes), (time.perf_counter() - t0) * 1000)
+    return snap
+
+
+_snapshot_current: Optional[GtfsSnapshot] = None
+_reload_callbacks: List[Callable[[GtfsSnapshot], None]] = []
+_watcher: Optional["GtfsWatcher"] = None
+_load_lock = threading.Lock()
+
+
+def _configured_source() -> Optional[str]:
+    s = get_settings()
+    return resolve_source(s.MTA_GTFS_STATIC_PATH, s.GTFS_STATIC_DIR)
+
+
+def load_gtfs() -> GtfsSnapshot:
+    """(Re)build the snapshot from the configured paths and make it current."""
+    with _load_lock:
+        snap = build_snapshot(_configured_source(), get_settings().GTFS_CACHE_DIR or None)
+        _swap(snap)
+    return snap
+
+
+def _swap(snap: GtfsSnapshot) -> None:
+    # A single reference assignment: readers see either the old snapshot or the new one
+    global _snapshot_current
+    previous = _snapshot_current
+    _snapshot_current = snap
+    if previous is not None and previous.key != snap.key:
+        for cb in list(_reload_callbacks):
+            try:
+                cb(snap)
+            except Exception as e:
+                get_logger(__name__).warning("gtfs reload callback error: {}", repr(e))
+
+
+def get_gtfs() -> GtfsSnapshot:
+    snap = _snapshot_current
+    return snap if snap is not None else load_gtfs()
+
+
+def add_reload_listener(callback: Callable[[GtfsSnapshot], None]) -> None:
+    """Register callback(new_snapshot) to run after a changed feed is swapped in."""
+    if callback not in _reload_callbacks:
+        _reload_callbacks.append(callback)
+
+
+def source_fingerprint(source: Optional[str]) -> Tuple:
+    """Cheap change marker: the resolved source plus (path, size, mtime) of its files."""
+    if source is None:
+        return (None,)
+    try:
+        return (source,) + tuple((p, st.st_size, st.st_mtime_ns) for p in _source_paths(source) for st in (os.stat(p),))
+    except OSError:
+        return (source, "unreadable")
+
+
+class GtfsWatcher(threading.Thread):
+    """Polls the configured GTFS source and swaps in a rebuilt snapshot when it changes.
+
+    A change must look the same on two consecutive checks before it is loaded, so
+    a feed that is still being copied in is not parsed half-written. Compilation
+    runs on this thread; requests keep using the previous snapshot until the swap.
+    """
+
+    def __init__(self, interval_sec: float) -> None:
+        super().__init__(name="gtfs-watcher", daemon=True)
+        self.interval_sec = interval_sec
+        self._stopping = threading.Event()
+        snap = _snapshot_current
+        self._loaded = source_fingerprint(snap.source if snap is not None else _configured_source())
+        self._pending: Optional[Tuple] = None
+        self.reloads = 0
+
+    def stop(self) -> None:
+        self._stopping.set()
+
+    def check_once(self) -> bool:
+        """One poll; returns True when a new snapshot was swapped in."""
+        current = source_fingerprint(_configured_source())
+        if current == self._loaded:
+            self._pending = None
+            return False
+        if current != self._pending:
+            self._pending = current
+            return False
+        log = get_logger(__name__)
+        try:
+            snap = load_gtfs()
+        except Exception as e:
+            # Keep serving the old snapshot; retry on the next change
+            log.warning("gtfs reload failed, keeping previous index: {}", repr(e))
+            self._pending = None
+            return False
+        self._loaded, self._pending = current, None
+        self.reloads += 1
+        log.info("gtfs reloaded: {} stops, {} routes (key {})", len(snap.stops), len(snap.routes), snap.key[:16])
+        return True
+
+    def run(self) -> None:
+        while not self._stopping.wait(self.interval_sec):
+            try:
+                self.check_once()
+            except Exception as e:
+                get_logger(__name__).warning("gtfs watcher error: {}", repr(e))
+
+
+def start_gtfs_watcher() -> bool:
+    """Start the background watcher once; False when disabled (GTFS_WATCH_SEC <= 0)."""
+    global _watcher
+    interval = get_settings().GTFS_WATCH_SEC
+    if interval <= 0:
+        return False
+    if _watcher is None or not _watcher.is_alive():
+        _watcher = GtfsWatcher(interval)
+        _watcher.start()
+    return True
+
+
+def stop_gtfs_watcher() -> None:
+    if _watcher is not None:
+        _watcher.stop()
+
+
+def main() -> int:
+    snap = load_gtfs()
+    print(json.dumps({"key": snap.key, "stops": len(snap.stops), "routes": len(snap.routes), "source": snap.source}))
+    return 0 if snap is not EMPTY else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,14 +1,21 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from .core.cache import get_response_cache
 from .core.logging import get_logger
+from .gtfs import add_reload_listener, start_gtfs_watcher
 from .routers import health, stops, heatmap
 from .routers import routes as routes_router
 from .routers import summary as summary_router
 from .routers import anomalies as anomalies_router
+from .routers import stream as stream_router
+from .routers import dashboard as dashboard_router
 from .routers.stops import prime_stops_cache
 from .models.base import Base
+from .storage.hotstore import start_hot_store, stop_hot_store
+from .storage.notify import add_listener, start_listener
 from .storage.session import get_engine
+from .storage.stations import sync_stop_stations
 
 
 app = FastAPI(title="mta-subway-anomaly-scan", version="0.1.0")
@@ -26,6 +33,8 @@ app.include_router(heatmap.router, prefix="/api")
 app.include_router(routes_router.router, prefix="/api")
 app.include_router(summary_router.router, prefix="/api")
 app.include_router(anomalies_router.router, prefix="/api")
+app.include_router(stream_router.router, prefix="/api")
+app.include_router(dashboard_router.router, prefix="/api")
 
 # CORS for local UI dev (broader to avoid mismatches)
 app.add_middleware(
@@ -34,12 +43,30 @@ app.add_middleware(
     allow_credentials=False,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor"],
 )
 
 
+def _invalidate_response_cache(_payload) -> None:
+    # Drop cached responses whenever the collector/trainer commit new scores,
+    # or a new GTFS static drop changes stop names/geometry
+    get_response_cache().clear()
+
+
 @app.on_event("startup")
 def on_startup() -> None:
     # Minimal MVP: ensure tables exist
     Base.metadata.create_all(bind=get_engine())
     get_logger(__name__).info("startup complete; tables ensured")
     prime_stops_cache()
+    add_listener(_invalidate_response_cache)
+    start_listener()
+    add_reload_listener(_invalidate_response_cache)
+    add_reload_listener(sync_stop_stations)
+    start_gtfs_watcher()
+    start_hot_store()
+
+
+@app.on_event("shutdown")
+def on_shutdown() -> None:
+    stop_hot_store()
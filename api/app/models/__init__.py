@@ -1,4 +1,22 @@
 from .base import Base
-from .scores import Score
+from .baselines import SeasonalBaseline
+from .checkpoints import BackfillCheckpoint, TrainerCheckpoint
+from .drift_events import DriftEvent
+from .rollups import ScoreRollup
+from .scores import HIGH_SCORE, SCORING_DONE, SCORING_PENDING, SCORING_SKIPPED, Score
+from .stations import StopStation
 
-__all__ = ["Base", "Score"]
+__all__ = [
+    "BackfillCheckpoint",
+    "Base",
+    "DriftEvent",
+    "HIGH_SCORE",
+    "SCORING_DONE",
+    "SCORING_PENDING",
+    "SCORING_SKIPPED",
+    "Score",
+    "ScoreRollup",
+    "SeasonalBaseline",
+    "StopStation",
+    "TrainerCheckpoint",
+]
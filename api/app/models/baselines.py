@@ -0,0 +1,30 @@
+from __future__ import annotations
+
+from datetime import datetime
+from sqlalchemy import DateTime, Float, SmallInteger, String
+from sqlalchemy.sql import func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .base import Base
+
+
+class SeasonalBaseline(Base):
+    """Long-horizon headway baseline per (route, stop, day-type, 15-minute slot).
+
+    Maintained incrementally by the trainer with exponentially decayed robust
+    statistics (winsorized location + mean absolute deviation).
+    """
+
+    __tablename__ = "seasonal_baselines"
+
+    route_id: Mapped[str] = mapped_column(String, primary_key=True)
+    stop_id: Mapped[str] = mapped_column(String, primary_key=True)
+    # "wkd" | "sat" | "sun" in America/New_York local time
+    day_type: Mapped[str] = mapped_column(String(3), primary_key=True)
+    # 15-minute slot of the local day (0..95)
+    slot: Mapped[int] = mapped_column(SmallInteger, primary_key=True)
+    # Decayed number of observations folded into the statistics
+    weight: Mapped[float] = mapped_column(Float, nullable=False, default=0.0)
+    median: Mapped[float] = mapped_column(Float, nullable=False)
+    mad: Mapped[float] = mapped_column(Float, nullable=False, default=0.0)
+    updated_ts: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, server_default=func.now())
@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+from datetime import datetime
+from sqlalchemy import BigInteger, DateTime, Integer, LargeBinary, String
+from sqlalchemy.sql import func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .base import Base
+
+
+class TrainerCheckpoint(Base):
+    """Highest scores.id a trainer partition has scored, committed with its updates."""
+
+    __tablename__ = "trainer_checkpoints"
+
+    partition: Mapped[int] = mapped_column(Integer, primary_key=True)
+    partitions: Mapped[int] = mapped_column(Integer, primary_key=True)
+    last_id: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    updated_ts: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+
+class BackfillCheckpoint(Base):
+    """Where a named backfill run stopped, committed with the chunk it covers.
+
+    ``models`` is the pickled model state (regressor, HalfSpaceTrees, drift bank,
+    last arrival per key) as of (observed_ts, last_id).
+    """
+
+    __tablename__ = "backfill_checkpoints"
+
+    name: Mapped[str] = mapped_column(String, primary_key=True)
+    observed_ts: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    last_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    rows: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    scored: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    models: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+    updated_ts: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, server_default=func.now(), onupdate=func.now()
+    )
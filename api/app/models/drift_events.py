@@ -0,0 +1,24 @@
+from __future__ import annotations
+
+from datetime import datetime
+from sqlalchemy import BigInteger, DateTime, Float, Index, Integer, String
+from sqlalchemy.sql import func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .base import Base
+
+
+class DriftEvent(Base):
+    """One ADWIN change detection on the absolute residuals of a (route, stop)."""
+
+    __tablename__ = "drift_events"
+
+    id: Mapped[int] = mapped_column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    detected_ts: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    route_id: Mapped[str] = mapped_column(String, nullable=False)
+    stop_id: Mapped[str] = mapped_column(String, nullable=False)
+    # ADWIN window width and mean |residual| estimate right after the change
+    width: Mapped[int] = mapped_column(Integer, nullable=True)
+    estimation: Mapped[float] = mapped_column(Float, nullable=True)
+
+Index("ix_drift_events_detected_ts", DriftEvent.detected_ts)
@@ -0,0 +1,29 @@
+from __future__ import annotations
+
+from datetime import datetime
+from sqlalchemy import BigInteger, DateTime, LargeBinary
+from sqlalchemy.sql import func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .base import Base
+
+
+class ScoreRollup(Base):
+    """Per-minute rollup of ingested scores, written by the collector with the rows.
+
+    ``stops_hll`` and ``pairs_hll`` are HyperLogLog sketches (``core.hll``) of
+    the distinct stop_ids and of the distinct route:stop pairs with a headway;
+    merged over a window they give the summary's stations_total and
+    trains_active without a distinct count over raw rows.
+    """
+
+    __tablename__ = "score_rollups"
+
+    # observed_ts truncated to the minute (UTC)
+    bucket_ts: Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True)
+    rows: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    stops_hll: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+    pairs_hll: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+    updated_ts: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, server_default=func.now(), onupdate=func.now()
+    )
@@ -1,13 +1,22 @@
 from __future__ import annotations
 
 from datetime import datetime
-from sqlalchemy import DateTime, Float, Index, BigInteger, String, Integer
+from sqlalchemy import DateTime, Float, Index, BigInteger, SmallInteger, String, Integer
 from sqlalchemy.sql import func
 from sqlalchemy.orm import Mapped, mapped_column
 
 from .base import Base
 
 
+# Score.scoring_state values
+SCORING_PENDING = 0  # ingested, waiting for the trainer
+SCORING_DONE = 1  # residual/anomaly_score written by the trainer
+SCORING_SKIPPED = 2  # nothing to score (no headway for this arrival)
+
+# Rows at or above this score are also in the partial ix_scores_high_feed index
+HIGH_SCORE = 0.85
+
+
 class Score(Base):
     __tablename__ = "scores"
 
@@ -19,8 +28,47 @@ class Score(Base):
     route_id: Mapped[str] = mapped_column(String, nullable=False)
     stop_id: Mapped[str] = mapped_column(String, nullable=False)
     anomaly_score: Mapped[float] = mapped_column(Float, nullable=False)
+    # Model residual (actual - expected headway); NULL until scored
     residual: Mapped[float] = mapped_column(Float, nullable=True)
     window_sec: Mapped[int] = mapped_column(Integer, nullable=True)
+    # Observed headway against the previous arrival at this (route, stop), as ingested
+    headway_sec: Mapped[float] = mapped_column(Float, nullable=True)
+    scoring_state: Mapped[int] = mapped_column(SmallInteger, nullable=False, default=SCORING_PENDING, server_default="0")
+    scored_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=True)
 
 Index("ix_scores_observed_ts_route_stop", Score.observed_ts, Score.route_id, Score.stop_id)
 Index("ix_scores_observed_ts", Score.observed_ts)
+# Work queue: only pending rows are indexed, so the index stays small however long the table grows
+Index(
+    "ix_scores_pending",
+    Score.observed_ts,
+    Score.id,
+    postgresql_where=Score.scoring_state == SCORING_PENDING,
+    sqlite_where=Score.scoring_state == SCORING_PENDING,
+)
+Index("ix_scores_scored_at", Score.scored_at)
+# Anomalies feed, newest first with id as tie-break: a keyset page is one index range
+# scan. INCLUDE columns (Postgres) let it be answered from the index alone.
+_FEED_COLUMNS = ["route_id", "stop_id", "anomaly_score", "residual", "event_ts"]
+Index(
+    "ix_scores_feed",
+    Score.observed_ts.desc(),
+    Score.id.desc(),
+    postgresql_include=_FEED_COLUMNS,
+)
+Index(
+    "ix_scores_route_feed",
+    Score.route_id,
+    Score.observed_ts.desc(),
+    Score.id.desc(),
+    postgresql_include=[c for c in _FEED_COLUMNS if c != "route_id"],
+)
+Index("ix_scores_stop_feed", Score.stop_id, Score.observed_ts.desc(), Score.id.desc())
+Index(
+    "ix_scores_high_feed",
+    Score.observed_ts.desc(),
+    Score.id.desc(),
+    postgresql_include=_FEED_COLUMNS,
+    postgresql_where=Score.anomaly_score >= HIGH_SCORE,
+    sqlite_where=Score.anomaly_score >= HIGH_SCORE,
+)
@@ -0,0 +1,20 @@
+from __future__ import annotations
+
+from sqlalchemy import String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .base import Base
+
+
+class StopStation(Base):
+    """Platform stop_id -> parent station from the GTFS index, for station-level GROUP BYs.
+
+    Rewritten whenever the loaded feed (``gtfs_key``) changes; stops without a
+    parent have no row and stand for themselves.
+    """
+
+    __tablename__ = "stop_stations"
+
+    stop_id: Mapped[str] = mapped_column(String, primary_key=True)
+    station_id: Mapped[str] = mapped_column(String, nullable=False)
+    gtfs_key: Mapped[str] = mapped_column(String, nullable=False)
@@ -1,16 +1,25 @@
 from __future__ import annotations
 
 from datetime import datetime, timedelta, timezone
-from typing import List, Dict
+from typing import Dict, List, Literal, Mapping, Optional, Tuple
 
-from fastapi import APIRouter, Query
+from fastapi import APIRouter, HTTPException, Query, Request, Response
 from pydantic import BaseModel
-from sqlalchemy import select
+from sqlalchemy import func, literal_column, select, tuple_, union_all
 from sqlalchemy.orm import sessionmaker
 
-from ..models import Score
-from ..deps import pack_with_prefix
+from ..core.cache import make_key
+from ..core.config import get_settings
+from ..core.etag import data_etag, etag_matches, not_modified, set_validators
+from ..core.fastjson import cached_json, dumps, json_response
+from ..core.singleflight import cached_query
+from ..core.tiles import get_stop_index
+from ..models import HIGH_SCORE, SCORING_DONE, Score
+from ..deps import pack_with_prefix, parse_window
+from ..gtfs import get_gtfs
+from ..storage.hotstore import get_hot_store
 from ..storage.session import get_engine
+from ..storage.watermark import data_watermark
 from .stops import _load_stops
 
 
@@ -31,52 +40,246 @@ class AnomalyItem(BaseModel):
     event_ts_ny: str | None = None
 
 
-def _parse_window(window: str) -> int:
-    s = window.strip().lower()
-    if s.endswith("m"):
-        return int(s[:-1]) * 60
-    if s.endswith("h"):
-        return int(s[:-1]) * 3600
-    return 15 * 60
+class TopStopItem(BaseModel):
+    route_id: str
+    stop_id: str
+    stop_name: str | None = None
+    # The ranking score (average or peak, per ``by``)
+    anomaly_score: float
+    anomaly_score_avg: float
+    anomaly_score_max: float
+    count: int
+    # Latest observation of the pair in the window
+    observed_ts_utc: str | None = None
+    observed_ts_epoch_ms: int | None = None
+    observed_ts_ny: str | None = None
+
+
+DEFAULT_WINDOW_SEC = 15 * 60
+PAGE_SIZE = 200
+MAX_PAGE_SIZE = 1000
+MAX_TOP_K = 100
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def _split(value: Optional[str]) -> List[str]:
+    """Comma-separated filter values; empty (no filter) for None or 'All'."""
+    if not value or value.strip().lower() == "all":
+        return []
+    return sorted({v.strip() for v in value.split(",") if v.strip()})
+
+
+def make_cursor(observed_ts: datetime, row_id: int) -> str:
+    """Opaque keyset cursor: observed_ts in epoch microseconds and the row id."""
+    if observed_ts.tzinfo is None:
+        observed_ts = observed_ts.replace(tzinfo=timezone.utc)
+    return f"{(observed_ts - _EPOCH) // timedelta(microseconds=1)}.{row_id}"
+
+
+def _parse_cursor(cursor: Optional[str]) -> Optional[Tuple[datetime, int]]:
+    if not cursor:
+        return None
+    try:
+        us, row_id = (int(p) for p in cursor.split("."))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="invalid cursor")
+    return _EPOCH + timedelta(microseconds=us), row_id
 
 
 @router.get("", response_model=List[AnomalyItem])
-async def list_anomalies(window: str = Query(default="15m"), route_id: str = Query(default="All")) -> List[Dict]:
-    seconds = _parse_window(window)
-    since = datetime.now(timezone.utc) - timedelta(seconds=seconds)
-    engine = get_engine()
-    SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+async def list_anomalies(
+    request: Request,
+    response: Response,
+    window: str = Query(default="15m"),
+    route_id: str = Query(default="All", description="route, comma-separated routes, or All"),
+    stop_id: Optional[str] = Query(default=None, description="stop or comma-separated stops"),
+    min_score: Optional[float] = Query(default=None, ge=0.0, le=1.0),
+    limit: int = Query(default=PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(default=None, description="X-Next-Cursor of the previous page"),
+):
+    """Newest anomalies first, one page at a time.
 
-    with SessionLocal() as session:
-        stmt = (
-            select(
-                Score.observed_ts,
-                Score.event_ts,
-                Score.route_id,
-                Score.stop_id,
-                Score.anomaly_score,
-                Score.residual,
-            )
-            .where(Score.observed_ts >= since)
+    When more rows match, the ``X-Next-Cursor`` header carries the cursor of the
+    next page; pass it back as ``cursor`` with the same filters.
+    """
+    seconds = parse_window(window, DEFAULT_WINDOW_SEC)
+    routes, stops = _split(route_id), _split(stop_id)
+    after = _parse_cursor(cursor)
+    key = make_key("anomalies", seconds, ",".join(routes) or None)
+    page_args = (tuple(stops), min_score, limit, cursor)
+    watermark = await data_watermark()
+    gtfs = get_gtfs()
+    etag = data_etag(key, watermark, *page_args, static=gtfs.etag)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    cache_key = key + (watermark, gtfs.key) + page_args
+    page = await cached_query(cache_key, _compute_anomalies, seconds, routes, stops, min_score, limit, after)
+    next_cursor = page["next_cursor"]
+    if get_settings().API_FAST_JSON:
+        out = json_response(await cached_query(cache_key + ("json",), dumps, page["items"]), etag)
+        if next_cursor:
+            out.headers[NEXT_CURSOR_HEADER] = next_cursor
+        return out
+    set_validators(response, etag)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return page["items"]
+
+
+@router.get("/top", response_model=List[TopStopItem])
+async def top_stops(
+    request: Request,
+    response: Response,
+    window: str = Query(default="60m"),
+    route_id: str = Query(default="All", description="route, comma-separated routes, or All"),
+    k: int = Query(default=20, ge=1, le=MAX_TOP_K),
+    by: Literal["avg", "max"] = Query(default="avg", description="rank by average or peak anomaly score"),
+    min_count: int = Query(default=1, ge=1, description="ignore pairs with fewer scored rows"),
+):
+    """The k worst (route, stop) pairs in the window, worst first."""
+    seconds = parse_window(window, DEFAULT_WINDOW_SEC)
+    routes = _split(route_id)
+    key = make_key("anomalies-top", seconds, ",".join(routes) or None)
+    args = (k, by, min_count)
+    watermark = await data_watermark()
+    gtfs = get_gtfs()
+    etag = data_etag(key, watermark, *args, static=gtfs.etag)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    cache_key = key + (watermark, gtfs.key) + args
+    if get_settings().API_FAST_JSON:
+        return json_response(await cached_json(cache_key, _compute_top, seconds, routes, k, by, min_count), etag)
+    set_validators(response, etag)
+    return await cached_query(cache_key, _compute_top, seconds, routes, k, by, min_count)
+
+
+def _compute_top(seconds: int, routes: List[str], k: int, by: str, min_count: int) -> List[Dict]:
+    """Top k (route, stop) aggregates, ranked in the database.
+
+    ORDER BY ... LIMIT k over the grouped window lets Postgres keep a k-sized
+    top-N heap instead of sorting every group, so the cost is O(n log k) and the
+    result size does not grow with the window.
+    """
+    since = datetime.now(timezone.utc) - timedelta(seconds=seconds)
+    avg_score = func.avg(Score.anomaly_score).label("avg_score")
+    max_score = func.max(Score.anomaly_score).label("max_score")
+    count = func.count(Score.id).label("n")
+    rank = avg_score if by == "avg" else max_score
+    stmt = (
+        select(
+            Score.route_id,
+            Score.stop_id,
+            avg_score,
+            max_score,
+            count,
+            func.max(Score.observed_ts).label("last_observed_ts"),
         )
-        if route_id and route_id.lower() != "all":
-            stmt = stmt.where(Score.route_id == route_id)
-        stmt = stmt.order_by(Score.observed_ts.desc()).limit(200)
+        .where(Score.observed_ts >= since)
+        # Pending and skipped rows carry a placeholder 0.0 score
+        .where(Score.scoring_state == SCORING_DONE)
+        .group_by(Score.route_id, Score.stop_id)
+    )
+    if len(routes) == 1:
+        stmt = stmt.where(Score.route_id == routes[0])
+    elif routes:
+        stmt = stmt.where(Score.route_id.in_(routes))
+    if min_count > 1:
+        stmt = stmt.having(count >= min_count)
+    stmt = stmt.order_by(rank.desc(), count.desc(), Score.route_id, Score.stop_id).limit(k)
+    SessionLocal = sessionmaker(bind=get_engine(), autoflush=False, autocommit=False, future=True)
+    with SessionLocal() as session:
         rows = session.execute(stmt).all()
 
-    stops = {s["stop_id"]: s for s in _load_stops()}
+    by_id = get_stop_index(_load_stops()).by_id
     out: List[Dict] = []
-    for observed_ts, event_ts, r, sid, score, res in rows:
-        name = stops.get(sid, {}).get("stop_name")
+    for r, sid, avg_s, max_s, n, last_ts in rows:
         item: Dict = {
             "route_id": r,
             "stop_id": sid,
-            "stop_name": name,
-            "anomaly_score": float(score) if score is not None else None,
-            "residual": float(res) if res is not None else None,
+            "stop_name": by_id.get(sid, {}).get("stop_name"),
+            "anomaly_score": float(avg_s if by == "avg" else max_s),
+            "anomaly_score_avg": float(avg_s),
+            "anomaly_score_max": float(max_s),
+            "count": int(n),
         }
-        # Canonical observed/event packs
-        item.update(pack_with_prefix("observed", observed_ts))
-        item.update(pack_with_prefix("event", event_ts))
+        item.update(pack_with_prefix("observed", last_ts))
         out.append(item)
     return out
+
+
+def _feed_select(since: datetime, route: Optional[str], stops: List[str], min_score: Optional[float], after, limit: int):
+    """One keyset page for a single route (or all routes): a range scan of a feed index."""
+    stmt = select(
+        Score.id,
+        Score.observed_ts,
+        Score.event_ts,
+        Score.route_id,
+        Score.stop_id,
+        Score.anomaly_score,
+        Score.residual,
+    ).where(Score.observed_ts >= since)
+    if route is not None:
+        stmt = stmt.where(Score.route_id == route)
+    if len(stops) == 1:
+        stmt = stmt.where(Score.stop_id == stops[0])
+    elif stops:
+        stmt = stmt.where(Score.stop_id.in_(stops))
+    if min_score is not None:
+        stmt = stmt.where(Score.anomaly_score >= min_score)
+        if min_score >= HIGH_SCORE:
+            # Literal, so the planner can prove the partial ix_scores_high_feed applies
+            stmt = stmt.where(Score.anomaly_score >= literal_column(repr(HIGH_SCORE)))
+    if after is not None:
+        stmt = stmt.where(tuple_(Score.observed_ts, Score.id) < tuple_(*after))
+    return stmt.order_by(Score.observed_ts.desc(), Score.id.desc()).limit(limit)
+
+
+def _compute_anomalies(
+    seconds: int,
+    routes: List[str],
+    stops: List[str],
+    min_score: Optional[float],
+    limit: int,
+    after: Optional[Tuple[datetime, int]],
+) -> Dict:
+    since = datetime.now(timezone.utc) - timedelta(seconds=seconds)
+    hot = get_hot_store()
+    rows = hot.anomaly_rows(since, routes, stops, min_score, after, limit) if hot is not None else None
+    if rows is None:
+        rows = _query_feed(since, routes, stops, min_score, after, limit)
+
+    by_id = get_stop_index(_load_stops()).by_id
+    items = [build_item(by_id, *row[1:]) for row in rows]
+    next_cursor = make_cursor(rows[-1][1], rows[-1][0]) if len(rows) == limit else None
+    return {"items": items, "next_cursor": next_cursor}
+
+
+def _query_feed(since: datetime, routes: List[str], stops: List[str], min_score: Optional[float], after, limit: int) -> List:
+    if len(routes) > 1:
+        # Merge per-route pages instead of IN (...), so every route is its own index range
+        # and a deep page still reads at most limit rows per route
+        parts = [select(_feed_select(since, r, stops, min_score, after, limit).subquery()) for r in routes]
+        merged = union_all(*parts).subquery()
+        stmt = select(merged).order_by(merged.c.observed_ts.desc(), merged.c.id.desc()).limit(limit)
+    else:
+        stmt = _feed_select(since, routes[0] if routes else None, stops, min_score, after, limit)
+    SessionLocal = sessionmaker(bind=get_engine(), autoflush=False, autocommit=False, future=True)
+    with SessionLocal() as session:
+        return session.execute(stmt).all()
+
+
+def build_item(stops: Mapping[str, Mapping], observed_ts, event_ts, r, sid, score, res) -> Dict:
+    """One anomaly list row (shared with the live stream)."""
+    name = stops.get(sid, {}).get("stop_name")
+    item: Dict = {
+        "route_id": r,
+        "stop_id": sid,
+        "stop_name": name,
+        "anomaly_score": float(score) if score is not None else None,
+        "residual": float(res) if res is not None else None,
+    }
+    # Canonical observed/event packs
+    item.update(pack_with_prefix("observed", observed_ts))
+    item.update(pack_with_prefix("event", event_ts))
+    return item
@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from fastapi import APIRouter, Query, Request, Response
+from pydantic import BaseModel
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import sessionmaker
+
+from ..core.cache import make_key
+from ..core.config import get_settings
+from ..core.etag import data_etag, etag_matches, not_modified, set_validators
+from ..core.fastjson import cached_json, json_response
+from ..core.singleflight import cached_query
+from ..core.tiles import get_stop_index
+from ..deps import parse_window
+from ..gtfs import get_gtfs
+from ..models import Score
+from ..storage.hotstore import get_hot_store
+from ..storage.session import get_engine
+from ..storage.watermark import data_watermark, from_ms, parse_watermark
+from .anomalies import MAX_PAGE_SIZE, AnomalyItem, _query_feed, _split, build_item, make_cursor
+from .heatmap import heatmap_body
+from .stops import _load_stops
+from .summary import SummaryOut, summary_payload
+
+
+router = APIRouter(prefix="/dashboard", tags=["dashboard"])  # /api/dashboard
+
+DASHBOARD_PAGE_SIZE = 50
+DEFAULT_WINDOW_SEC = 60 * 60
+
+
+class DashboardOut(BaseModel):
+    window: str
+    route_id: str
+    # The data watermark all three parts were computed at
+    watermark: str
+    summary: SummaryOut
+    heatmap: dict
+    anomalies: List[AnomalyItem]
+    next_cursor: Optional[str] = None
+
+
+@router.get("", response_model=DashboardOut)
+async def get_dashboard(
+    request: Request,
+    response: Response,
+    window: str = Query(default="60m"),
+    route_id: str = Query(default="All", description="route, comma-separated routes, or All"),
+    limit: int = Query(default=DASHBOARD_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="anomalies page size"),
+):
+    """Summary KPIs, heatmap and the first anomalies page for one window in one response.
+
+    All three come from the same scan of the window at the same watermark, so
+    the KPIs always describe what the map and the list show. Unlike
+    ``/api/summary``, the KPIs honour ``route_id``. Further anomaly pages come
+    from ``/api/anomalies`` with ``next_cursor``.
+    """
+    seconds = parse_window(window, DEFAULT_WINDOW_SEC)
+    routes = _split(route_id)
+    key = make_key("dashboard", seconds, ",".join(routes) or None)
+    watermark = await data_watermark()
+    gtfs = get_gtfs()
+    etag = data_etag(key, watermark, window, limit, static=gtfs.etag)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    cache_key = key + (watermark, gtfs.key, window, limit)
+    if get_settings().API_FAST_JSON:
+        return json_response(await cached_json(cache_key, _compute_dashboard, window, seconds, routes, limit, watermark), etag)
+    set_validators(response, etag)
+    return await cached_query(cache_key, _compute_dashboard, window, seconds, routes, limit, watermark)
+
+
+def _compute_dashboard(window: str, seconds: int, routes: List[str], limit: int, watermark: str) -> Dict:
+    now = datetime.now(timezone.utc)
+    since = now - timedelta(seconds=seconds)
+    hot = get_hot_store()
+    parts = hot.dashboard(since, now, routes, limit) if hot is not None else None
+    if parts is None:
+        counts, heat_rows = _query_window(since, now, routes)
+        rows = _query_feed(since, routes, [], None, None, limit)
+    else:
+        counts, heat_rows, rows = parts["counts"], parts["heatmap"], parts["anomalies"]
+
+    # last_updated is the watermark's newest observed_ts, like the ETag, not a second query
+    _max_id, obs_ms, _scored_ms = parse_watermark(watermark)
+    by_id = get_stop_index(_load_stops()).by_id
+    return {
+        "window": window,
+        "route_id": ",".join(routes) or "All",
+        "watermark": watermark,
+        "summary": {**summary_payload(counts, from_ms(obs_ms) if obs_ms else now), "window": window},
+        "heatmap": heatmap_body(heat_rows, now, seconds, watermark),
+        "anomalies": [build_item(by_id, *row[1:]) for row in rows],
+        "next_cursor": make_cursor(rows[-1][1], rows[-1][0]) if len(rows) == limit else None,
+    }
+
+
+def _query_window(since: datetime, until: datetime, routes: List[str]):
+    """Summary counts and per-stop heatmap rows from one GROUP BY (route, stop) over the window.
+
+    Both are folded in Python from the per-pair aggregates, which number at
+    most routes x stops however many rows the window holds.
+    """
+    stmt = (
+        select(
+            Score.route_id,
+            Score.stop_id,
+            func.count(Score.id),
+            func.count(Score.anomaly_score),
+            func.sum(Score.anomaly_score),
+            func.count(Score.residual),
+            func.sum(Score.residual),
+            func.max(Score.observed_ts),
+            func.max(Score.event_ts),
+            func.max(case((Score.headway_sec > 0, 1), else_=0)),
+            func.sum(case((Score.anomaly_score >= 0.6, 1), else_=0)),
+            func.sum(case((Score.anomaly_score >= 0.85, 1), else_=0)),
+        )
+        .where(Score.observed_ts >= since)
+        .where(Score.observed_ts <= until)
+        .group_by(Score.route_id, Score.stop_id)
+    )
+    if len(routes) == 1:
+        stmt = stmt.where(Score.route_id == routes[0])
+    elif routes:
+        stmt = stmt.where(Score.route_id.in_(routes))
+    SessionLocal = sessionmaker(bind=get_engine(), autoflush=False, autocommit=False, future=True)
+    with SessionLocal() as session:
+        pairs = session.execute(stmt).all()
+
+    counts = {"total_rows": 0, "stations_total": 0, "trains_active": 0, "anomalies_count": 0, "anomalies_high": 0}
+    # stop -> [score n, score sum, residual n, residual sum, max observed, max event, max route]
+    stops: Dict[str, list] = {}
+    for r, sid, n, n_score, sum_score, n_res, sum_res, last_obs, last_evt, moving, n_anom, n_high in pairs:
+        counts["total_rows"] += n
+        counts["trains_active"] += int(moving or 0)
+        counts["anomalies_count"] += int(n_anom or 0)
+        counts["anomalies_high"] += int(n_high or 0)
+        agg = stops.get(sid)
+        if agg is None:
+            stops[sid] = [n_score, sum_score or 0.0, n_res, sum_res or 0.0, last_obs, last_evt, r]
+            continue
+        agg[0] += n_score
+        agg[1] += sum_score or 0.0
+        agg[2] += n_res
+        agg[3] += sum_res or 0.0
+        agg[4] = max(agg[4], last_obs)
+        if last_evt is not None and (agg[5] is None or last_evt > agg[5]):
+            agg[5] = last_evt
+        agg[6] = max(agg[6], r)
+    counts["stations_total"] = len(stops)
+    heat_rows = [
+        (sid, s_sum / s_n if s_n else None, r_sum / r_n if r_n else None, last_obs, last_evt, r)
+        for sid, (s_n, s_sum, r_n, r_sum, last_obs, last_evt, r) in stops.items()
+    ]
+    return counts, heat_rows
@@ -1,16 +1,21 @@
 from datetime import datetime, timezone
 from fastapi import APIRouter
-from sqlalchemy import func, select
-from sqlalchemy.orm import sessionmaker
 
+from ..core.cache import get_response_cache
 from ..core.config import get_settings
-from ..models import Score
-from ..storage.session import get_engine
+from ..core.singleflight import cached_query, get_flight_group
+from ..storage.hotstore import get_hot_store
+from ..storage.tablestats import table_stats
 from .stops import _load_stops
+from .stream import get_stream_feed
 
 
 router = APIRouter(tags=["health"]) 
 
+TABLE_STATS_KEY = ("table-stats",)
+# Catalog numbers move slowly; a dashboard polling every second reuses one read
+TABLE_STATS_TTL_SEC = 5.0
+
 
 @router.get("/health")
 async def health() -> dict:
@@ -20,20 +25,21 @@ async def health() -> dict:
 
 @router.get("/debug/stats")
 async def debug_stats() -> dict:
-    engine = get_engine()
-    SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
-    with SessionLocal() as session:
-        _ = session.execute(select(func.count(Score.id))).scalar() or 0
-    # recent last 15m via Python now
-    with SessionLocal() as session:
-        since = datetime.now(timezone.utc).timestamp() - 900
-        recent_count = (
-            session.execute(
-                select(func.count(Score.id)).where(
-                    Score.observed_ts >= datetime.fromtimestamp(since, tz=timezone.utc)
-                )
-            ).scalar()
-            or 0
-        )
+    """Table size, row estimates and ingest rate from catalogs and rollups (no table scans)."""
+    table = await cached_query(TABLE_STATS_KEY, table_stats, ttl_sec=TABLE_STATS_TTL_SEC)
     stops_count = len(_load_stops())
-    return {"stops_count": int(stops_count), "recent_scores": int(recent_count), "now": datetime.now(timezone.utc).isoformat()}
+    hot = get_hot_store()
+    return {
+        "stops_count": int(stops_count),
+        "recent_scores": table["recent_scores"],
+        "table": table,
+        "stream": get_stream_feed().broadcaster.stats(),
+        "hot_store": hot.stats() if hot is not None else None,
+        "now": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+@router.get("/debug/cache")
+async def debug_cache() -> dict:
+    """Response cache hit rate and entry count, plus request coalescing counters."""
+    return {**get_response_cache().stats(), "singleflight": get_flight_group().stats()}
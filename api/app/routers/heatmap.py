@@ -1,20 +1,57 @@
 from __future__ import annotations
 
 from datetime import datetime, timedelta, timezone
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Set, Tuple
 
-from fastapi import APIRouter, Query
-from sqlalchemy import func, select
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from sqlalchemy import Integer, and_, cast, func, literal_column, or_, select
 from sqlalchemy.orm import sessionmaker
 
-from ..models import Score
-from ..deps import pack_with_prefix
+from ..core.cache import make_key, normalize_route
+from ..core.config import get_settings
+from ..core.etag import REVALIDATE, data_etag, etag_matches, not_modified, set_validators
+from ..core.fastjson import cached_json, dumps, json_response
+from ..core.mvt import EXTENT, encode_tile
+from ..core.singleflight import cached_query
+from ..core.tiles import (
+    CLUSTER_MAX_ZOOM,
+    CLUSTER_PX,
+    BBox,
+    StopIndex,
+    cluster_points,
+    get_stop_index,
+    parse_bbox,
+    valid_tile,
+)
+from ..models import Score, StopStation
+from ..deps import pack_with_prefix, parse_window
+from ..gtfs import get_gtfs
+from ..storage.hotstore import get_hot_store
 from ..storage.session import get_engine
+from ..storage.stations import sync_stop_stations
+from ..storage.watermark import data_watermark, from_ms, parse_watermark
 from .stops import _load_stops
 
 
 router = APIRouter(prefix="/heatmap", tags=["heatmap"]) 
 
+DEFAULT_WINDOW_SEC = 60 * 60
+# Above this many changed stops a delta is barely smaller than the full collection
+DELTA_MAX_STOPS = 1000
+# scored_at is stamped before the trainer's UPDATE commits, and several writers commit
+# concurrently, so a row can become visible with a scored_at older than a token's
+# watermark; deltas resend rows scored this long before the token
+DELTA_OVERLAP_SEC = 5.0
+
+MVT_MEDIA_TYPE = "application/vnd.mapbox-vector-tile"
+TILE_LAYER = "anomalies"
+TILE_PROPS = ("stop_id", "stop_name", "route_id", "anomaly_score", "residual", "observed_ts_epoch_ms")
+
+TIMELINE_DEFAULT_SEC = 3 * 3600
+TIMELINE_MIN_STEP_SEC = 60
+# 12 hours of 1-minute frames; bounds the matrix a single request can ask for
+TIMELINE_MAX_FRAMES = 720
+
 
 def _parse_ts(ts_str: Optional[str]) -> datetime:
     if not ts_str or ts_str.lower() == "now":
@@ -32,32 +69,483 @@ def _parse_ts(ts_str: Optional[str]) -> datetime:
         return datetime.now(timezone.utc)
 
 
-def _parse_window(window: str) -> int:
-    s = window.strip().lower()
-    if s.endswith("m"):
-        return int(s[:-1]) * 60
-    if s.endswith("h"):
-        return int(s[:-1]) * 3600
-    return 60 * 60
+_STEP_UNITS = {"s": 1, "m": 60, "h": 3600}
+
+
+def _parse_step(step: str) -> int:
+    """Strict frame width ('90s', '5m', '1h') in seconds; HTTP 400 on anything else."""
+    s = (step or "").strip().lower()
+    unit = _STEP_UNITS.get(s[-1:])
+    if unit is None or not s[:-1].isdigit():
+        raise HTTPException(status_code=400, detail=f"invalid step {step!r}; use e.g. 90s, 5m or 1h")
+    seconds = int(s[:-1]) * unit
+    if seconds < TIMELINE_MIN_STEP_SEC:
+        raise HTTPException(status_code=400, detail=f"step must be at least {TIMELINE_MIN_STEP_SEC}s")
+    return seconds
+
+
+def _parse_ts_strict(value: str, name: str) -> datetime:
+    """'now' or an ISO timestamp; unlike _parse_ts, a typo is an HTTP 400 rather than 'now'."""
+    s = value.strip()
+    if s.lower() == "now":
+        return datetime.now(timezone.utc)
+    try:
+        dt = datetime.fromisoformat(s[:-1] + "+00:00" if s.endswith("Z") else s)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"invalid {name} {value!r}; expected an ISO timestamp or 'now'")
+    return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt.astimezone(timezone.utc)
+
+
+def make_since_token(watermark: str, window_start: datetime, seconds: int) -> str:
+    """Opaque ``since`` token: the data watermark a response reflects plus its window."""
+    max_id, _obs_ms, scored_ms = parse_watermark(watermark)
+    return f"{max_id}.{scored_ms}.{int(window_start.timestamp() * 1000)}.{seconds}"
+
+
+def _parse_since(since: Optional[str], seconds: int) -> Optional[Tuple[int, int, int]]:
+    """(max id, scored_at ms, window start ms) from a token issued for the same window, else None."""
+    if not since:
+        return None
+    try:
+        max_id, scored_ms, start_ms, token_sec = (int(p) for p in since.split("."))
+    except ValueError:
+        return None
+    if token_sec != seconds:
+        return None
+    return max_id, scored_ms, start_ms
 
 
 @router.get("")
 async def get_heatmap(
+    request: Request,
+    response: Response,
     ts: Optional[str] = Query(default="now"),
     window: str = Query(default="60m"),
     route_id: str = Query(default="All"),
-) -> dict:
+    since: Optional[str] = Query(default=None, description="watermark from a previous response; returns only changes"),
+    bbox: Optional[str] = Query(default=None, description="min_lon,min_lat,max_lon,max_lat; only stops inside"),
+    zoom: Optional[float] = Query(default=None, ge=0, le=24, description="map zoom; below 12 stops are clustered"),
+    level: str = Query(default="stop", pattern="^(stop|station)$", description="station: platforms folded into parent stations"),
+):
     target_ts = _parse_ts(ts)
-    seconds = _parse_window(window)
-    since = target_ts - timedelta(seconds=seconds)
+    seconds = parse_window(window, DEFAULT_WINDOW_SEC)
+    route_id = normalize_route(route_id)
+    try:
+        box = parse_bbox(bbox)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    clustered = zoom is not None and zoom < CLUSTER_MAX_ZOOM
+    stations = level == "station"
+    key = make_key(
+        "heatmap-station" if stations else "heatmap", seconds, route_id, None if not ts or ts.lower() == "now" else target_ts
+    )
+    # Clusters and stations are rebuilt from the full aggregate; a per-stop patch would not apply to them
+    prev = None if clustered or stations else _parse_since(since, seconds)
+    watermark = await data_watermark()
+    gtfs = get_gtfs()
+    etag = data_etag(key, watermark, since if prev else None, box, zoom if clustered else None, static=gtfs.etag)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    if prev is not None:
+        cache_key = key + (watermark, gtfs.key, since)
+        call = (_compute_heatmap_delta, target_ts, seconds, route_id, watermark, prev)
+    elif stations:
+        cache_key = key + (watermark, gtfs.key)
+        call = (_compute_station_heatmap, target_ts, seconds, route_id, watermark)
+    else:
+        cache_key = key + (watermark, gtfs.key)
+        call = (_compute_heatmap, target_ts, seconds, route_id, watermark)
+    fast = get_settings().API_FAST_JSON
+    if fast and box is None and not clustered:
+        return json_response(await cached_json(cache_key, *call), etag)
+    body = _viewport(await cached_query(cache_key, *call), box, zoom if clustered else None)
+    if fast:
+        return json_response(dumps(body), etag)
+    set_validators(response, etag)
+    return body
+
 
-    # Load stops for geometry lookup
-    stops = _load_stops()
-    stop_map: Dict[str, Dict] = {s["stop_id"]: s for s in stops}
+@router.get("/timeline")
+async def get_heatmap_timeline(
+    request: Request,
+    response: Response,
+    start: Optional[str] = Query(default=None, description="ISO time; default end minus 3h"),
+    end: Optional[str] = Query(default="now"),
+    step: str = Query(default="5m", description="frame width, e.g. 90s, 5m, 1h (at least 60s)"),
+    route_id: str = Query(default="All"),
+):
+    """Per-stop average anomaly score for every ``step`` bucket in [start, end).
+
+    Columnar instead of one FeatureCollection per frame: ``stops``/``lon``/``lat``
+    list the stops once and ``values[f][s]`` is stop s's average in frame f
+    (null where it has no rows). Buckets are aligned to multiples of step since
+    the epoch, so successive requests share frames.
+    """
+    step_sec = _parse_step(step)
+    route_id = normalize_route(route_id)
+    end_ts = _parse_ts_strict(end or "now", "end")
+    start_ts = _parse_ts_strict(start, "start") if start else end_ts - timedelta(seconds=TIMELINE_DEFAULT_SEC)
+    # time_bucket semantics: frames start on multiples of step; the one holding end is included
+    start_epoch = int(start_ts.timestamp()) // step_sec * step_sec
+    end_epoch = (int(end_ts.timestamp()) // step_sec + 1) * step_sec
+    frames = (end_epoch - start_epoch) // step_sec
+    if start_epoch >= end_epoch:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    if frames > TIMELINE_MAX_FRAMES:
+        raise HTTPException(
+            status_code=400, detail=f"{frames} frames requested; at most {TIMELINE_MAX_FRAMES} (use a larger step)"
+        )
+    key = make_key("heatmap-timeline", step_sec, route_id) + (start_epoch, end_epoch)
+    watermark = await data_watermark()
+    gtfs = get_gtfs()
+    etag = data_etag(key, watermark, static=gtfs.etag)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    cache_key = key + (watermark, gtfs.key)
+    call = (_compute_timeline, start_epoch, end_epoch, step_sec, route_id, watermark)
+    if get_settings().API_FAST_JSON:
+        return json_response(await cached_json(cache_key, *call), etag)
+    set_validators(response, etag)
+    return await cached_query(cache_key, *call)
+
+
+def _compute_timeline(start_epoch: int, end_epoch: int, step_sec: int, route_id: str, watermark: str) -> dict:
+    since = datetime.fromtimestamp(start_epoch, tz=timezone.utc)
+    until = datetime.fromtimestamp(end_epoch, tz=timezone.utc)
+    routes = [] if not route_id or route_id.lower() == "all" else [route_id]
+    hot = get_hot_store()
+    rows = hot.timeline_rows(since, until, step_sec, routes) if hot is not None else None
+    if rows is None:
+        rows = _query_timeline(since, until, step_sec, route_id)
+    frames = (end_epoch - start_epoch) // step_sec
+    stop_map = get_stop_index(_load_stops()).by_id
+    columns: Dict[str, int] = {}
+    cells: List[Tuple[int, int, float]] = []
+    for bucket, sid, avg_s in rows:
+        b = int(bucket)
+        if sid not in stop_map or not 0 <= b < frames or avg_s is None:
+            continue
+        col = columns.setdefault(sid, len(columns))
+        cells.append((b, col, round(float(avg_s), 4)))
+    values: List[List[Optional[float]]] = [[None] * len(columns) for _ in range(frames)]
+    for b, col, v in cells:
+        values[b][col] = v
+    stops = list(columns)
+    return {
+        "start": since.isoformat(),
+        "end": until.isoformat(),
+        "step_sec": step_sec,
+        "frames": [(start_epoch + i * step_sec) * 1000 for i in range(frames)],
+        "stops": stops,
+        "lon": [stop_map[sid]["lon"] for sid in stops],
+        "lat": [stop_map[sid]["lat"] for sid in stops],
+        "values": values,
+        "watermark": watermark,
+    }
 
+
+def _query_timeline(since: datetime, until: datetime, step_sec: int, route_id: str) -> List:
     engine = get_engine()
+    # Inlined literals so SELECT and GROUP BY render the same expression on Postgres
+    offset = func.extract("epoch", Score.observed_ts) - literal_column(str(int(since.timestamp())))
+    bucket = offset / literal_column(str(int(step_sec)))
+    if engine.dialect.name == "postgresql":
+        bucket = func.floor(bucket)
+    else:
+        # Offsets are non-negative inside the window, so truncation is floor
+        bucket = cast(bucket, Integer)
+    bucket = bucket.label("bucket")
+    stmt = (
+        select(bucket, Score.stop_id, func.avg(Score.anomaly_score).label("avg_score"))
+        .where(Score.observed_ts >= since)
+        .where(Score.observed_ts < until)
+    )
+    if route_id and route_id.lower() != "all":
+        stmt = stmt.where(Score.route_id == route_id)
+    stmt = stmt.group_by(bucket, Score.stop_id)
     SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+    with SessionLocal() as session:
+        return session.execute(stmt).all()
+
+
+def _viewport(body: dict, box: Optional[BBox], zoom: Optional[float]) -> dict:
+    """Restrict a (cached) collection to a bbox and/or cluster it for a low zoom."""
+    if box is None and zoom is None:
+        return body
+    index = get_stop_index(_load_stops())
+    features = body["features"]
+    if box is not None:
+        visible = index.ids_in_bbox(box)
+        features = [f for f in features if f["properties"]["stop_id"] in visible]
+    if zoom is not None:
+        features = _cluster_features(index, features, zoom)
+    return {**body, "features": features}
+
+
+def _cluster_features(index: StopIndex, features: List[dict], zoom: float) -> List[dict]:
+    """Merge features of stops sharing a screen grid cell into one cluster feature.
 
+    A cluster sits at the members' centroid and carries the top-scoring member's
+    properties plus point_count and the sum, mean and max of anomaly_score.
+    """
+    by_stop = {f["properties"]["stop_id"]: f for f in features}
+    out: List[dict] = []
+    for group in index.clusters(by_stop, zoom):
+        if len(group) == 1:
+            out.append(by_stop[group[0]])
+            continue
+        members = [by_stop[sid]["properties"] for sid in group]
+        scores = [p.get("anomaly_score") or 0.0 for p in members]
+        best = max(members, key=lambda p: p.get("anomaly_score") or 0.0)
+        lon, lat = index.centroid(group)
+        props = {
+            **best,
+            "cluster": True,
+            "point_count": len(group),
+            "anomaly_score": sum(scores) / len(scores),
+            "anomaly_score_sum": sum(scores),
+            "anomaly_score_max": max(scores),
+            "residual": sum(p.get("residual") or 0.0 for p in members) / len(members),
+        }
+        out.append({"type": "Feature", "geometry": {"type": "Point", "coordinates": [lon, lat]}, "properties": props})
+    return out
+
+
+@router.get("/tiles/{z}/{x}/{y}.mvt")
+async def get_heatmap_tile(
+    request: Request,
+    z: int,
+    x: int,
+    y: int,
+    window: str = Query(default="60m"),
+    route_id: str = Query(default="All"),
+):
+    """Per-stop anomaly aggregates for one vector tile (layer ``anomalies``).
+
+    Tiles are cut from the same cached live aggregate as ``GET /heatmap``, so a
+    viewport's worth of tiles costs one DB query per data watermark.
+    """
+    if not valid_tile(z, x, y):
+        raise HTTPException(status_code=404, detail="tile out of range")
+    seconds = parse_window(window, DEFAULT_WINDOW_SEC)
+    route_id = normalize_route(route_id)
+    key = make_key(f"heatmap-tile/{z}/{x}/{y}", seconds, route_id)
+    watermark = await data_watermark()
+    gtfs = get_gtfs()
+    etag = data_etag(key, watermark, static=gtfs.etag)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    collection = await cached_query(
+        make_key("heatmap", seconds, route_id) + (watermark, gtfs.key),
+        _compute_heatmap,
+        datetime.now(timezone.utc),
+        seconds,
+        route_id,
+        watermark,
+    )
+    body = await cached_query(key + (watermark, gtfs.key), _encode_heatmap_tile, collection, z, x, y)
+    return Response(content=body, media_type=MVT_MEDIA_TYPE, headers={"ETag": etag, "Cache-Control": REVALIDATE})
+
+
+def _encode_heatmap_tile(collection: dict, z: int, x: int, y: int) -> bytes:
+    index = get_stop_index(_load_stops())
+    by_stop = {f["properties"]["stop_id"]: f["properties"] for f in collection["features"]}
+    points = []
+    for i in index.query_tile(z, x, y):
+        props = by_stop.get(index.ids[i])
+        if props is None:
+            continue
+        points.append((i + 1, index.tile_point(i, z, x, y), {k: props.get(k) for k in TILE_PROPS}))
+    if z < CLUSTER_MAX_ZOOM:
+        points = cluster_points(points, cell=EXTENT * CLUSTER_PX // 512)
+    # Highest scores last, so they are drawn on top
+    points.sort(key=lambda p: p[2].get("anomaly_score") or 0.0)
+    return encode_tile({TILE_LAYER: points})
+
+
+def _compute_heatmap_delta(
+    target_ts: datetime, seconds: int, route_id: str, watermark: str, prev: Tuple[int, int, int]
+) -> dict:
+    """Features for stops whose aggregates may have changed since the ``prev`` token.
+
+    A stop changed if it has rows inserted (id) or scored (scored_at) after the
+    token's watermark inside the current window, or rows that aged out between the
+    token's window start and the current one. Changed stops without rows left in
+    the window are listed in ``removed``. Falls back to a full response when the
+    windows no longer overlap or too many stops changed for a patch to be smaller.
+    """
+    since_id, scored_ms, start_ms = prev
+    start = target_ts - timedelta(seconds=seconds)
+    prev_start = from_ms(start_ms)
+    if prev_start > start or start - prev_start >= timedelta(seconds=seconds):
+        return _compute_heatmap(target_ts, seconds, route_id, watermark)
+
+    in_window = and_(Score.observed_ts >= start, Score.observed_ts <= target_ts)
+    stmt = select(Score.stop_id).distinct().where(
+        or_(
+            and_(Score.id > since_id, in_window),
+            and_(Score.scored_at >= from_ms(scored_ms) - timedelta(seconds=DELTA_OVERLAP_SEC), in_window),
+            and_(Score.observed_ts >= prev_start, Score.observed_ts < start),
+        )
+    )
+    if route_id and route_id.lower() != "all":
+        stmt = stmt.where(Score.route_id == route_id)
+    SessionLocal = sessionmaker(bind=get_engine(), autoflush=False, autocommit=False, future=True)
+    with SessionLocal() as session:
+        changed = {r[0] for r in session.execute(stmt).all()}
+    if len(changed) > DELTA_MAX_STOPS:
+        return _compute_heatmap(target_ts, seconds, route_id, watermark)
+
+    body = _compute_heatmap(target_ts, seconds, route_id, watermark, stop_ids=changed) if changed else {
+        "type": "FeatureCollection",
+        "timestamp": target_ts.isoformat(),
+        "features": [],
+        "watermark": make_since_token(watermark, start, seconds),
+    }
+    present = {f["properties"]["stop_id"] for f in body["features"]}
+    return {**body, "delta": True, "removed": sorted(changed - present)}
+
+
+def _compute_heatmap(
+    target_ts: datetime, seconds: int, route_id: str, watermark: str, stop_ids: Optional[Set[str]] = None
+) -> dict:
+    since = target_ts - timedelta(seconds=seconds)
+    routes = [] if not route_id or route_id.lower() == "all" else [route_id]
+    hot = get_hot_store()
+    rows = hot.heatmap_rows(since, target_ts, routes, stop_ids) if hot is not None else None
+    if rows is None:
+        rows = _query_heatmap(since, target_ts, route_id, stop_ids)
+    return heatmap_body(rows, target_ts, seconds, watermark)
+
+
+def heatmap_body(rows, target_ts: datetime, seconds: int, watermark: str) -> dict:
+    """FeatureCollection from per-stop aggregate rows (shared with /api/dashboard)."""
+    since = target_ts - timedelta(seconds=seconds)
+    # Stops for geometry lookup
+    stop_map = get_stop_index(_load_stops()).by_id
+
+    features: List[dict] = []
+    for sid, avg_s, avg_r, obs_ts_row, evt_ts_row, r_id in rows:
+        st = stop_map.get(sid)
+        if not st:
+            continue
+        features.append(build_feature(st, r_id, avg_s, avg_r, obs_ts_row or target_ts, evt_ts_row))
+
+    return {
+        "type": "FeatureCollection",
+        "timestamp": target_ts.isoformat(),
+        "features": features,
+        "watermark": make_since_token(watermark, since, seconds),
+    }
+
+
+def _compute_station_heatmap(target_ts: datetime, seconds: int, route_id: str, watermark: str) -> dict:
+    """One feature per parent station, with per-route breakdown arrays.
+
+    The DB groups by (station, route) through ``stop_stations``; hot-store rows
+    come per (stop, route) and are folded into stations here, weighting platform
+    averages by their row counts exactly as the GROUP BY does.
+    """
+    since = target_ts - timedelta(seconds=seconds)
+    routes = [] if not route_id or route_id.lower() == "all" else [route_id]
+    hot = get_hot_store()
+    rows = hot.stop_route_rows(since, target_ts, routes) if hot is not None else None
+    if rows is None:
+        rows = _query_station_routes(since, target_ts, route_id)
+    else:
+        rows = _fold_stations(rows, get_gtfs().station_of)
+    stop_map = get_stop_index(_load_stops()).by_id
+
+    acc: Dict[str, Dict] = {}
+    for station, r_id, n, score_sum, res_n, res_sum, obs, evt in rows:
+        a = acc.get(station)
+        if a is None:
+            a = acc[station] = {"n": 0, "score": 0.0, "res_n": 0, "res": 0.0, "obs": None, "evt": None, "routes": {}}
+        a["n"] += n
+        a["score"] += score_sum or 0.0
+        a["res_n"] += res_n or 0
+        a["res"] += res_sum or 0.0
+        if obs is not None and (a["obs"] is None or obs > a["obs"]):
+            a["obs"] = obs
+        if evt is not None and (a["evt"] is None or evt > a["evt"]):
+            a["evt"] = evt
+        a["routes"][r_id] = (n, score_sum or 0.0)
+
+    features: List[dict] = []
+    for station, a in acc.items():
+        st = stop_map.get(station)
+        if not st or not a["n"]:
+            continue
+        by_route = sorted(a["routes"].items())
+        route_scores = [round(s / n, 4) if n else 0.0 for _r, (n, s) in by_route]
+        # The station's headline route is the one scoring worst there, not the lexicographic max
+        top = max(range(len(by_route)), key=lambda i: route_scores[i])
+        avg_res = a["res"] / a["res_n"] if a["res_n"] else None
+        feature = build_feature(st, by_route[top][0], a["score"] / a["n"], avg_res, a["obs"] or target_ts, a["evt"])
+        props = feature["properties"]
+        props["stop_id"] = station
+        props["routes"] = [r for r, _ in by_route]
+        props["route_scores"] = route_scores
+        props["route_counts"] = [n for _r, (n, _s) in by_route]
+        features.append(feature)
+
+    return {
+        "type": "FeatureCollection",
+        "timestamp": target_ts.isoformat(),
+        "level": "station",
+        "features": features,
+        "watermark": make_since_token(watermark, since, seconds),
+    }
+
+
+def _fold_stations(rows, station_of) -> List[Tuple]:
+    """Sum (stop, route) partials into (station, route) partials of the same shape."""
+    acc: Dict[Tuple[str, str], List] = {}
+    for sid, r_id, n, score_sum, res_n, res_sum, obs, evt in rows:
+        key = (station_of(sid), r_id)
+        a = acc.get(key)
+        if a is None:
+            acc[key] = [n, score_sum or 0.0, res_n or 0, res_sum or 0.0, obs, evt]
+            continue
+        a[0] += n
+        a[1] += score_sum or 0.0
+        a[2] += res_n or 0
+        a[3] += res_sum or 0.0
+        if obs is not None and (a[4] is None or obs > a[4]):
+            a[4] = obs
+        if evt is not None and (a[5] is None or evt > a[5]):
+            a[5] = evt
+    return [(station, r_id, *a) for (station, r_id), a in acc.items()]
+
+
+def _query_station_routes(since: datetime, target_ts: datetime, route_id: str) -> List:
+    sync_stop_stations(get_gtfs())
+    # Platforms without a parent have no stop_stations row and stand for themselves
+    station = func.coalesce(StopStation.station_id, Score.stop_id)
+    SessionLocal = sessionmaker(bind=get_engine(), autoflush=False, autocommit=False, future=True)
+    with SessionLocal() as session:
+        stmt = (
+            select(
+                station,
+                Score.route_id,
+                func.count(),
+                func.sum(Score.anomaly_score),
+                func.count(Score.residual),
+                func.sum(Score.residual),
+                func.max(Score.observed_ts),
+                func.max(Score.event_ts),
+            )
+            .outerjoin(StopStation, StopStation.stop_id == Score.stop_id)
+            .where(Score.observed_ts <= target_ts)
+            .where(Score.observed_ts >= since)
+        )
+        if route_id and route_id.lower() != "all":
+            stmt = stmt.where(Score.route_id == route_id)
+        return session.execute(stmt.group_by(station, Score.route_id)).all()
+
+
+def _query_heatmap(since: datetime, target_ts: datetime, route_id: str, stop_ids: Optional[Set[str]]) -> List:
+    SessionLocal = sessionmaker(bind=get_engine(), autoflush=False, autocommit=False, future=True)
     with SessionLocal() as session:
         base = (
             select(
@@ -73,35 +561,32 @@ async def get_heatmap(
         )
         if route_id and route_id.lower() != "all":
             base = base.where(Score.route_id == route_id)
+        if stop_ids is not None:
+            base = base.where(Score.stop_id.in_(sorted(stop_ids)))
         base = base.group_by(Score.stop_id)
-        rows = session.execute(base).all()
+        return session.execute(base).all()
 
-    features: List[dict] = []
-    for sid, avg_s, avg_r, obs_ts_row, evt_ts_row, r_id in rows:
-        st = stop_map.get(sid)
-        if not st:
-            continue
-        geom = {"type": "Point", "coordinates": [st["lon"], st["lat"]]}
-        props: Dict = {
-            "stop_id": sid,
-            "stop_name": st.get("stop_name"),
-            "route_id": r_id,
-            "anomaly_score": float(avg_s) if avg_s is not None else 0.0,
-            "residual": float(avg_r) if avg_r is not None else 0.0,
-        }
-        # Add observed timestamp pack (primary)
-        ts_observed = obs_ts_row or target_ts
-        props.update(pack_with_prefix("observed", ts_observed))
-        # Optionally include event pack if available in aggregation
-        if evt_ts_row is not None:
-            props.update(pack_with_prefix("event", evt_ts_row))
-
-        features.append(
-            {
-                "type": "Feature",
-                "geometry": geom,
-                "properties": props,
-            }
-        )
 
-    return {"type": "FeatureCollection", "timestamp": target_ts.isoformat(), "features": features}
+def build_feature(
+    st: Dict,
+    route_id: Optional[str],
+    avg_score: Optional[float],
+    avg_res: Optional[float],
+    observed_ts: datetime,
+    event_ts: Optional[datetime],
+) -> dict:
+    """One heatmap point feature for a stop (shared with the live stream's deltas)."""
+    geom = {"type": "Point", "coordinates": [st["lon"], st["lat"]]}
+    props: Dict = {
+        "stop_id": st["stop_id"],
+        "stop_name": st.get("stop_name"),
+        "route_id": route_id,
+        "anomaly_score": float(avg_score) if avg_score is not None else 0.0,
+        "residual": float(avg_res) if avg_res is not None else 0.0,
+    }
+    # Add observed timestamp pack (primary)
+    props.update(pack_with_prefix("observed", observed_ts))
+    # Optionally include event pack if available in aggregation
+    if event_ts is not None:
+        props.update(pack_with_prefix("event", event_ts))
+    return {"type": "Feature", "geometry": geom, "properties": props}
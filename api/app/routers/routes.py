@@ -3,30 +3,51 @@ from __future__ import annotations
 from datetime import datetime, timedelta, timezone
 from typing import List
 
-import hashlib
-from fastapi import APIRouter, Response
+from fastapi import APIRouter, HTTPException, Query, Request, Response
 from pydantic import BaseModel
 from sqlalchemy import distinct, select
 from sqlalchemy.orm import sessionmaker
 
+from ..core.cache import make_key
+from ..core.config import get_settings
+from ..core.etag import data_etag, etag_matches, make_etag, not_modified, set_validators
+from ..core.fastjson import dumps, json_response
+from ..core.singleflight import cached_query
+from ..gtfs import get_gtfs
 from ..models import Score
 from ..storage.session import get_engine
+from ..storage.watermark import data_watermark
 from .stops import _load_routes_from_static
 
 
 router = APIRouter(prefix="/routes", tags=["routes"])  # /api/routes
 
+ROUTES_CACHE_CONTROL = "public, max-age=600"
+
 
 class RoutesOut(BaseModel):
     routes: list[str]
 
 
 @router.get("", response_model=RoutesOut)
-async def get_routes(response: Response) -> dict:
+async def get_routes(request: Request, response: Response):
     """Return distinct route_ids seen in the last 24h.
 
     Fallback to static GTFS routes.txt if no scores exist yet.
     """
+    key = make_key("routes", 24 * 3600)
+    watermark = await data_watermark()
+    gtfs = get_gtfs()
+    # caching headers (10 minutes) with weak ETag from the data watermark
+    etag = data_etag(key, watermark, static=gtfs.etag)
+    if etag_matches(request, etag):
+        return not_modified(etag, ROUTES_CACHE_CONTROL)
+    set_validators(response, etag, ROUTES_CACHE_CONTROL)
+    routes = await cached_query(key + (watermark, gtfs.key), _compute_routes)
+    return {"routes": routes}
+
+
+def _compute_routes() -> List[str]:
     engine = get_engine()
     SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
     since = datetime.now(timezone.utc) - timedelta(hours=24)
@@ -39,13 +60,35 @@ async def get_routes(response: Response) -> dict:
     if not routes:
         routes = _load_routes_from_static()
 
-    routes = sorted(list({r for r in routes if isinstance(r, str) and r.strip()}))
-    # caching headers (10 minutes) with weak ETag
-    try:
-        concat = ",".join(routes).encode("utf-8")
-        h = hashlib.sha1(concat).hexdigest()[:16]
-        response.headers["ETag"] = f'W/"routes-{len(routes)}-{h}"'
-    except Exception:
-        pass
-    response.headers["Cache-Control"] = "public, max-age=600"
-    return {"routes": routes}
+    return sorted(list({r for r in routes if isinstance(r, str) and r.strip()}))
+
+
+@router.get("/{route_id}/shape")
+async def get_route_shape(
+    request: Request,
+    response: Response,
+    route_id: str,
+    zoom: float = Query(default=12, ge=0, le=24, description="map zoom; picks the simplification level"),
+):
+    """Route line as a GeoJSON MultiLineString, simplified for the given zoom.
+
+    Lines come precomputed from the compiled GTFS index (one set per level in
+    ``gtfs.SHAPE_ZOOMS``); ``properties.zoom`` is the level served.
+    """
+    snap = get_gtfs()
+    found = snap.shape(route_id, zoom)
+    if found is None:
+        raise HTTPException(status_code=404, detail=f"no shape for route {route_id}")
+    level, lines = found
+    etag = make_etag(snap.etag, "shape", route_id, level)
+    if etag_matches(request, etag):
+        return not_modified(etag, ROUTES_CACHE_CONTROL)
+    body = {
+        "type": "Feature",
+        "geometry": {"type": "MultiLineString", "coordinates": lines},
+        "properties": {"route_id": route_id, "zoom": level, "points": sum(len(line) for line in lines)},
+    }
+    if get_settings().API_FAST_JSON:
+        return json_response(dumps(body), etag, ROUTES_CACHE_CONTROL)
+    set_validators(response, etag, ROUTES_CACHE_CONTROL)
+    return body
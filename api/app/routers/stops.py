@@ -1,127 +1,52 @@
 from __future__ import annotations
 
-import csv
-import io
-import os
-import zipfile
-from typing import Dict, List
-import hashlib
-
-from fastapi import APIRouter, Response
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import APIRouter, HTTPException, Query, Request, Response
 from pydantic import BaseModel
 
 from ..core.config import get_settings
+from ..core.etag import etag_matches, make_etag, not_modified, set_validators
+from ..core.fastjson import dumps, json_response
 from ..core.logging import get_logger
+from ..core.tiles import CLUSTER_MAX_ZOOM, BBox, get_stop_index, parse_bbox
+from ..gtfs import get_gtfs, load_gtfs
 
 
 router = APIRouter(prefix="/stops", tags=["stops"]) 
 
-_CACHED_STOPS: List[Dict] | None = None
-_CACHED_ROUTES: List[str] | None = None
-_CACHED_STOPS_ETAG: str | None = None
-
-
-def _extract_stops_from_reader(reader: csv.DictReader) -> List[Dict]:
-    rows: List[Dict] = []
-    seen: set[str] = set()
-    for row in reader:
-        sid = (row.get("stop_id") or "").strip()
-        if not sid or sid in seen:
-            continue
-        seen.add(sid)
-        name = (row.get("stop_name") or "").strip()
-        lat_s = row.get("stop_lat") or ""
-        lon_s = row.get("stop_lon") or ""
-        try:
-            lat = float(lat_s)
-            lon = float(lon_s)
-        except Exception:
-            continue
-        rows.append({
-            "stop_id": sid,
-            "stop_name": name,
-            "lat": lat,
-            "lon": lon,
-            "routes": [],
-        })
-    return rows
-
-
-def _load_from_zip(zip_path: str, filename: str) -> List[Dict]:
-    log = get_logger(__name__)
-    with zipfile.ZipFile(zip_path) as zf:
-        target_name = None
-        for info in zf.infolist():
-            if info.filename.endswith(filename):
-                target_name = info.filename
-                break
-        if not target_name:
-            log.warning("%s not found in zip: %s", filename, zip_path)
-            return []
-        with zf.open(target_name, "r") as f:
-            text = io.TextIOWrapper(f, encoding="utf-8")
-            reader = csv.DictReader(text)
-            if filename == "stops.txt":
-                return _extract_stops_from_reader(reader)
-            else:
-                return [dict(r) for r in reader]
-
-
-def _load_from_dir(dir_path: str, filename: str) -> List[Dict]:
-    log = get_logger(__name__)
-    path = os.path.join(dir_path, filename)
-    if not os.path.exists(path):
-        log.warning("%s not found in dir: %s", filename, dir_path)
-        return []
-    with open(path, "r", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        if filename == "stops.txt":
-            return _extract_stops_from_reader(reader)
-        else:
-            return [dict(r) for r in reader]
+STOPS_CACHE_CONTROL = "public, max-age=600"
 
 
 def _load_routes_from_static() -> List[str]:
-    s = get_settings()
-    routes: List[Dict] = []
-    if s.MTA_GTFS_STATIC_PATH and os.path.exists(s.MTA_GTFS_STATIC_PATH) and zipfile.is_zipfile(s.MTA_GTFS_STATIC_PATH):
-        routes = _load_from_zip(s.MTA_GTFS_STATIC_PATH, "routes.txt")
-    else:
-        routes = _load_from_dir(s.GTFS_STATIC_DIR, "routes.txt")
-    vals = []
-    for r in routes:
-        rid = (r.get("route_id") or "").strip()
-        if rid:
-            vals.append(rid)
-    return sorted(list({*vals}))
+    return get_gtfs().routes
 
 
 def _load_stops() -> List[Dict]:
-    global _CACHED_STOPS
-    if _CACHED_STOPS is not None:
-        return _CACHED_STOPS
-    s = get_settings()
-    log = get_logger(__name__)
-    stops: List[Dict] = []
-    if s.MTA_GTFS_STATIC_PATH and os.path.exists(s.MTA_GTFS_STATIC_PATH) and zipfile.is_zipfile(s.MTA_GTFS_STATIC_PATH):
-        stops = _load_from_zip(s.MTA_GTFS_STATIC_PATH, "stops.txt")
-    else:
-        stops = _load_from_dir(s.GTFS_STATIC_DIR, "stops.txt")
-    _CACHED_STOPS = stops
-    # compute weak ETag based on ids and count
-    try:
-        concat = ",".join(sorted([s.get("stop_id", "") for s in stops])).encode("utf-8")
-        h = hashlib.sha1(concat).hexdigest()[:16]
-        global _CACHED_STOPS_ETAG
-        _CACHED_STOPS_ETAG = f'W/"stops-{len(stops)}-{h}"'
-    except Exception:
-        _CACHED_STOPS_ETAG = None
-    log.info("loaded {} stops", len(stops))
-    return stops
+    """Stops from the compiled GTFS index (routes served per stop included)."""
+    return get_gtfs().stops
 
 
 def prime_stops_cache() -> None:
-    _ = _load_stops()
+    snap = load_gtfs()
+    get_logger(__name__).info("loaded {} stops", len(snap.stops))
+
+
+_STOP_FIELDS = ("stop_id", "stop_name", "lat", "lon", "routes", "point_count")
+_encoded: Optional[Tuple[List[Dict], bytes]] = None
+
+
+def _project(st: Dict) -> Dict:
+    """The StopOut fields a stop record sets (as response_model_exclude_unset would emit)."""
+    return {k: st[k] for k in _STOP_FIELDS if k in st}
+
+
+def encoded_stops(stops: List[Dict]) -> bytes:
+    """JSON body of the full stop list, encoded once per stop list object."""
+    global _encoded
+    if _encoded is None or _encoded[0] is not stops:
+        _encoded = (stops, dumps([_project(st) for st in stops]))
+    return _encoded[1]
 
 
 class StopOut(BaseModel):
@@ -130,13 +55,51 @@ class StopOut(BaseModel):
     lat: float
     lon: float
     routes: List[str] | None = None
+    # Set only on clustered entries (zoom below CLUSTER_MAX_ZOOM)
+    point_count: int | None = None
 
 
-@router.get("", response_model=List[StopOut])
-async def list_stops(response: Response) -> List[Dict]:
+@router.get("", response_model=List[StopOut], response_model_exclude_unset=True)
+async def list_stops(
+    request: Request,
+    response: Response,
+    bbox: str | None = Query(default=None, description="min_lon,min_lat,max_lon,max_lat; only stops inside"),
+    zoom: float | None = Query(default=None, ge=0, le=24, description="map zoom; below 12 stops are clustered"),
+):
     data = _load_stops()
-    # caching headers
-    response.headers["Cache-Control"] = "public, max-age=600"
-    if _CACHED_STOPS_ETAG:
-        response.headers["ETag"] = _CACHED_STOPS_ETAG
-    return data
+    try:
+        box = parse_bbox(bbox)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    clustered = zoom is not None and zoom < CLUSTER_MAX_ZOOM
+    etag = get_gtfs().etag
+    if box is not None or clustered:
+        etag = make_etag(etag, box, zoom if clustered else None)
+    if etag_matches(request, etag):
+        return not_modified(etag, STOPS_CACHE_CONTROL)
+    fast = get_settings().API_FAST_JSON
+    if box is None and not clustered:
+        if fast:
+            return json_response(encoded_stops(data), etag, STOPS_CACHE_CONTROL)
+        set_validators(response, etag, STOPS_CACHE_CONTROL)
+        return data
+    out = _viewport_stops(data, box, zoom if clustered else None)
+    if fast:
+        return json_response(dumps([_project(st) for st in out]), etag, STOPS_CACHE_CONTROL)
+    set_validators(response, etag, STOPS_CACHE_CONTROL)
+    return out
+
+
+def _viewport_stops(data: List[Dict], box: Optional[BBox], zoom: Optional[float]) -> List[Dict]:
+    index = get_stop_index(data)
+    ids = index.ids_in_bbox(box) if box is not None else set(index.by_id)
+    if zoom is None:
+        return [st for st in data if st["stop_id"] in ids]
+    out: List[Dict] = []
+    for group in index.clusters(ids, zoom):
+        if len(group) == 1:
+            out.append(index.by_id[group[0]])
+            continue
+        lon, lat = index.centroid(group)
+        out.append({"stop_id": f"cluster:{group[0]}", "stop_name": None, "lat": lat, "lon": lon, "point_count": len(group)})
+    return out
@@ -0,0 +1,270 @@
+from __future__ import annotations
+
+import asyncio
+import json
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from fastapi import APIRouter, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func, select
+from sqlalchemy.orm import sessionmaker
+from starlette.concurrency import run_in_threadpool
+
+from ..core.broadcast import ALL, Broadcaster, topic_for
+from ..core.config import get_settings
+from ..core.logging import get_logger
+from ..core.tiles import get_stop_index
+from ..models import SCORING_DONE, Score
+from ..storage.notify import add_listener
+from ..storage.session import get_engine
+from .anomalies import build_item
+from .heatmap import build_feature
+from .stops import _load_stops
+
+
+router = APIRouter(prefix="/stream", tags=["stream"])  # /api/stream
+
+# Re-read this much of scored_at history each tick: concurrent trainer workers
+# can commit rows whose scored_at is slightly older than the newest one seen
+OVERLAP_SEC = 5.0
+MAX_ROWS = 5000
+STOP_CHUNK = 500
+
+
+def _aware(ts: Optional[datetime]) -> Optional[datetime]:
+    if ts is not None and ts.tzinfo is None:
+        return ts.replace(tzinfo=timezone.utc)
+    return ts
+
+
+def _window_label(seconds: int) -> str:
+    # Same spelling the UI passes to /api/heatmap
+    return f"{seconds // 60}m"
+
+
+def sse(event: str, data: object) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n".encode("utf-8")
+
+
+class StreamFeed:
+    """Single server-side feed behind /api/stream.
+
+    While anyone is subscribed, one task wakes on NOTIFY scores_changed (or every
+    STREAM_POLL_SEC), reads rows scored since its cursor, and publishes per topic:
+    ``anomalies`` (new rows at or above STREAM_MIN_SCORE) and ``heatmap`` (re-aggregated
+    features for the stops those rows touched). DB work and encoding happen once per
+    tick, regardless of how many clients are connected.
+    """
+
+    def __init__(self, broadcaster: Optional[Broadcaster] = None) -> None:
+        self.broadcaster = broadcaster or Broadcaster(get_settings().STREAM_QUEUE_SIZE)
+        self.cursor = datetime.now(timezone.utc)
+        self._seen: Dict[int, datetime] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self.ticks = 0
+
+    def ensure_started(self) -> None:
+        if self._task is not None and not self._task.done():
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        add_listener(self._on_notify)
+        self._task = self._loop.create_task(self._run())
+
+    def _on_notify(self, _payload: str) -> None:
+        # Called from the listener thread
+        loop, wake = self._loop, self._wake
+        if loop is not None and wake is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(wake.set)
+
+    async def _run(self) -> None:
+        log = get_logger(__name__)
+        poll = get_settings().STREAM_POLL_SEC
+        while self.broadcaster.subscriber_count() > 0:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=poll)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            topics = self.broadcaster.topics()
+            if not topics:
+                break
+            try:
+                messages = await run_in_threadpool(self.collect, topics)
+            except Exception as e:
+                log.warning("stream feed tick failed: {}", repr(e))
+                continue
+            for topic, message in messages:
+                self.broadcaster.publish(topic, message)
+            self.ticks += 1
+        self._task = None
+
+    def collect(self, topics: Iterable[str]) -> List[Tuple[str, bytes]]:
+        """Read newly scored rows and return encoded (topic, message) pairs for the given topics."""
+        s = get_settings()
+        topics = set(topics)
+        SessionLocal = sessionmaker(bind=get_engine(), autoflush=False, autocommit=False, future=True)
+        with SessionLocal() as session:
+            rows = session.execute(
+                select(
+                    Score.id,
+                    Score.scored_at,
+                    Score.observed_ts,
+                    Score.event_ts,
+                    Score.route_id,
+                    Score.stop_id,
+                    Score.anomaly_score,
+                    Score.residual,
+                )
+                .where(Score.scoring_state == SCORING_DONE)
+                .where(Score.scored_at > self.cursor - timedelta(seconds=OVERLAP_SEC))
+                .order_by(Score.scored_at, Score.id)
+                .limit(MAX_ROWS)
+            ).all()
+            fresh = [r for r in rows if r.id not in self._seen]
+            self._advance(rows, stuck=len(rows) >= MAX_ROWS and not fresh)
+            if not fresh:
+                return []
+            changed = {r.stop_id for r in fresh}
+            agg = self._aggregate(session, changed, datetime.now(timezone.utc) - timedelta(seconds=s.STREAM_WINDOW_SEC))
+
+        stops = get_stop_index(_load_stops()).by_id
+        window = _window_label(s.STREAM_WINDOW_SEC)
+        hot = [r for r in fresh if r.anomaly_score is not None and r.anomaly_score >= s.STREAM_MIN_SCORE]
+        hot.sort(key=lambda r: _aware(r.observed_ts), reverse=True)
+        out: List[Tuple[str, bytes]] = []
+        for topic in sorted(topics):
+            mine = fresh if topic == ALL else [r for r in fresh if r.route_id == topic]
+            if not mine:
+                continue
+            items = [
+                build_item(stops, r.observed_ts, r.event_ts, r.route_id, r.stop_id, r.anomaly_score, r.residual)
+                for r in hot
+                if topic == ALL or r.route_id == topic
+            ]
+            if items:
+                out.append((topic, sse("anomalies", {"min_score": s.STREAM_MIN_SCORE, "items": items})))
+            features = []
+            for sid in sorted({r.stop_id for r in mine}):
+                st = stops.get(sid)
+                entry = agg.get((sid, topic))
+                if st is None or entry is None:
+                    continue
+                features.append(build_feature(st, *entry))
+            if features:
+                out.append((topic, sse("heatmap", {"window": window, "route_id": topic, "features": features})))
+        return out
+
+    def _advance(self, rows, stuck: bool = False) -> None:
+        for r in rows:
+            ts = _aware(r.scored_at)
+            self._seen[r.id] = ts
+            if ts > self.cursor:
+                self.cursor = ts
+        if stuck:
+            # A full page of already-seen rows: skip ahead rather than re-reading the overlap forever
+            self.cursor = max(self.cursor, _aware(rows[-1].scored_at) + timedelta(seconds=OVERLAP_SEC))
+        horizon = self.cursor - timedelta(seconds=OVERLAP_SEC)
+        self._seen = {k: v for k, v in self._seen.items() if v > horizon}
+
+    def _aggregate(self, session, stop_ids: Iterable[str], since: datetime) -> Dict[Tuple[str, str], tuple]:
+        """Heatmap aggregates for the changed stops, per (stop, route) and per (stop, ALL).
+
+        Values are build_feature() arguments: route_id, avg score, avg residual,
+        max observed_ts, max event_ts. Sums and counts are fetched per route so the
+        all-routes value is combined without a second query.
+        """
+        ids = sorted(stop_ids)
+        parts: Dict[str, List[tuple]] = {}
+        for i in range(0, len(ids), STOP_CHUNK):
+            stmt = (
+                select(
+                    Score.stop_id,
+                    Score.route_id,
+                    func.sum(Score.anomaly_score),
+                    func.count(Score.anomaly_score),
+                    func.sum(Score.residual),
+                    func.count(Score.residual),
+                    func.max(Score.observed_ts),
+                    func.max(Score.event_ts),
+                )
+                .where(Score.observed_ts >= since)
+                .where(Score.stop_id.in_(ids[i : i + STOP_CHUNK]))
+                .group_by(Score.stop_id, Score.route_id)
+            )
+            for row in session.execute(stmt).all():
+                parts.setdefault(row[0], []).append(tuple(row[1:]))
+
+        def avg(total, n):
+            return float(total) / n if n else None
+
+        def latest(values):
+            values = [_aware(v) for v in values if v is not None]
+            return max(values) if values else None
+
+        out: Dict[Tuple[str, str], tuple] = {}
+        for sid, per_route in parts.items():
+            for route, s_sum, s_n, r_sum, r_n, obs, evt in per_route:
+                out[(sid, route)] = (route, avg(s_sum, s_n), avg(r_sum, r_n), _aware(obs), _aware(evt))
+            out[(sid, ALL)] = (
+                max(p[0] for p in per_route),
+                avg(sum(p[1] or 0.0 for p in per_route), sum(p[2] for p in per_route)),
+                avg(sum(p[3] or 0.0 for p in per_route), sum(p[4] for p in per_route)),
+                latest(p[5] for p in per_route),
+                latest(p[6] for p in per_route),
+            )
+        return out
+
+
+_feed: Optional[StreamFeed] = None
+
+
+def get_stream_feed() -> StreamFeed:
+    global _feed
+    if _feed is None:
+        _feed = StreamFeed()
+    return _feed
+
+
+@router.get("")
+async def stream(request: Request, route_id: str = Query(default="All")) -> StreamingResponse:
+    """Server-Sent Events: ``anomalies`` and ``heatmap`` deltas as the trainer commits.
+
+    Clients should load a snapshot from /api/heatmap and /api/anomalies first, then
+    merge events by stop_id; on reconnect, refetch the snapshot.
+    """
+    s = get_settings()
+    feed = get_stream_feed()
+    sub = feed.broadcaster.subscribe(route_id)
+    feed.ensure_started()
+
+    async def events():
+        try:
+            yield b"retry: 3000\n\n"
+            yield sse(
+                "hello",
+                {"route_id": topic_for(route_id), "window": _window_label(s.STREAM_WINDOW_SEC), "min_score": s.STREAM_MIN_SCORE},
+            )
+            while True:
+                if sub.overflowed and sub.queue.empty():
+                    # Fell behind and was dropped: end the stream so the client resyncs
+                    break
+                try:
+                    message = await asyncio.wait_for(sub.queue.get(), timeout=s.STREAM_HEARTBEAT_SEC)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield b": keepalive\n\n"
+                    continue
+                yield message
+        finally:
+            feed.broadcaster.unsubscribe(sub)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -2,18 +2,26 @@ from __future__ import annotations
 
 from datetime import datetime, timedelta, timezone
 
-from fastapi import APIRouter, Query
+from fastapi import APIRouter, Query, Request, Response
 from pydantic import BaseModel
 from sqlalchemy import func, select
 from sqlalchemy.orm import sessionmaker
 
+from ..core.cache import make_key
+from ..core.etag import data_etag, etag_matches, not_modified, set_validators
+from ..core.singleflight import cached_query
 from ..models import Score
-from ..deps import ts_pack
+from ..deps import parse_window, ts_pack
+from ..storage.hotstore import get_hot_store
+from ..storage.rollup import rollup_distinct
 from ..storage.session import get_engine
+from ..storage.watermark import data_watermark
 
 
 router = APIRouter(prefix="/summary", tags=["summary"])  # /api/summary
 
+DEFAULT_WINDOW_SEC = 15 * 60
+
 
 class SummaryOut(BaseModel):
     window: str
@@ -25,26 +33,63 @@ class SummaryOut(BaseModel):
     last_updated_utc: str | None = None
     last_updated_epoch_ms: int | None = None
     last_updated_ny: str | None = None
+    # stations_total / trains_active are HyperLogLog estimates (about 1-2% error)
+    approximate: bool = False
 
 
-def _parse_window(window: str) -> int:
-    # very small parser: supports Xm / Xh
-    s = window.strip().lower()
-    if s.endswith("m"):
-        n = int(s[:-1])
-        return n * 60
-    if s.endswith("h"):
-        n = int(s[:-1])
-        return n * 3600
-    return 15 * 60
+@router.get("", response_model=SummaryOut)
+async def get_summary(
+    request: Request,
+    response: Response,
+    window: str = Query(default="15m"),
+    exact: bool = Query(default=False, description="count distinct stops/pairs exactly instead of from sketches"),
+):
+    seconds = parse_window(window, DEFAULT_WINDOW_SEC)
+    key = make_key("summary", seconds)
+    watermark = await data_watermark()
+    # window is echoed in the body, so "60m" and "1h" get different tags
+    etag = data_etag(key, watermark, window, exact)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    set_validators(response, etag)
+    payload = await cached_query(key + (watermark, exact), _compute_summary, seconds, exact)
+    return {**payload, "window": window}
 
 
-@router.get("", response_model=SummaryOut)
-async def get_summary(window: str = Query(default="15m")) -> dict:
+def _compute_summary(seconds: int, exact: bool = False) -> dict:
     now = datetime.now(timezone.utc)
-    seconds = _parse_window(window)
     since = now - timedelta(seconds=seconds)
 
+    # The hot store's distinct counts are exact and cheap
+    hot = get_hot_store()
+    counts = hot.summary_counts(since) if hot is not None else None
+    if counts is None:
+        counts = _query_counts(since, now, exact)
+    return summary_payload(counts, counts["max_observed_ts"] or now)
+
+
+def summary_payload(counts: dict, last_updated: datetime) -> dict:
+    """SummaryOut fields (without window) from the window's counts (shared with /api/dashboard)."""
+    total_rows = counts["total_rows"]
+    anomalies_count = counts["anomalies_count"]
+    anomaly_rate = float(anomalies_count) / float(total_rows) * 100.0 if total_rows else 0.0
+
+    p = ts_pack(last_updated)
+    return {
+        "stations_total": int(counts["stations_total"]),
+        "trains_active": int(counts["trains_active"]),
+        "anomalies_count": int(anomalies_count),
+        "anomalies_high": int(counts["anomalies_high"]),
+        "anomaly_rate_perc": round(anomaly_rate, 2),
+        # Canonical timestamp fields based on observed_ts
+        "last_updated_utc": p["utc"],
+        "last_updated_epoch_ms": p["epoch_ms"],
+        "last_updated_ny": p["ny"],
+        "approximate": bool(counts.get("approximate", False)),
+    }
+
+
+def _query_counts(since: datetime, until: datetime, exact: bool = True) -> dict:
     engine = get_engine()
     SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
 
@@ -52,23 +97,12 @@ async def get_summary(window: str = Query(default="15m")) -> dict:
         total_rows = (
             session.execute(select(func.count(Score.id)).where(Score.observed_ts >= since)).scalar() or 0
         )
-        # important: apply .where() to the Select, not inside func.count(...)
-        stations_total = (
-            session.execute(
-                select(func.count(func.distinct(Score.stop_id))).where(Score.observed_ts >= since)
-            ).scalar()
-            or 0
-        )
-        # trains_active approximation: distinct (route_id, stop_id) with residual != 0
-        trains_active = (
-            session.execute(
-                select(func.count(func.distinct(func.concat(Score.route_id, ":", Score.stop_id))))
-                .where(Score.observed_ts >= since)
-                .where(Score.residual.isnot(None))
-                .where(Score.residual != 0)
-            ).scalar()
-            or 0
-        )
+        # Merged per-minute sketches replace the two distinct counts, the costliest part
+        distinct = None if exact else rollup_distinct(session, since, until)
+        if distinct is not None:
+            stations_total, trains_active = distinct["stations_total"], distinct["trains_active"]
+        else:
+            stations_total, trains_active = _exact_distinct(session, since)
         anomalies_count = (
             session.execute(
                 select(func.count(Score.id)).where(Score.observed_ts >= since).where(Score.anomaly_score >= 0.6)
@@ -82,21 +116,34 @@ async def get_summary(window: str = Query(default="15m")) -> dict:
             or 0
         )
 
-    anomaly_rate = float(anomalies_count) / float(total_rows) * 100.0 if total_rows else 0.0
-
     # Compute last_updated from max(observed_ts)
     with SessionLocal() as session:
         max_obs = session.execute(select(func.max(Score.observed_ts))).scalar()
-    p = ts_pack(max_obs or now)
     return {
-        "window": window,
-        "stations_total": int(stations_total),
-        "trains_active": int(trains_active),
-        "anomalies_count": int(anomalies_count),
-        "anomalies_high": int(anomalies_high),
-        "anomaly_rate_perc": round(anomaly_rate, 2),
-        # Canonical timestamp fields based on observed_ts
-        "last_updated_utc": p["utc"],
-        "last_updated_epoch_ms": p["epoch_ms"],
-        "last_updated_ny": p["ny"],
+        "total_rows": total_rows,
+        "stations_total": stations_total,
+        "trains_active": trains_active,
+        "anomalies_count": anomalies_count,
+        "anomalies_high": anomalies_high,
+        "max_observed_ts": max_obs,
+        "approximate": distinct is not None,
     }
+
+
+def _exact_distinct(session, since: datetime):
+    # important: apply .where() to the Select, not inside func.count(...)
+    stations_total = (
+        session.execute(select(func.count(func.distinct(Score.stop_id))).where(Score.observed_ts >= since)).scalar()
+        or 0
+    )
+    # trains_active approximation: distinct (route_id, stop_id) with an observed headway
+    trains_active = (
+        session.execute(
+            select(func.count(func.distinct(func.concat(Score.route_id, ":", Score.stop_id))))
+            .where(Score.observed_ts >= since)
+            .where(Score.headway_sec.isnot(None))
+            .where(Score.headway_sec > 0)
+        ).scalar()
+        or 0
+    )
+    return stations_total, trains_active
@@ -0,0 +1,852 @@
+"""In-process columnar store of recent ``scores`` rows.
+
+Dashboards only look at the last 15-60 minutes, so the API keeps that window in
+NumPy arrays (route/stop as integer codes, timestamps as epoch microseconds)
+and answers summary, heatmap and anomalies with vectorized reductions instead
+of a DB round trip. Before answering, the store catches up incrementally: rows
+with ``id`` above its high-water mark are appended and rows re-scored since its
+``scored_at`` mark are patched in place (ids are sorted, so a row is found by
+binary search). Requests for windows older than the store covers return None
+and the caller queries the DB as before.
+
+Rows are kept in id order and evicted from the front when they age out of
+HOT_STORE_WINDOW_SEC or the buffer reaches HOT_STORE_ROWS.
+
+With several worker processes, HOT_STORE_SHM_DIR makes the store shared: one
+worker, elected by an flock, refreshes it and publishes the columns as a
+segment file; every worker (the leader included) maps that file read-only and
+queries the columns in place through ``SharedHotStore``, so the window is held
+once per host in the page cache instead of once per worker.
+"""
+from __future__ import annotations
+
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.orm import sessionmaker
+
+from ..core.cache import get_response_cache
+from ..core.config import get_settings
+from ..core.filelock import try_lock, unlock
+from ..core.logging import get_logger
+from ..models import Score
+from .notify import add_listener
+from .session import get_engine
+from .watermark import WATERMARK_KEY, parse_watermark
+
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_US = timedelta(microseconds=1)
+NULL_TS = np.iinfo(np.int64).min
+# Same tolerance as the live stream: trainer workers may commit slightly older scored_at
+OVERLAP_SEC = 5.0
+LOAD_CHUNK = 50000
+_MIN_ALLOC = 4096
+
+# Shared segment: magic, JSON metadata length, metadata, then each column 64-byte aligned
+SEGMENT_MAGIC = b"MTAHOT\x00\x01"
+_SEGMENT_HEADER = struct.Struct("<8sI")
+_ALIGN = 64
+SEGMENT_NAME = "current"
+LEADER_LOCK = "refresher.lock"
+# How often followers retry the leader lock
+ELECTION_SEC = 5.0
+# How often a reader ahead of the segment re-checks for a newer one
+CATCHUP_POLL_SEC = 0.01
+
+# column name -> dtype; route/stop are codes into HotStore.routes / HotStore.stops
+COLUMNS: Dict[str, type] = {
+    "id": np.int64,
+    "observed": np.int64,
+    "event": np.int64,
+    "scored": np.int64,
+    "route": np.int32,
+    "stop": np.int32,
+    "score": np.float64,
+    "residual": np.float64,
+    "headway": np.float64,
+}
+
+
+def to_us(ts: Optional[datetime]) -> int:
+    """Epoch microseconds of ts (naive is UTC, as SQLite returns it); NULL_TS for None."""
+    if ts is None:
+        return NULL_TS
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return (ts - _EPOCH) // _US
+
+
+def from_us(us: int) -> Optional[datetime]:
+    if us == NULL_TS:
+        return None
+    return _EPOCH + timedelta(microseconds=int(us))
+
+
+def _nan(v: Optional[float]) -> float:
+    return np.nan if v is None else float(v)
+
+
+def _aligned(n: int) -> int:
+    return (n + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+class HotStore:
+    """Recent scores as parallel NumPy columns, refreshed incrementally from the DB."""
+
+    def __init__(self, capacity: int, window_sec: float) -> None:
+        self.capacity = max(1, int(capacity))
+        self.window_sec = float(window_sec)
+        self.cols: Dict[str, np.ndarray] = {k: np.empty(0, dtype=t) for k, t in COLUMNS.items()}
+        self.n = 0
+        self.routes: List[str] = []
+        self.stops: List[str] = []
+        self._route_code: Dict[str, int] = {}
+        self._stop_code: Dict[str, int] = {}
+        # Every row with observed_ts >= covers_us is in the store
+        self.covers_us: Optional[int] = None
+        self.max_id = 0
+        self.scored_us = NULL_TS
+        # Start of the last refresh: everything committed before it is reflected
+        self.synced_us = NULL_TS
+        # Bumped on every change, so an unchanged store is not republished
+        self.version = 0
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._refresh_began = 0.0
+        self.refreshes = 0
+        self.hits = 0
+        self.fallbacks = 0
+        self.evicted = 0
+
+    @property
+    def ready(self) -> bool:
+        return self._loaded
+
+    # ---- maintenance -------------------------------------------------
+
+    def _code(self, table: Dict[str, int], names: List[str], value: str) -> int:
+        code = table.get(value)
+        if code is None:
+            code = table[value] = len(names)
+            names.append(value)
+        return code
+
+    def _reserve(self, extra: int) -> None:
+        """Room for extra more rows: grow up to capacity, then evict the oldest rows."""
+        need = self.n + extra
+        alloc = len(self.cols["id"])
+        if need <= alloc:
+            return
+        if need > self.capacity:
+            # Evict an extra eighth so a full buffer does not shift on every refresh
+            self._evict(min(self.n, need - self.capacity + self.capacity // 8))
+            need = self.n + extra
+            if need <= alloc:
+                return
+        size = min(self.capacity, max(_MIN_ALLOC, alloc * 2, need))
+        size = max(size, need)
+        for k, arr in self.cols.items():
+            grown = np.empty(size, dtype=arr.dtype)
+            grown[: self.n] = arr[: self.n]
+            self.cols[k] = grown
+
+    def _evict(self, count: int) -> None:
+        if count <= 0:
+            return
+        gone = self.cols["observed"][:count]
+        # Rows observed after every evicted row are all still here
+        floor = NULL_TS if self.covers_us is None else self.covers_us
+        self.covers_us = max(floor, int(gone.max()) + 1)
+        for k, arr in self.cols.items():
+            arr[: self.n - count] = arr[count : self.n]
+        self.n -= count
+        self.evicted += count
+        self.version += 1
+
+    def _evict_aged(self, now_us: int) -> None:
+        horizon = now_us - int(self.window_sec * 1_000_000)
+        old = self.cols["observed"][: self.n] < horizon
+        # Leading run of aged rows (ids are in insert order, observed_ts nearly so)
+        count = int(np.argmin(old)) if not old.all() else self.n
+        self._evict(count)
+
+    def _append(self, rows: Sequence[tuple]) -> None:
+        if not rows:
+            return
+        if len(rows) > self.capacity:
+            # Only the newest capacity rows fit: everything held and the chunk's head goes
+            dropped, rows = rows[: -self.capacity], rows[-self.capacity :]
+            self._evict(self.n)
+            floor = NULL_TS if self.covers_us is None else self.covers_us
+            self.covers_us = max(floor, max(to_us(r[1]) for r in dropped) + 1)
+            self.evicted += len(dropped)
+        self._reserve(len(rows))
+        lo, hi = self.n, self.n + len(rows)
+        c = self.cols
+        c["id"][lo:hi] = [r[0] for r in rows]
+        c["observed"][lo:hi] = [to_us(r[1]) for r in rows]
+        c["event"][lo:hi] = [to_us(r[2]) for r in rows]
+        c["scored"][lo:hi] = [to_us(r[3]) for r in rows]
+        c["route"][lo:hi] = [self._code(self._route_code, self.routes, r[4]) for r in rows]
+        c["stop"][lo:hi] = [self._code(self._stop_code, self.stops, r[5]) for r in rows]
+        c["score"][lo:hi] = [_nan(r[6]) for r in rows]
+        c["residual"][lo:hi] = [_nan(r[7]) for r in rows]
+        c["headway"][lo:hi] = [_nan(r[8]) for r in rows]
+        self.n = hi
+        self.version += 1
+        self.max_id = max(self.max_id, int(rows[-1][0]))
+        self.scored_us = max(self.scored_us, int(c["scored"][lo:hi].max()))
+
+    def _patch(self, rows: Sequence[tuple]) -> None:
+        """Apply re-scored rows (id, scored_at, anomaly_score, residual) to rows still held."""
+        if not rows or not self.n:
+            return
+        ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+        pos = np.searchsorted(self.cols["id"][: self.n], ids)
+        pos[pos >= self.n] = 0
+        held = self.cols["id"][pos] == ids
+        c = self.cols
+        for i in np.nonzero(held)[0]:
+            j = pos[i]
+            _rid, scored, score, res = rows[i]
+            c["scored"][j] = to_us(scored)
+            c["score"][j] = _nan(score)
+            c["residual"][j] = _nan(res)
+        if held.any():
+            self.version += 1
+
+    def refresh(self) -> None:
+        """Catch up with the DB: first call loads the window, later ones read only changes."""
+        started = time.monotonic()
+        with self._lock:
+            # Another thread ran a whole refresh after we were called
+            if self._refresh_began > started:
+                return
+            self._refresh_began = time.monotonic()
+            SessionLocal = sessionmaker(bind=get_engine(), autoflush=False, autocommit=False, future=True)
+            row_cols = (
+                Score.id,
+                Score.observed_ts,
+                Score.event_ts,
+                Score.scored_at,
+                Score.route_id,
+                Score.stop_id,
+                Score.anomaly_score,
+                Score.residual,
+                Score.headway_sec,
+            )
+            now_us = to_us(datetime.now(timezone.utc))
+            with SessionLocal() as session:
+                if not self._loaded:
+                    # Marks first, so rows added or re-scored during the load are caught up next time
+                    max_id, max_scored = session.execute(select(func.max(Score.id), func.max(Score.scored_at))).one()
+                    since_us = now_us - int(self.window_sec * 1_000_000)
+                    stmt = (
+                        select(*row_cols)
+                        .where(Score.observed_ts >= from_us(since_us))
+                        .where(Score.id <= int(max_id or 0))
+                        .order_by(Score.id)
+                    )
+                    for chunk in session.execute(stmt.execution_options(yield_per=LOAD_CHUNK)).partitions():
+                        self._append(chunk)
+                    self.max_id = int(max_id or 0)
+                    # Nothing scored yet: anything scored from now on is newer than the load
+                    self.scored_us = to_us(max_scored) if max_scored is not None else now_us
+                    self.covers_us = since_us if self.covers_us is None else max(self.covers_us, since_us)
+                    self._loaded = True
+                else:
+                    rescored = session.execute(
+                        select(Score.id, Score.scored_at, Score.anomaly_score, Score.residual)
+                        .where(Score.scored_at >= from_us(self.scored_us - int(OVERLAP_SEC * 1_000_000)))
+                        .where(Score.observed_ts >= from_us(self.covers_us))
+                        .where(Score.id <= self.max_id)
+                    ).all()
+                    self._patch(rescored)
+                    for r in rescored:
+                        self.scored_us = max(self.scored_us, to_us(r[1]))
+                    while True:
+                        chunk = session.execute(
+                            select(*row_cols).where(Score.id > self.max_id).order_by(Score.id).limit(LOAD_CHUNK)
+                        ).all()
+                        self._append(chunk)
+                        if len(chunk) < LOAD_CHUNK:
+                            break
+            self._evict_aged(now_us)
+            self.synced_us = now_us
+            self.refreshes += 1
+
+    def publish(self, path: str) -> int:
+        """Write the held rows as a segment and atomically replace path with it; returns its size."""
+        with self._lock:
+            n = self.n
+            offsets: Dict[str, int] = {}
+            rel = 0
+            for k, t in COLUMNS.items():
+                offsets[k] = rel
+                rel = _aligned(rel + n * np.dtype(t).itemsize)
+            meta = json.dumps(
+                {
+                    "n": n,
+                    "window_sec": self.window_sec,
+                    "covers_us": self.covers_us,
+                    "max_id": self.max_id,
+                    "scored_us": self.scored_us,
+                    "synced_us": self.synced_us,
+                    "published": time.time(),
+                    "routes": self.routes,
+                    "stops": self.stops,
+                    "columns": offsets,
+                }
+            ).encode()
+            base = _aligned(_SEGMENT_HEADER.size + len(meta))
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(_SEGMENT_HEADER.pack(SEGMENT_MAGIC, len(meta)))
+                f.write(meta)
+                pos = _SEGMENT_HEADER.size + len(meta)
+                for k in COLUMNS:
+                    f.write(b"\0" * (base + offsets[k] - pos))
+                    data = memoryview(self.cols[k][:n])
+                    f.write(data)
+                    pos = base + offsets[k] + data.nbytes
+            os.replace(tmp, path)
+            return pos
+
+    # ---- queries -----------------------------------------------------
+
+    def _sync(self) -> bool:
+        """Catch up before a query; False (use the DB) until the initial load is done."""
+        if not self.ready:
+            self.fallbacks += 1
+            return False
+        self.refresh()
+        return True
+
+    def _window(self, since: datetime, until: Optional[datetime] = None) -> Optional[np.ndarray]:
+        """Mask of held rows in [since, until]; None if the store does not cover since.
+
+        Callers hold the lock while using the mask.
+        """
+        since_us = to_us(since)
+        if since_us < self.covers_us:
+            self.fallbacks += 1
+            return None
+        self.hits += 1
+        obs = self.cols["observed"][: self.n]
+        mask = obs >= since_us
+        if until is not None:
+            mask &= obs <= to_us(until)
+        return mask
+
+    def _codes_mask(self, column: str, table: Dict[str, int], values: Sequence[str]) -> np.ndarray:
+        codes = [table[v] for v in values if v in table]
+        return np.isin(self.cols[column][: self.n], np.asarray(codes, dtype=np.int32))
+
+    def anomaly_rows(
+        self,
+        since: datetime,
+        routes: Sequence[str],
+        stops: Sequence[str],
+        min_score: Optional[float],
+        after: Optional[Tuple[datetime, int]],
+        limit: int,
+    ) -> Optional[List[tuple]]:
+        """Newest-first keyset page as (id, observed_ts, event_ts, route_id, stop_id, score, residual)."""
+        if not self._sync():
+            return None
+        with self._lock:
+            mask = self._window(since)
+            if mask is None:
+                return None
+            c = {k: v[: self.n] for k, v in self.cols.items()}
+            if routes:
+                mask &= self._codes_mask("route", self._route_code, routes)
+            if stops:
+                mask &= self._codes_mask("stop", self._stop_code, stops)
+            if min_score is not None:
+                mask &= c["score"] >= min_score
+            if after is not None:
+                t, rid = to_us(after[0]), int(after[1])
+                mask &= (c["observed"] < t) | ((c["observed"] == t) & (c["id"] < rid))
+            return self._page(c, np.nonzero(mask)[0], limit)
+
+    def _page(self, c: Dict[str, np.ndarray], idx: np.ndarray, limit: int) -> List[tuple]:
+        if len(idx) > limit:
+            # Partition on observed_ts first so only the candidates for the page get sorted
+            cut = np.partition(c["observed"][idx], len(idx) - limit)[len(idx) - limit]
+            idx = idx[c["observed"][idx] >= cut]
+        idx = idx[np.lexsort((-c["id"][idx], -c["observed"][idx]))][:limit]
+        return [
+            (
+                int(c["id"][i]),
+                from_us(c["observed"][i]),
+                from_us(c["event"][i]),
+                self.routes[c["route"][i]],
+                self.stops[c["stop"][i]],
+                None if np.isnan(c["score"][i]) else float(c["score"][i]),
+                None if np.isnan(c["residual"][i]) else float(c["residual"][i]),
+            )
+            for i in idx
+        ]
+
+    def heatmap_rows(
+        self, since: datetime, until: datetime, routes: Sequence[str], stop_ids: Optional[Sequence[str]] = None
+    ) -> Optional[List[tuple]]:
+        """Per-stop aggregates as (stop_id, avg score, avg residual, max observed, max event, max route_id).
+
+        Matches the SQL GROUP BY: NULL residuals/event_ts are ignored and
+        route_id is the lexicographic maximum.
+        """
+        if not self._sync():
+            return None
+        with self._lock:
+            mask = self._window(since, until)
+            if mask is None:
+                return None
+            c = {k: v[: self.n] for k, v in self.cols.items()}
+            if routes:
+                mask &= self._codes_mask("route", self._route_code, routes)
+            if stop_ids is not None:
+                mask &= self._codes_mask("stop", self._stop_code, stop_ids)
+            return self._heatmap(c, np.nonzero(mask)[0])
+
+    def _heatmap(self, c: Dict[str, np.ndarray], idx: np.ndarray) -> List[tuple]:
+        if not len(idx):
+            return []
+        groups = len(self.stops)
+        stop = c["stop"][idx]
+        count = np.bincount(stop, minlength=groups)
+        score_sum = np.bincount(stop, weights=c["score"][idx], minlength=groups)
+        res = c["residual"][idx]
+        has_res = ~np.isnan(res)
+        res_sum = np.bincount(stop[has_res], weights=res[has_res], minlength=groups)
+        res_n = np.bincount(stop[has_res], minlength=groups)
+        last_obs = np.full(groups, NULL_TS, dtype=np.int64)
+        np.maximum.at(last_obs, stop, c["observed"][idx])
+        last_evt = np.full(groups, NULL_TS, dtype=np.int64)
+        np.maximum.at(last_evt, stop, c["event"][idx])
+        order = np.argsort(np.asarray(self.routes, dtype=object))
+        rank = np.empty(len(order), dtype=np.int32)
+        rank[order] = np.arange(len(order), dtype=np.int32)
+        top_rank = np.full(groups, -1, dtype=np.int32)
+        np.maximum.at(top_rank, stop, rank[c["route"][idx]])
+        g = np.nonzero(count)[0]
+        avg_res = np.divide(res_sum[g], res_n[g], out=np.full(len(g), np.nan), where=res_n[g] > 0)
+        return [
+            (
+                self.stops[sg],
+                avg_s,
+                None if avg_r != avg_r else avg_r,  # NaN: no residuals
+                from_us(obs),
+                from_us(evt),
+                self.routes[order[rk]],
+            )
+            for sg, avg_s, avg_r, obs, evt, rk in zip(
+                g.tolist(),
+                (score_sum[g] / count[g]).tolist(),
+                avg_res.tolist(),
+                last_obs[g].tolist(),
+                last_evt[g].tolist(),
+                top_rank[g].tolist(),
+            )
+        ]
+
+    def stop_route_rows(self, since: datetime, until: datetime, routes: Sequence[str]) -> Optional[List[tuple]]:
+        """Per (stop, route) partial sums as
+        (stop_id, route_id, rows, score sum, residual count, residual sum, max observed, max event).
+
+        Sums rather than averages, so callers can fold platforms into stations.
+        """
+        if not self._sync():
+            return None
+        with self._lock:
+            mask = self._window(since, until)
+            if mask is None:
+                return None
+            c = {k: v[: self.n] for k, v in self.cols.items()}
+            if routes:
+                mask &= self._codes_mask("route", self._route_code, routes)
+            idx = np.nonzero(mask)[0]
+            if not len(idx):
+                return []
+            groups = max(1, len(self.stops))
+            keys, inv = np.unique(c["route"][idx].astype(np.int64) * groups + c["stop"][idx], return_inverse=True)
+            count = np.bincount(inv, minlength=len(keys))
+            score_sum = np.bincount(inv, weights=c["score"][idx], minlength=len(keys))
+            res = c["residual"][idx]
+            has_res = ~np.isnan(res)
+            res_n = np.bincount(inv[has_res], minlength=len(keys))
+            res_sum = np.bincount(inv[has_res], weights=res[has_res], minlength=len(keys))
+            last_obs = np.full(len(keys), NULL_TS, dtype=np.int64)
+            np.maximum.at(last_obs, inv, c["observed"][idx])
+            last_evt = np.full(len(keys), NULL_TS, dtype=np.int64)
+            np.maximum.at(last_evt, inv, c["event"][idx])
+            return [
+                (self.stops[k % groups], self.routes[k // groups], n, ss, rn, rs, from_us(obs), from_us(evt))
+                for k, n, ss, rn, rs, obs, evt in zip(
+                    keys.tolist(),
+                    count.tolist(),
+                    score_sum.tolist(),
+                    res_n.tolist(),
+                    res_sum.tolist(),
+                    last_obs.tolist(),
+                    last_evt.tolist(),
+                )
+            ]
+
+    def timeline_rows(
+        self, since: datetime, until: datetime, step_sec: int, routes: Sequence[str]
+    ) -> Optional[List[tuple]]:
+        """Average score per (time bucket, stop) as (bucket index, stop_id, avg score).
+
+        Buckets are step_sec wide from since; rows observed at until or later are excluded.
+        """
+        if not self._sync():
+            return None
+        with self._lock:
+            mask = self._window(since)
+            if mask is None:
+                return None
+            c = {k: v[: self.n] for k, v in self.cols.items()}
+            mask &= c["observed"] < to_us(until)
+            if routes:
+                mask &= self._codes_mask("route", self._route_code, routes)
+            idx = np.nonzero(mask)[0]
+            if not len(idx):
+                return []
+            groups = max(1, len(self.stops))
+            bucket = (c["observed"][idx] - to_us(since)) // (int(step_sec) * 1_000_000)
+            keys, inv = np.unique(bucket * groups + c["stop"][idx], return_inverse=True)
+            sums = np.bincount(inv, weights=c["score"][idx])
+            counts = np.bincount(inv)
+            return [
+                (k // groups, self.stops[k % groups], sm / n)
+                for k, sm, n in zip(keys.tolist(), sums.tolist(), counts.tolist())
+            ]
+
+    def summary_counts(self, since: datetime) -> Optional[dict]:
+        """Counts behind /api/summary for rows observed since, plus the newest observed_ts held."""
+        if not self._sync():
+            return None
+        with self._lock:
+            mask = self._window(since)
+            if mask is None or not self.n:
+                return None
+            c = {k: v[: self.n] for k, v in self.cols.items()}
+            return {**self._counts(c, mask), "max_observed_ts": from_us(int(c["observed"].max()))}
+
+    def _counts(self, c: Dict[str, np.ndarray], mask: np.ndarray) -> dict:
+        stop = c["stop"][mask]
+        moving = c["headway"][mask] > 0  # NaN compares False
+        pairs = c["route"][mask][moving].astype(np.int64) * max(1, len(self.stops)) + stop[moving]
+        score = c["score"][mask]
+        # Codes are dense, so distinct counts are bincounts rather than sorts
+        return {
+            "total_rows": int(mask.sum()),
+            "stations_total": int(np.count_nonzero(np.bincount(stop))),
+            "trains_active": int(np.count_nonzero(np.bincount(pairs))),
+            "anomalies_count": int((score >= 0.6).sum()),
+            "anomalies_high": int((score >= 0.85).sum()),
+        }
+
+    def dashboard(self, since: datetime, until: datetime, routes: Sequence[str], limit: int) -> Optional[dict]:
+        """Summary counts, heatmap rows and the first anomalies page, all from one window mask."""
+        if not self._sync():
+            return None
+        with self._lock:
+            mask = self._window(since, until)
+            if mask is None:
+                return None
+            c = {k: v[: self.n] for k, v in self.cols.items()}
+            if routes:
+                mask &= self._codes_mask("route", self._route_code, routes)
+            idx = np.nonzero(mask)[0]
+            return {"counts": self._counts(c, mask), "heatmap": self._heatmap(c, idx), "anomalies": self._page(c, idx, limit)}
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "rows": self.n,
+                "capacity": self.capacity,
+                "allocated_rows": len(self.cols["id"]),
+                "memory_bytes": int(sum(a.nbytes for a in self.cols.values())),
+                "routes": len(self.routes),
+                "stops": len(self.stops),
+                "window_sec": self.window_sec,
+                "covers_since": from_us(self.covers_us).isoformat() if self.covers_us is not None else None,
+                "max_id": self.max_id,
+                "refreshes": self.refreshes,
+                "hits": self.hits,
+                "fallbacks": self.fallbacks,
+                "evicted": self.evicted,
+            }
+
+
+class SharedHotStore(HotStore):
+    """Read-only HotStore over the segment a refresher publishes.
+
+    Columns are ``np.frombuffer`` views of a read-only mmap, so workers share
+    the segment's pages instead of copying them. A newly published segment is
+    mapped on the next query; queries already running keep the previous
+    mapping, which is unmapped once the last view of it is dropped.
+    """
+
+    def __init__(self, path: str, capacity: int, window_sec: float) -> None:
+        super().__init__(capacity, window_sec)
+        self.path = path
+        self.published_at = 0.0
+        self.remaps = 0
+        self.catchups = 0
+        self._mapped: Optional[Tuple[int, int]] = None
+        self._segment_bytes = 0
+
+    def refresh(self) -> None:
+        self._attach()
+
+    def _attach(self) -> bool:
+        """Map the current segment if it changed; False while none has been published."""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return self._mapped is not None
+        if (st.st_ino, st.st_mtime_ns) == self._mapped:
+            return True
+        with open(self.path, "rb") as f:
+            # The segment actually opened, which may be newer than the one stat'ed
+            st = os.fstat(f.fileno())
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, meta_len = _SEGMENT_HEADER.unpack_from(mm, 0)
+        if magic != SEGMENT_MAGIC:
+            raise ValueError(f"not a hot store segment: {self.path}")
+        meta = json.loads(mm[_SEGMENT_HEADER.size : _SEGMENT_HEADER.size + meta_len])
+        base = _aligned(_SEGMENT_HEADER.size + meta_len)
+        n = int(meta["n"])
+        cols = {k: np.frombuffer(mm, dtype=t, count=n, offset=base + meta["columns"][k]) for k, t in COLUMNS.items()}
+        with self._lock:
+            self.cols = cols
+            self.n = n
+            self.routes = meta["routes"]
+            self.stops = meta["stops"]
+            self._route_code = {v: i for i, v in enumerate(self.routes)}
+            self._stop_code = {v: i for i, v in enumerate(self.stops)}
+            self.covers_us = meta["covers_us"]
+            self.max_id = meta["max_id"]
+            self.scored_us = meta["scored_us"]
+            self.synced_us = meta["synced_us"]
+            self.published_at = meta["published"]
+            self._segment_bytes = st.st_size
+            self._mapped = (st.st_ino, st.st_mtime_ns)
+            self._loaded = True
+            self.remaps += 1
+        return True
+
+    def _behind(self) -> bool:
+        """True when this process's watermark has seen rows or scores the segment has not."""
+        watermark = get_response_cache().peek(WATERMARK_KEY)
+        if watermark is None:
+            return False
+        max_id, _obs_ms, scored_ms = parse_watermark(watermark)
+        return max_id > self.max_id or scored_ms > self.synced_us // 1000
+
+    def _try_attach(self) -> bool:
+        try:
+            return self._attach()
+        except (OSError, ValueError, struct.error) as e:
+            get_logger(__name__).warning("cannot map hot store segment {}: {}", self.path, repr(e))
+            return False
+
+    def _sync(self) -> bool:
+        """Map the latest segment; False (use the DB) if there is none or it lags the data.
+
+        NOTIFY drops the cached watermark and wakes the leader at the same moment,
+        so the first request for a new watermark usually arrives before the
+        segment does; it waits up to HOT_STORE_CATCHUP_SEC for the leader to
+        publish rather than sending the one cached computation to the DB.
+        """
+        attached = self._try_attach()
+        if attached and self._behind():
+            deadline = time.monotonic() + get_settings().HOT_STORE_CATCHUP_SEC
+            while attached and self._behind() and time.monotonic() < deadline:
+                time.sleep(CATCHUP_POLL_SEC)
+                attached = self._try_attach()
+            if attached and not self._behind():
+                self.catchups += 1
+        if not attached or self._behind():
+            self.fallbacks += 1
+            return False
+        return True
+
+    def stats(self) -> dict:
+        out = super().stats()
+        with self._lock:
+            out.update(
+                {
+                    "segment": self.path,
+                    "allocated_rows": self.n,
+                    "memory_bytes": self._segment_bytes,
+                    "published_age_sec": round(time.time() - self.published_at, 3) if self.published_at else None,
+                    "remaps": self.remaps,
+                    "catchups": self.catchups,
+                    "leader": _refresher is not None and _refresher.leader,
+                }
+            )
+        return out
+
+
+class HotStoreRefresher(threading.Thread):
+    """Refreshes a private HotStore and publishes it, in the one worker holding LEADER_LOCK.
+
+    Every worker runs one; the others retry the lock every ELECTION_SEC, so a
+    new leader takes over when the current one exits. The leader republishes
+    every poll_sec, or at once when woken by NOTIFY.
+    """
+
+    def __init__(self, store: HotStore, directory: str, poll_sec: float) -> None:
+        super().__init__(name="hot-store-refresher", daemon=True)
+        self.store = store
+        self.directory = directory
+        self.poll_sec = float(poll_sec)
+        self.publishes = 0
+        self._published_version = -1
+        self._fd: Optional[int] = None
+        self._stopping = threading.Event()
+        self._wake = threading.Event()
+
+    @property
+    def leader(self) -> bool:
+        return self._fd is not None
+
+    def wake(self, _payload: Optional[str] = None) -> None:
+        self._wake.set()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        self._wake.set()
+
+    def publish_once(self) -> bool:
+        """Refresh and publish if anything changed; True when a segment was written."""
+        first = not self.store.ready
+        t0 = time.perf_counter()
+        self.store.refresh()
+        if self.store.version == self._published_version:
+            return False
+        size = self.store.publish(os.path.join(self.directory, SEGMENT_NAME))
+        self._published_version = self.store.version
+        self.publishes += 1
+        if first:
+            get_logger(__name__).info(
+                "hot store loaded {} rows and published {:.1f} MB in {:.0f}ms",
+                self.store.n,
+                size / 1e6,
+                (time.perf_counter() - t0) * 1000.0,
+            )
+        return True
+
+    def run(self) -> None:
+        log = get_logger(__name__)
+        try:
+            while not self._stopping.is_set():
+                if self._fd is None:
+                    self._fd = try_lock(os.path.join(self.directory, LEADER_LOCK))
+                    if self._fd is None:
+                        self._stopping.wait(ELECTION_SEC)
+                        continue
+                    log.info("hot store refresher elected in pid {}", os.getpid())
+                try:
+                    self.publish_once()
+                except Exception as e:
+                    log.warning("hot store refresh failed: {}; workers use the DB meanwhile", repr(e))
+                self._wake.wait(self.poll_sec)
+                self._wake.clear()
+        finally:
+            if self._fd is not None:
+                unlock(self._fd)
+                self._fd = None
+
+
+_store: Optional[HotStore] = None
+_loader: Optional[threading.Thread] = None
+_refresher: Optional[HotStoreRefresher] = None
+
+
+def get_hot_store() -> Optional[HotStore]:
+    """The process-wide store (shared with HOT_STORE_SHM_DIR), or None when HOT_STORE_ROWS is 0."""
+    global _store
+    s = get_settings()
+    if s.HOT_STORE_ROWS <= 0:
+        return None
+    if _store is None:
+        if s.HOT_STORE_SHM_DIR:
+            path = os.path.join(s.HOT_STORE_SHM_DIR, SEGMENT_NAME)
+            _store = SharedHotStore(path, s.HOT_STORE_ROWS, s.HOT_STORE_WINDOW_SEC)
+        else:
+            _store = HotStore(s.HOT_STORE_ROWS, s.HOT_STORE_WINDOW_SEC)
+    return _store
+
+
+def _initial_load(store: HotStore) -> None:
+    log = get_logger(__name__)
+    t0 = time.perf_counter()
+    try:
+        store.refresh()
+    except Exception as e:
+        log.warning("hot store load failed: {}; serving from the DB", repr(e))
+        return
+    st = store.stats()
+    log.info(
+        "hot store loaded {} rows ({:.1f} MB) in {:.0f}ms",
+        st["rows"],
+        st["memory_bytes"] / 1e6,
+        (time.perf_counter() - t0) * 1000.0,
+    )
+
+
+def start_hot_store() -> bool:
+    """Load the window in the background; requests use the DB until it is ready.
+
+    In shared mode this starts the refresher election instead.
+    """
+    global _loader, _refresher
+    store = get_hot_store()
+    if store is None:
+        return False
+    if isinstance(store, SharedHotStore):
+        if _refresher is None or not _refresher.is_alive():
+            s = get_settings()
+            os.makedirs(s.HOT_STORE_SHM_DIR, exist_ok=True)
+            _refresher = HotStoreRefresher(
+                HotStore(s.HOT_STORE_ROWS, s.HOT_STORE_WINDOW_SEC), s.HOT_STORE_SHM_DIR, s.HOT_STORE_POLL_SEC
+            )
+            add_listener(_refresher.wake)
+            _refresher.start()
+        return True
+    if not store.ready and (_loader is None or not _loader.is_alive()):
+        _loader = threading.Thread(target=_initial_load, args=(store,), name="hot-store-load", daemon=True)
+        _loader.start()
+    return True
+
+
+def wait_hot_store(timeout: float = 10.0) -> bool:
+    """Block until a background initial load started by start_hot_store finishes."""
+    if _loader is not None:
+        _loader.join(timeout)
+        return not _loader.is_alive()
+    return True
+
+
+def stop_hot_store(timeout: float = 5.0) -> None:
+    """Stop the refresher on shutdown; a leader releases LEADER_LOCK so another worker takes over at once."""
+    global _refresher
+    if _refresher is not None:
+        _refresher.stop()
+        _refresher.join(timeout)
+        _refresher = None
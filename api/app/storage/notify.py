@@ -0,0 +1,102 @@
+"""Postgres LISTEN/NOTIFY plumbing for "new scores committed" signals.
+
+Writers (collector, trainer) call ``notify_scores_changed`` inside their
+transaction; Postgres delivers the notification when it commits. The API runs
+one background ``NotifyListener`` thread and fans notifications out to the
+callbacks registered with ``add_listener`` (cache invalidation, etc.).
+Outside Postgres (e.g. SQLite in unit tests) both sides are no-ops.
+"""
+from __future__ import annotations
+
+import threading
+from typing import Callable, List, Optional
+
+import psycopg
+from sqlalchemy import text
+
+from api.app.core.config import get_settings
+from api.app.core.logging import get_logger
+
+
+CHANNEL = "scores_changed"
+
+_callbacks: List[Callable[[str], None]] = []
+_listener: Optional["NotifyListener"] = None
+
+
+def _is_postgres(url: str) -> bool:
+    return url.startswith("postgresql")
+
+
+def _plain_dsn(url: str) -> str:
+    # psycopg.connect does not understand SQLAlchemy driver suffixes
+    scheme, sep, rest = url.partition("://")
+    return scheme.split("+", 1)[0] + sep + rest
+
+
+def notify_scores_changed(session, source: str) -> None:
+    """Queue a scores_changed notification on the session's transaction."""
+    if session.get_bind().dialect.name != "postgresql":
+        return
+    session.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": CHANNEL, "payload": source})
+
+
+def add_listener(callback: Callable[[str], None]) -> None:
+    """Register callback(payload) to run on every notification (listener thread)."""
+    if callback not in _callbacks:
+        _callbacks.append(callback)
+
+
+class NotifyListener(threading.Thread):
+    def __init__(self, dsn: str, channel: str = CHANNEL) -> None:
+        super().__init__(name="notify-listener", daemon=True)
+        self.dsn = dsn
+        self.channel = channel
+        self._stopping = threading.Event()
+
+    def stop(self) -> None:
+        self._stopping.set()
+
+    def run(self) -> None:
+        log = get_logger(__name__)
+        backoff = 1.0
+        while not self._stopping.is_set():
+            try:
+                with psycopg.connect(self.dsn, autocommit=True) as conn:
+                    conn.execute(f"LISTEN {self.channel}")
+                    log.info("listening for {} notifications", self.channel)
+                    backoff = 1.0
+                    # Anything may have been committed while we were not listening
+                    _dispatch("reconnect")
+                    while not self._stopping.is_set():
+                        for n in conn.notifies(timeout=5.0):
+                            _dispatch(n.payload)
+            except Exception as e:
+                log.warning("notify listener error: {}; retrying in {:.0f}s", repr(e), backoff)
+                self._stopping.wait(backoff)
+                backoff = min(backoff * 2, 30.0)
+
+
+def _dispatch(payload: str) -> None:
+    for cb in list(_callbacks):
+        try:
+            cb(payload)
+        except Exception as e:
+            get_logger(__name__).warning("notify callback error: {}", repr(e))
+
+
+def start_listener() -> bool:
+    """Start the background listener once; False when the DB is not Postgres."""
+    global _listener
+    url = get_settings().DB_URL
+    if not _is_postgres(url):
+        return False
+    if _listener is None or not _listener.is_alive():
+        _listener = NotifyListener(_plain_dsn(url))
+        _listener.start()
+    return True
+
+
+def stop_listener() -> None:
+    if _listener is not None:
+        _listener.stop()
@@ -0,0 +1,143 @@
+"""Per-minute ingest rollups (``score_rollups``) and the distinct counts they answer.
+
+The collector calls ``record_rollup`` in the same transaction as the rows it
+inserts, so a committed minute always includes its rows. Readers merge the
+HyperLogLog sketches of the minutes overlapping a window; the window is
+widened to whole minutes, so a count may include up to a minute of rows
+observed just before ``since``.
+
+Rollups exist from when the collector started writing them. Windows reaching
+further back get None (callers then count exactly) until older minutes are
+rebuilt from raw rows with ``python -m api.app.storage.rollup --hours 2``.
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.orm import Session, sessionmaker
+
+from ..core.hll import HyperLogLog, merged_count
+from ..core.logging import get_logger
+from ..models import Base, Score, ScoreRollup
+from .session import get_engine
+
+
+# (observed_ts, route_id, stop_id, has a headway)
+RollupRow = Tuple[datetime, str, str, bool]
+
+REBUILD_CHUNK = 50000
+
+
+def _utc(ts: datetime) -> datetime:
+    # SQLite returns naive datetimes; they are UTC
+    return ts.replace(tzinfo=timezone.utc) if ts.tzinfo is None else ts.astimezone(timezone.utc)
+
+
+def minute_bucket(ts: datetime) -> datetime:
+    return _utc(ts).replace(second=0, microsecond=0)
+
+
+def _sketch(rows: Iterable[RollupRow]) -> Dict[datetime, List]:
+    """bucket -> [row count, stops sketch, moving pairs sketch]."""
+    out: Dict[datetime, List] = {}
+    for observed_ts, route_id, stop_id, moving in rows:
+        b = minute_bucket(observed_ts)
+        agg = out.get(b)
+        if agg is None:
+            agg = out[b] = [0, HyperLogLog(), HyperLogLog()]
+        agg[0] += 1
+        agg[1].add(stop_id)
+        if moving:
+            agg[2].add(f"{route_id}:{stop_id}")
+    return out
+
+
+def record_rollup(session: Session, rows: Iterable[RollupRow]) -> int:
+    """Fold rows into their minute rollups; the caller commits with the rows. Returns buckets touched.
+
+    Buckets are read FOR UPDATE and merged, which assumes writers of the same
+    minute are serialized (there is one collector).
+    """
+    buckets = _sketch(rows)
+    table = ScoreRollup.__table__
+    for bucket, (n, stops, pairs) in buckets.items():
+        cur = session.execute(
+            select(table.c.rows, table.c.stops_hll, table.c.pairs_hll).where(table.c.bucket_ts == bucket).with_for_update()
+        ).one_or_none()
+        if cur is None:
+            session.execute(
+                insert(table).values(bucket_ts=bucket, rows=n, stops_hll=stops.to_bytes(), pairs_hll=pairs.to_bytes())
+            )
+            continue
+        session.execute(
+            update(table)
+            .where(table.c.bucket_ts == bucket)
+            .values(
+                rows=cur.rows + n,
+                stops_hll=HyperLogLog.from_bytes(cur.stops_hll).merge(stops).to_bytes(),
+                pairs_hll=HyperLogLog.from_bytes(cur.pairs_hll).merge(pairs).to_bytes(),
+                updated_ts=func.now(),
+            )
+        )
+    return len(buckets)
+
+
+def rollup_distinct(session: Session, since: datetime, until: datetime) -> Optional[dict]:
+    """Estimated stations_total and trains_active over [since, until]; None if rollups start after since."""
+    start = minute_bucket(since)
+    oldest = session.execute(select(func.min(ScoreRollup.bucket_ts))).scalar()
+    if oldest is None or _utc(oldest) > start:
+        return None
+    sketches = session.execute(
+        select(ScoreRollup.stops_hll, ScoreRollup.pairs_hll)
+        .where(ScoreRollup.bucket_ts >= start)
+        .where(ScoreRollup.bucket_ts <= until)
+    ).all()
+    return {
+        "stations_total": merged_count(r[0] for r in sketches),
+        "trains_active": merged_count(r[1] for r in sketches),
+    }
+
+
+def rebuild_rollups(session: Session, since: datetime) -> int:
+    """Build the missing minutes from since up to the oldest existing rollup (or the current minute).
+
+    Minutes the collector has already written are left alone, so this is safe
+    to run while it is ingesting. Returns the number of buckets written.
+    """
+    oldest = session.execute(select(func.min(ScoreRollup.bucket_ts))).scalar()
+    end = _utc(oldest) if oldest is not None else minute_bucket(datetime.now(timezone.utc))
+    start = minute_bucket(since)
+    if start >= end:
+        return 0
+    stmt = (
+        select(Score.observed_ts, Score.route_id, Score.stop_id, Score.headway_sec)
+        .where(Score.observed_ts >= start)
+        .where(Score.observed_ts < end)
+    )
+    written = 0
+    for chunk in session.execute(stmt.execution_options(yield_per=REBUILD_CHUNK)).partitions():
+        written += record_rollup(session, ((ts, r, sid, bool(hw and hw > 0)) for ts, r, sid, hw in chunk))
+    session.commit()
+    return written
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Rebuild per-minute score rollups from raw rows")
+    parser.add_argument("--hours", type=float, default=1.0, help="How far back to rebuild")
+    args = parser.parse_args(argv)
+    engine = get_engine()
+    Base.metadata.create_all(bind=engine)
+    SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+    with SessionLocal() as session:
+        n = rebuild_rollups(session, datetime.now(timezone.utc) - timedelta(hours=args.hours))
+    get_logger(__name__).info("rebuilt {} minute rollups", n)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
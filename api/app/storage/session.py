@@ -4,6 +4,7 @@ from typing import Generator
 
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
 
 from api.app.core.config import get_settings
 
@@ -24,7 +25,13 @@ def get_engine():
     if _engine is None:
         settings = get_settings()
         url = _coerce_psycopg_dialect(settings.DB_URL)
-        _engine = create_engine(url, pool_pre_ping=True, future=True)
+        if url.startswith("sqlite") and ":memory:" in url:
+            # One shared connection, so queries run from the threadpool see the same in-memory DB
+            _engine = create_engine(
+                url, poolclass=StaticPool, connect_args={"check_same_thread": False}, future=True
+            )
+        else:
+            _engine = create_engine(url, pool_pre_ping=True, future=True)
     return _engine
 
 
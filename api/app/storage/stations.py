@@ -0,0 +1,52 @@
+"""``stop_stations``: the GTFS parent-station index mirrored into the database.
+
+Station-level aggregates join scores against it and GROUP BY station in SQL
+instead of returning one group per platform. ``sync_stop_stations`` rewrites
+the table when the loaded feed changes; it is cheap to call per request, as a
+process only checks the table once per feed key.
+"""
+from __future__ import annotations
+
+import threading
+from typing import Optional
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+
+from ..core.logging import get_logger
+from ..gtfs import GtfsSnapshot, get_gtfs
+from ..models import StopStation
+from .session import get_engine
+
+
+_lock = threading.Lock()
+_synced_key: Optional[str] = None
+
+
+def sync_stop_stations(snap: Optional[GtfsSnapshot] = None) -> None:
+    """Make ``stop_stations`` match snap (default: the loaded feed)."""
+    global _synced_key
+    snap = snap or get_gtfs()
+    if _synced_key == snap.key:
+        return
+    with _lock:
+        if _synced_key == snap.key:
+            return
+        SessionLocal = sessionmaker(bind=get_engine(), autoflush=False, autocommit=False, future=True)
+        with SessionLocal() as session:
+            current = session.execute(select(StopStation.gtfs_key).limit(1)).scalar_one_or_none()
+            if current != snap.key:
+                session.execute(delete(StopStation))
+                rows = [{"stop_id": s, "station_id": p, "gtfs_key": snap.key} for s, p in snap.parent_of.items()]
+                if rows:
+                    session.execute(insert(StopStation), rows)
+                try:
+                    session.commit()
+                except IntegrityError:
+                    # Another worker rewrote it for the same feed first
+                    session.rollback()
+                    return
+                get_logger(__name__).info("stop_stations synced: {} platforms (gtfs {})", len(rows), snap.key)
+        _synced_key = snap.key
+
@@ -0,0 +1,151 @@
+"""Constant-time statistics about the ``scores`` table for ``/api/debug/stats``.
+
+Nothing here scans rows:
+- the total comes from the planner's estimate (``pg_class.reltuples``, kept
+  current by autovacuum/ANALYZE) or, for a TimescaleDB hypertable,
+  ``approximate_row_count``; without a catalog (SQLite) it is the id range;
+- sizes come from the catalog size functions (plus the chunk count for a
+  hypertable);
+- oldest/newest observed_ts are the two ends of the observed_ts index;
+- recent counts and the ingest rate are sums over the last minutes of
+  ``score_rollups``, falling back to the hot store and then to a count over
+  the observed_ts index capped at ``RECENT_COUNT_CAP`` rows.
+"""
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+from sqlalchemy import func, select, text
+from sqlalchemy.orm import Session, sessionmaker
+
+from ..models import Score, ScoreRollup
+from .hotstore import get_hot_store
+from .rollup import minute_bucket
+from .session import get_engine
+
+
+RECENT_SEC = 900
+# Rows the index-range fallback counts at most; recent_source says when it was reached
+RECENT_COUNT_CAP = 1_000_000
+# Minutes of rollups averaged for the ingest rate (the current, partial minute excluded)
+RATE_MINUTES = 5
+
+
+def _iso(ts: Optional[datetime]) -> Optional[str]:
+    if ts is None:
+        return None
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts.isoformat()
+
+
+def _is_hypertable(session: Session) -> bool:
+    has_ext = session.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'timescaledb'")).scalar()
+    if not has_ext:
+        return False
+    return bool(
+        session.execute(
+            text("SELECT 1 FROM timescaledb_information.hypertables WHERE hypertable_name = 'scores'")
+        ).scalar()
+    )
+
+
+def _postgres_stats(session: Session) -> Dict:
+    if _is_hypertable(session):
+        rows = session.execute(text("SELECT approximate_row_count('scores')")).scalar()
+        table_b, index_b, toast_b, total_b = session.execute(
+            text("SELECT table_bytes, index_bytes, toast_bytes, total_bytes FROM hypertable_detailed_size('scores')")
+        ).one()
+        chunks = session.execute(
+            text("SELECT count(*) FROM timescaledb_information.chunks WHERE hypertable_name = 'scores'")
+        ).scalar()
+        return {
+            "total_rows_estimate": int(rows or 0),
+            "row_count_source": "approximate_row_count",
+            "table_bytes": int((table_b or 0) + (toast_b or 0)),
+            "index_bytes": int(index_b or 0),
+            "total_bytes": int(total_b or 0),
+            "chunks": int(chunks or 0),
+        }
+    reltuples, live = session.execute(
+        text(
+            "SELECT c.reltuples, s.n_live_tup FROM pg_class c "
+            "LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid WHERE c.oid = 'scores'::regclass"
+        )
+    ).one()
+    table_b, index_b, total_b = session.execute(
+        text(
+            "SELECT pg_table_size('scores'::regclass), pg_indexes_size('scores'::regclass), "
+            "pg_total_relation_size('scores'::regclass)"
+        )
+    ).one()
+    # reltuples is -1 until the first ANALYZE; the stats collector's live count covers that gap
+    analyzed = reltuples is not None and reltuples >= 0
+    return {
+        "total_rows_estimate": int(reltuples if analyzed else (live or 0)),
+        "row_count_source": "pg_class.reltuples" if analyzed else "pg_stat_user_tables.n_live_tup",
+        "table_bytes": int(table_b or 0),
+        "index_bytes": int(index_b or 0),
+        "total_bytes": int(total_b or 0),
+        "chunks": None,
+    }
+
+
+def _index_ends(session: Session, column):
+    # One aggregate per statement: SQLite only answers a lone min()/max() from the index
+    return session.execute(select(func.min(column))).scalar(), session.execute(select(func.max(column))).scalar()
+
+
+def _generic_stats(session: Session) -> Dict:
+    # Both ends of the primary key; exact for an append-only table without deletes
+    lo, hi = _index_ends(session, Score.id)
+    return {
+        "total_rows_estimate": int(hi - lo + 1) if hi is not None else 0,
+        "row_count_source": "id_range",
+        "table_bytes": None,
+        "index_bytes": None,
+        "total_bytes": None,
+        "chunks": None,
+    }
+
+
+def _recent(session: Session, now: datetime) -> Dict:
+    since = now - timedelta(seconds=RECENT_SEC)
+    start = minute_bucket(since)
+    oldest = session.execute(select(func.min(ScoreRollup.bucket_ts))).scalar()
+    if oldest is not None and minute_bucket(oldest) <= start:
+        by_minute = dict(
+            session.execute(
+                select(ScoreRollup.bucket_ts, ScoreRollup.rows).where(ScoreRollup.bucket_ts >= start)
+            ).all()
+        )
+        current = minute_bucket(now)
+        full = [current - timedelta(minutes=m) for m in range(1, RATE_MINUTES + 1)]
+        rate_rows = sum(n for b, n in by_minute.items() if minute_bucket(b) in full)
+        return {
+            "recent_scores": int(sum(by_minute.values())),
+            "recent_source": "score_rollups",
+            "ingest_rows_per_sec": round(rate_rows / (RATE_MINUTES * 60.0), 3),
+        }
+    hot = get_hot_store()
+    counts = hot.summary_counts(since) if hot is not None else None
+    if counts is not None:
+        return {"recent_scores": int(counts["total_rows"]), "recent_source": "hot_store", "ingest_rows_per_sec": None}
+    capped = select(Score.id).where(Score.observed_ts >= since).limit(RECENT_COUNT_CAP).subquery()
+    n = int(session.execute(select(func.count()).select_from(capped)).scalar() or 0)
+    source = "observed_ts_index" if n < RECENT_COUNT_CAP else "observed_ts_index_capped"
+    return {"recent_scores": n, "recent_source": source, "ingest_rows_per_sec": None}
+
+
+def table_stats() -> Dict:
+    now = datetime.now(timezone.utc)
+    engine = get_engine()
+    SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+    with SessionLocal() as session:
+        out = _postgres_stats(session) if engine.dialect.name == "postgresql" else _generic_stats(session)
+        oldest, newest = _index_ends(session, Score.observed_ts)
+        out.update(_recent(session, now))
+    out["oldest_observed_ts"] = _iso(oldest)
+    out["newest_observed_ts"] = _iso(newest)
+    return out
@@ -0,0 +1,55 @@
+"""Data watermark: a cheap marker that changes whenever scores change.
+
+The watermark combines max(id) (new rows from the collector), max(observed_ts)
+and max(scored_at) (rows scored by the trainer). All three are answered from
+indexes, so it is far cheaper than any of the read queries it guards. It is
+cached briefly and dropped with the response cache on NOTIFY.
+"""
+from __future__ import annotations
+
+from datetime import datetime, timezone
+from typing import Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import sessionmaker
+
+from ..core.config import get_settings
+from ..core.singleflight import cached_query
+from ..models import Score
+from .session import get_engine
+
+
+WATERMARK_KEY = ("watermark",)
+
+
+def _ms(ts: Optional[datetime]) -> int:
+    if ts is None:
+        return 0
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return int(ts.timestamp() * 1000)
+
+
+def compute_watermark() -> str:
+    engine = get_engine()
+    SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+    with SessionLocal() as session:
+        max_id, max_obs, max_scored = session.execute(
+            select(func.max(Score.id), func.max(Score.observed_ts), func.max(Score.scored_at))
+        ).one()
+    return f"{int(max_id or 0)}.{_ms(max_obs)}.{_ms(max_scored)}"
+
+
+def parse_watermark(watermark: str) -> Tuple[int, int, int]:
+    """(max id, max observed_ts ms, max scored_at ms) from a watermark string."""
+    max_id, obs_ms, scored_ms = (int(p) for p in watermark.split("."))
+    return max_id, obs_ms, scored_ms
+
+
+def from_ms(ms: int) -> datetime:
+    return datetime.fromtimestamp(ms / 1000.0, tz=timezone.utc)
+
+
+async def data_watermark() -> str:
+    """Current watermark, shared by concurrent requests and reused for API_WATERMARK_TTL_SEC."""
+    return await cached_query(WATERMARK_KEY, compute_watermark, ttl_sec=get_settings().API_WATERMARK_TTL_SEC)
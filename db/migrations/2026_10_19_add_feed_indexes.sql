@@ -0,0 +1,25 @@
+-- Migration: indexes for the keyset-paginated anomalies feed (GET /api/anomalies)
+-- Postgres only (TimescaleDB/PG16)
+-- Run outside a transaction (psql default): CONCURRENTLY does not block the collector's inserts.
+
+-- Newest first with id as tie-break; INCLUDE makes a page an index-only scan
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_scores_feed
+  ON scores (observed_ts DESC, id DESC)
+  INCLUDE (route_id, stop_id, anomaly_score, residual, event_ts);
+
+-- route_id=... (one index range per route; several routes are merged by the API)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_scores_route_feed
+  ON scores (route_id, observed_ts DESC, id DESC)
+  INCLUDE (stop_id, anomaly_score, residual, event_ts);
+
+-- stop_id=...
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_scores_stop_feed
+  ON scores (stop_id, observed_ts DESC, id DESC);
+
+-- min_score >= 0.85: only high scores are indexed, so sparse pages do not walk every row
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_scores_high_feed
+  ON scores (observed_ts DESC, id DESC)
+  INCLUDE (route_id, stop_id, anomaly_score, residual, event_ts)
+  WHERE anomaly_score >= 0.85;
+
+ANALYZE scores;
@@ -0,0 +1,25 @@
+-- Migration: split headway out of residual and track scoring state explicitly
+-- Postgres only (TimescaleDB/PG16)
+
+ALTER TABLE scores ADD COLUMN IF NOT EXISTS headway_sec double precision;
+ALTER TABLE scores ADD COLUMN IF NOT EXISTS scoring_state smallint NOT NULL DEFAULT 0;
+ALTER TABLE scores ADD COLUMN IF NOT EXISTS scored_at timestamptz;
+
+-- Rows never touched by the trainer (anomaly_score = 0) still carry the headway in residual.
+-- Recent ones stay pending (0); older ones are marked skipped (2) so the queue starts small
+-- (use `python -m worker.ml_online --backfill` to score history). Everything else is scored (1).
+UPDATE scores
+SET headway_sec = CASE WHEN residual > 0 THEN residual END,
+    residual = NULL,
+    scoring_state = CASE
+      WHEN residual > 0 AND observed_ts >= now() - interval '1 hour' THEN 0
+      ELSE 2
+    END
+WHERE anomaly_score = 0 AND scoring_state = 0 AND headway_sec IS NULL AND residual IS NOT NULL;
+
+UPDATE scores
+SET scoring_state = 1
+WHERE anomaly_score <> 0 AND scoring_state = 0;
+
+CREATE INDEX IF NOT EXISTS ix_scores_pending ON scores (observed_ts, id) WHERE scoring_state = 0;
+CREATE INDEX IF NOT EXISTS ix_scores_scored_at ON scores (scored_at);
@@ -0,0 +1,189 @@
+"""Latency benchmark for read endpoints under many parallel clients.
+
+In-process (default): seeds a SQLite file with synthetic scores and stops,
+disables the response cache and drives the ASGI app directly, once with request
+coalescing and once without, so the difference is the single-flight layer alone:
+
+    PYTHONPATH=. python scripts/bench_api.py --clients 128 --rounds 5
+
+``--mode serialization`` keeps the response cache warm instead and compares
+pre-encoded orjson bodies with validating through the response models
+(API_FAST_JSON on/off), so the difference is serialization alone:
+
+    PYTHONPATH=. python scripts/bench_api.py --mode serialization --clients 16 --rounds 50
+
+Against a running API (measures whatever that server is configured for):
+
+    PYTHONPATH=. python scripts/bench_api.py --base-url http://localhost:8000 --clients 128
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+import httpx
+
+
+ENDPOINTS = [
+    "/api/heatmap?window=60m",
+    "/api/anomalies?window=60m",
+    "/api/routes",
+]
+
+SERIALIZATION_ENDPOINTS = [
+    "/api/stops",
+    "/api/heatmap?window=60m",
+    "/api/anomalies?window=60m",
+]
+
+STOP_NUMBERS = range(101, 641)
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    s = sorted(values)
+    idx = min(len(s) - 1, max(0, int(round(q / 100.0 * (len(s) - 1)))))
+    return s[idx]
+
+
+async def _burst(client: httpx.AsyncClient, path: str, clients: int) -> List[float]:
+    async def one() -> float:
+        t0 = time.perf_counter()
+        r = await client.get(path)
+        r.raise_for_status()
+        return (time.perf_counter() - t0) * 1000.0
+
+    return list(await asyncio.gather(*(one() for _ in range(clients))))
+
+
+async def _run(client: httpx.AsyncClient, clients: int, rounds: int, label: str, endpoints: List[str] = ENDPOINTS) -> None:
+    for path in endpoints:
+        # Warm up, so a cold first query is not charged to the percentiles
+        (await client.get(path)).raise_for_status()
+        lat: List[float] = []
+        cpu0, wall0 = time.process_time(), time.perf_counter()
+        for _ in range(rounds):
+            lat.extend(await _burst(client, path, clients))
+        cpu_ms = (time.process_time() - cpu0) * 1000.0 / max(1, len(lat))
+        wall = time.perf_counter() - wall0
+        print(
+            f"{label:<12} {path:<28} n={len(lat):<5} p50={_percentile(lat, 50):7.1f}ms "
+            f"p99={_percentile(lat, 99):7.1f}ms max={max(lat):7.1f}ms "
+            f"rps={len(lat) / wall:7.0f} cpu/req={cpu_ms:5.2f}ms"
+        )
+
+
+def _seed(rows: int) -> None:
+    from sqlalchemy import func, select
+    from sqlalchemy.orm import sessionmaker
+
+    from api.app.models import SCORING_DONE, Base, Score
+    from api.app.storage.session import get_engine
+
+    engine = get_engine()
+    Base.metadata.create_all(bind=engine)
+    SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+    with SessionLocal() as session:
+        have = session.execute(select(func.count(Score.id))).scalar() or 0
+        if have >= rows:
+            return
+        now = datetime.now(timezone.utc)
+        rng = random.Random(7)
+        batch = []
+        for i in range(rows - have):
+            batch.append(
+                {
+                    "observed_ts": now - timedelta(seconds=rng.randint(0, 3500)),
+                    "route_id": rng.choice("ACEBDFMGJZNQRWL1234567"),
+                    "stop_id": f"{rng.choice(STOP_NUMBERS)}{rng.choice('NS')}",
+                    "anomaly_score": rng.random(),
+                    "residual": rng.gauss(0, 90),
+                    "headway_sec": rng.uniform(120, 900),
+                    "scoring_state": SCORING_DONE,
+                    "window_sec": 300,
+                }
+            )
+            if len(batch) >= 10000:
+                session.execute(Score.__table__.insert(), batch)
+                batch.clear()
+        if batch:
+            session.execute(Score.__table__.insert(), batch)
+        session.commit()
+
+
+def _write_stops(gtfs_dir: str) -> None:
+    """Synthetic stops.txt matching the seeded stop ids (a parent and N/S platforms each)."""
+    os.makedirs(gtfs_dir, exist_ok=True)
+    rng = random.Random(11)
+    lines = ["stop_id,stop_name,stop_lat,stop_lon,location_type,parent_station"]
+    for n in STOP_NUMBERS:
+        lat, lon = 40.57 + rng.random() * 0.33, -74.05 + rng.random() * 0.3
+        lines.append(f"{n},Station {n},{lat:.6f},{lon:.6f},1,")
+        for d in "NS":
+            lines.append(f"{n}{d},Station {n},{lat:.6f},{lon:.6f},,{n}")
+    with open(os.path.join(gtfs_dir, "stops.txt"), "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+async def _in_process(args: argparse.Namespace) -> None:
+    from api.app.core.config import get_settings
+    from api.app.core.singleflight import get_flight_group
+    from api.app.main import app
+
+    _seed(args.rows)
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            if args.mode == "serialization":
+                for fast in (True, False):
+                    get_settings().API_FAST_JSON = fast
+                    await _run(client, args.clients, args.rounds, "orjson" if fast else "validate", SERIALIZATION_ENDPOINTS)
+                return
+            for coalesce in (True, False):
+                get_settings().API_COALESCE = coalesce
+                group = get_flight_group()
+                before = group.leaders
+                await _run(client, args.clients, args.rounds, "coalesce" if coalesce else "direct")
+                if coalesce:
+                    print(f"{'':<12} db calls with coalescing: {group.leaders - before}")
+
+
+async def _remote(args: argparse.Namespace) -> None:
+    limits = httpx.Limits(max_connections=args.clients, max_keepalive_connections=args.clients)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=60.0) as client:
+        await _run(client, args.clients, args.rounds, "remote")
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=128, help="Parallel requests per burst")
+    parser.add_argument("--rounds", type=int, default=5, help="Bursts per endpoint")
+    parser.add_argument("--rows", type=int, default=200000, help="Synthetic scores to seed (in-process mode)")
+    parser.add_argument("--db", type=str, default="/tmp/mta-bench.db", help="SQLite file (in-process mode)")
+    parser.add_argument("--base-url", type=str, default=None, help="Benchmark a running API instead")
+    parser.add_argument("--mode", choices=("coalesce", "serialization"), default="coalesce", help="What to compare in-process")
+    parser.add_argument("--gtfs-dir", type=str, default="/tmp/mta-bench-gtfs", help="Synthetic GTFS static (in-process mode)")
+    args = parser.parse_args(argv)
+
+    if args.base_url:
+        asyncio.run(_remote(args))
+        return 0
+    os.environ["DB_URL"] = f"sqlite:///{args.db}"
+    _write_stops(args.gtfs_dir)
+    os.environ["GTFS_STATIC_DIR"] = args.gtfs_dir
+    os.environ["MTA_GTFS_STATIC_PATH"] = ""
+    # Coalescing: measure the query path, not cache hits. Serialization: the opposite
+    os.environ["API_CACHE_TTL_SEC"] = "0" if args.mode == "coalesce" else "3600"
+    asyncio.run(_in_process(args))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
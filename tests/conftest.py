@@ -81,7 +81,12 @@ def test_client() -> "_TestClient":
     # Import app here so env overrides apply before startup
     from api.app.main import app
 
+    from api.app.storage.hotstore import wait_hot_store
+
     with TestClient(app) as client:  # type: ignore[return-value]
+        # The hot store loads in a background thread over the same in-memory connection
+        # the test writes through; let it finish so the two never interleave
+        wait_hot_store()
         yield client
 
 
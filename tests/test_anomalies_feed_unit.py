@@ -0,0 +1,67 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy.orm import sessionmaker
+
+
+def _seed(rows):
+    from api.app.core.cache import get_response_cache
+    from api.app.models import Score
+    from api.app.storage.session import get_engine
+
+    SessionLocal = sessionmaker(bind=get_engine(), autoflush=False, autocommit=False, future=True)
+    with SessionLocal() as session:
+        for route, stop, score, ts in rows:
+            session.add(Score(observed_ts=ts, route_id=route, stop_id=stop, anomaly_score=score))
+        session.commit()
+    get_response_cache().clear()
+
+
+def _pages(client, query):
+    items, cursor, pages = [], None, 0
+    while True:
+        r = client.get(query + (f"&cursor={cursor}" if cursor else ""))
+        assert r.status_code == 200
+        items.extend(r.json())
+        pages += 1
+        cursor = r.headers.get("X-Next-Cursor")
+        if not cursor:
+            return items, pages
+
+
+def test_keyset_pages_cover_window_without_gaps_or_repeats(test_client):
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    # Several rows share observed_ts, so the id tie-break decides page boundaries
+    rows = [("K1", f"K{i % 3}N", (i % 10) / 10.0, now - timedelta(seconds=i // 3)) for i in range(25)]
+    rows += [("K2", f"K{i % 3}S", 0.9, now - timedelta(seconds=i)) for i in range(5)]
+    _seed(rows)
+
+    everything = test_client.get("/api/anomalies?window=60m&route_id=K1&limit=1000").json()
+    assert len(everything) == 25
+    assert [it["observed_ts_epoch_ms"] for it in everything] == sorted((it["observed_ts_epoch_ms"] for it in everything), reverse=True)
+
+    paged, pages = _pages(test_client, "/api/anomalies?window=60m&route_id=K1&limit=4")
+    assert pages == 7
+    assert paged == everything
+
+    high, _ = _pages(test_client, "/api/anomalies?window=60m&route_id=K1&min_score=0.85&limit=1")
+    assert len(high) == 2 and all(it["anomaly_score"] >= 0.85 for it in high)
+
+    one_stop = test_client.get("/api/anomalies?window=60m&route_id=K1&stop_id=K0N").json()
+    assert len(one_stop) == 9 and {it["stop_id"] for it in one_stop} == {"K0N"}
+
+
+def test_multi_route_pages_merge_in_feed_order(test_client):
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    _seed([(route, "M1N", 0.5, now - timedelta(seconds=i)) for i in range(6) for route in ("M1", "M2", "M3")])
+
+    merged, _ = _pages(test_client, "/api/anomalies?window=60m&route_id=M1,M2&limit=5")
+    assert len(merged) == 12
+    assert {it["route_id"] for it in merged} == {"M1", "M2"}
+    stamps = [it["observed_ts_epoch_ms"] for it in merged]
+    assert stamps == sorted(stamps, reverse=True)
+    assert merged == test_client.get("/api/anomalies?window=60m&route_id=M2,M1&limit=100").json()
+
+
+def test_bad_cursor_is_rejected(test_client):
+    assert test_client.get("/api/anomalies?cursor=nope").status_code == 400
+    assert test_client.get("/api/anomalies?limit=0").status_code == 422
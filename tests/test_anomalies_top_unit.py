@@ -0,0 +1,48 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy.orm import sessionmaker
+
+
+def test_top_ranks_pairs_by_average_or_peak(test_client):
+    from api.app.core.cache import get_response_cache
+    from api.app.models import SCORING_DONE, Score
+    from api.app.storage.session import get_engine
+
+    now = datetime.now(timezone.utc)
+    scores = {
+        ("T1", "T1N"): [0.9, 0.9, 0.9],  # worst on average
+        ("T1", "T2N"): [0.1, 0.1, 1.0],  # single spike: worst peak
+        ("T2", "T3N"): [0.5, 0.6],
+        ("T2", "T4N"): [0.2],
+    }
+    SessionLocal = sessionmaker(bind=get_engine(), autoflush=False, autocommit=False, future=True)
+    with SessionLocal() as session:
+        for (route, stop), values in scores.items():
+            for i, v in enumerate(values):
+                session.add(
+                    Score(
+                        observed_ts=now - timedelta(seconds=i), route_id=route, stop_id=stop, anomaly_score=v,
+                        scoring_state=SCORING_DONE, scored_at=now,
+                    )
+                )
+            # Pending/skipped rows are written with a 0.0 placeholder score and must not count
+            for i in range(4):
+                session.add(Score(observed_ts=now - timedelta(seconds=10 + i), route_id=route, stop_id=stop, anomaly_score=0.0))
+        session.commit()
+    get_response_cache().clear()
+
+    top = test_client.get("/api/anomalies/top?window=60m&route_id=T1,T2&k=2").json()
+    assert [(t["route_id"], t["stop_id"]) for t in top] == [("T1", "T1N"), ("T2", "T3N")]
+    assert top[0]["count"] == 3 and abs(top[0]["anomaly_score"] - 0.9) < 1e-9
+    assert top[0]["observed_ts_utc"].endswith("Z")
+
+    peak = test_client.get("/api/anomalies/top?window=60m&route_id=T1,T2&k=2&by=max").json()
+    assert [t["stop_id"] for t in peak] == ["T2N", "T1N"]
+    assert peak[0]["anomaly_score"] == peak[0]["anomaly_score_max"] == 1.0
+
+    only_t2 = test_client.get("/api/anomalies/top?window=60m&route_id=T2&min_count=2").json()
+    assert [t["stop_id"] for t in only_t2] == ["T3N"]
+    assert only_t2[0]["count"] == 2 and abs(only_t2[0]["anomaly_score_avg"] - 0.55) < 1e-9
+
+    assert test_client.get("/api/anomalies/top?k=0").status_code == 422
+    assert test_client.get("/api/anomalies/top?by=median").status_code == 422
@@ -0,0 +1,109 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy.orm import sessionmaker
+
+
+def test_backfill_scores_history_and_resumes():
+    from api.app.models import Base, Score
+    from api.app.storage.session import get_engine
+    from worker.ml_online import backfill
+
+    engine = get_engine()
+    Base.metadata.create_all(bind=engine)
+    SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+    t0 = datetime(2025, 9, 10, 12, 0, tzinfo=timezone.utc)
+    with SessionLocal() as session:
+        for k in range(40):
+            ts = t0 + timedelta(minutes=5 * k)
+            session.add(
+                Score(observed_ts=ts, event_ts=ts + timedelta(minutes=2), route_id="BF", stop_id="S1", anomaly_score=0.0, residual=0.0)
+            )
+        session.commit()
+
+    first = backfill("resume-test", chunk_size=7, until=t0 + timedelta(minutes=5 * 19))
+    second = backfill("resume-test", chunk_size=7, until=t0 + timedelta(hours=24))
+    # The very first arrival has no previous one to derive a headway from
+    assert first == 19
+    assert second == 20
+
+    with SessionLocal() as session:
+        rows = session.query(Score).filter(Score.route_id == "BF").order_by(Score.id).all()
+    assert all(0.0 <= r.anomaly_score <= 1.0 for r in rows)
+    assert sum(1 for r in rows if r.anomaly_score > 0) >= 1
+
+
+def test_backfill_does_not_flag_steady_headways():
+    from api.app.models import Base, Score
+    from api.app.storage.session import get_engine
+    from worker.ml_online import backfill
+
+    engine = get_engine()
+    Base.metadata.create_all(bind=engine)
+    SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+    t0 = datetime(2025, 9, 12, 12, 0, tzinfo=timezone.utc)
+    # Four stops on regular headways with a few seconds of jitter: nothing unusual, and
+    # every baseline slot is still cold, so only the chunk's MAD scales the residuals
+    with SessionLocal() as session:
+        for j, headway in enumerate((240, 300, 360, 480)):
+            for k in range(30):
+                ts = t0 + timedelta(seconds=headway * k + (7 * k * (j + 1)) % 21 - 10)
+                session.add(Score(observed_ts=ts, event_ts=ts, route_id="BS", stop_id=f"S{j}", anomaly_score=0.0))
+        session.commit()
+
+    backfill("steady-test", chunk_size=40, since=t0 - timedelta(minutes=1), until=t0 + timedelta(hours=6))
+    with SessionLocal() as session:
+        scores = [r.anomaly_score for r in session.query(Score).filter(Score.route_id == "BS").all()]
+    assert sum(scores) / len(scores) < 0.3
+    assert sum(1 for s in scores if s >= 0.5) <= len(scores) // 10
+
+
+def test_backfill_crash_after_a_chunk_does_not_refold_baselines(monkeypatch):
+    import pytest
+    from sqlalchemy import func, select
+
+    import worker.ml_online as ml_online
+    from api.app.models import Base, SeasonalBaseline, Score
+    from api.app.storage.session import get_engine
+
+    engine = get_engine()
+    Base.metadata.create_all(bind=engine)
+    SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+    # The same Tuesday pattern a week apart: one run is interrupted, the other is not
+    t_crash = datetime(2025, 9, 16, 8, 0, tzinfo=timezone.utc)
+    t_clean = t_crash + timedelta(days=7)
+    with SessionLocal() as session:
+        for route, t0 in (("BX", t_crash), ("BY", t_clean)):
+            for k in range(30):
+                ts = t0 + timedelta(seconds=300 * k + (k % 3) * 20)
+                session.add(Score(observed_ts=ts, event_ts=ts, route_id=route, stop_id="S1", anomaly_score=0.0))
+        session.commit()
+
+    from sqlalchemy.orm import Session
+
+    commits = []
+    real_commit = Session.commit
+
+    def dies_after_second_commit(self):
+        real_commit(self)
+        commits.append(1)
+        if len(commits) == 2:
+            raise RuntimeError("killed right after committing a chunk")
+
+    window = dict(chunk_size=10, since=t_crash - timedelta(minutes=1), until=t_crash + timedelta(hours=4))
+    monkeypatch.setattr(Session, "commit", dies_after_second_commit)
+    with pytest.raises(RuntimeError):
+        ml_online.backfill("crash-test", **window)
+    monkeypatch.setattr(Session, "commit", real_commit)
+    ml_online.backfill("crash-test", **window)
+    ml_online.backfill("clean-test", chunk_size=10, since=t_clean - timedelta(minutes=1), until=t_clean + timedelta(hours=4))
+
+    with SessionLocal() as session:
+        weights = dict(
+            session.execute(
+                select(SeasonalBaseline.route_id, func.sum(SeasonalBaseline.weight))
+                .where(SeasonalBaseline.route_id.in_(["BX", "BY"]))
+                .group_by(SeasonalBaseline.route_id)
+            ).all()
+        )
+    assert weights["BX"] > 0
+    assert abs(weights["BX"] - weights["BY"]) < 1e-6
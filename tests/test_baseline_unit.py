@@ -0,0 +1,54 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+
+def test_slot_for_uses_new_york_local_time():
+    from worker.baseline import slot_for
+
+    # 2025-09-10 was a Wednesday; 12:05 UTC is 08:05 in New York (EDT)
+    day_type, slot = slot_for(datetime(2025, 9, 10, 12, 5, tzinfo=timezone.utc))
+    assert day_type == "wkd"
+    assert slot == 8 * 4
+    assert slot_for(datetime(2025, 9, 13, 16, 0, tzinfo=timezone.utc))[0] == "sat"
+
+
+def test_baseline_stat_is_robust_to_outliers():
+    from worker.baseline import BaselineStat
+
+    t0 = datetime(2025, 9, 10, 12, 0, tzinfo=timezone.utc)
+    stat = BaselineStat(weight=0.0, median=0.0, mad=0.0, updated_ts=t0)
+    for i in range(50):
+        stat.update(300.0 + (i % 5) * 10, t0 + timedelta(days=7 * i))
+    before = stat.median
+    stat.update(5000.0, t0 + timedelta(days=7 * 50))
+    assert stat.warm
+    assert 290.0 <= before <= 340.0
+    assert stat.median - before < 100.0
+
+
+def test_baseline_cache_flush_and_reload():
+    from api.app.models import Base
+    from worker.baseline import BaselineCache
+
+    engine = create_engine("sqlite:///:memory:", future=True)
+    Base.metadata.create_all(engine)
+    ts = datetime(2025, 9, 10, 12, 5, tzinfo=timezone.utc)
+
+    cache = BaselineCache()
+    with Session(engine) as session:
+        cache.prefetch(session, [("A", "A12N")])
+        cache.update("A", "A12N", ts, 300.0)
+        assert cache.flush(session) == 1
+        cache.update("A", "A12N", ts + timedelta(days=7), 360.0)
+        assert cache.flush(session) == 1
+        session.commit()
+
+    fresh = BaselineCache()
+    with Session(engine) as session:
+        fresh.prefetch(session, [("A", "A12N")])
+    stat = fresh.get("A", "A12N", ts)
+    assert stat is not None
+    assert stat.weight > 1.0
+    assert 300.0 < stat.median < 360.0
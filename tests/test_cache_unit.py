@@ -0,0 +1,93 @@
+from datetime import datetime, timezone
+
+
+def test_response_cache_ttl_lru_and_stats():
+    from api.app.core.cache import ResponseCache
+
+    cache = ResponseCache(max_entries=2, ttl_sec=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "b" is now least recently used
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    cache.set("d", 4, ttl_sec=0)  # evicts "a", then expires immediately
+    assert cache.get("d") is None
+    stats = cache.stats()
+    assert stats["entries"] == 1
+    assert stats["hits"] == 1 and stats["misses"] == 2
+    assert stats["evictions"] == 2
+    assert cache.clear() == 1
+    assert cache.stats()["entries"] == 0
+
+
+def test_make_key_normalizes_route_and_ts_bucket():
+    from api.app.core.cache import make_key
+
+    t1 = datetime(2025, 9, 10, 20, 30, 1, tzinfo=timezone.utc)
+    t2 = datetime(2025, 9, 10, 20, 30, 7, tzinfo=timezone.utc)
+    assert make_key("heatmap", 3600, "All", t1) == make_key("heatmap", 3600, " all ", t2)
+    assert make_key("heatmap", 3600, "A") != make_key("heatmap", 3600, "All")
+
+
+def test_heatmap_served_from_cache(test_client):
+    from api.app.core.cache import get_response_cache
+
+    get_response_cache().clear()
+    before = get_response_cache().stats()["hits"]
+    assert test_client.get("/api/heatmap?window=60m").status_code == 200
+    assert test_client.get("/api/heatmap?window=1h").status_code == 200
+    stats = test_client.get("/api/debug/cache").json()
+    # The second request also reuses the cached data watermark
+    assert stats["hits"] >= before + 1
+    assert stats["entries"] >= 1
+
+
+def test_singleflight_coalesces_concurrent_calls():
+    import asyncio
+    import threading
+    import time
+
+    from api.app.core.singleflight import SingleFlight
+
+    calls = []
+    lock = threading.Lock()
+
+    def slow(x):
+        with lock:
+            calls.append(x)
+        time.sleep(0.05)
+        return x * 2
+
+    async def run():
+        group = SingleFlight()
+        results = await asyncio.gather(*(group.do("k", slow, 21) for _ in range(50)))
+        return group, results
+
+    group, results = asyncio.run(run())
+    assert results == [42] * 50
+    assert calls == [21]
+    assert group.stats() == {"inflight": 0, "leaders": 1, "followers": 49}
+
+
+def test_padded_route_id_shares_the_plain_entry_and_query(test_client, monkeypatch):
+    from datetime import timedelta
+
+    from sqlalchemy.orm import sessionmaker
+
+    import api.app.routers.heatmap as heatmap
+    from api.app.core.cache import get_response_cache
+    from api.app.models import Score
+    from api.app.storage.session import get_engine
+
+    stops = [{"stop_id": "WS1N", "stop_name": "Padded", "lat": 40.7, "lon": -73.9, "routes": ["WS"]}]
+    monkeypatch.setattr(heatmap, "_load_stops", lambda: stops)
+    SessionLocal = sessionmaker(bind=get_engine(), autoflush=False, autocommit=False, future=True)
+    with SessionLocal() as session:
+        now = datetime.now(timezone.utc)
+        session.add(Score(observed_ts=now - timedelta(seconds=5), route_id="WS", stop_id="WS1N", anomaly_score=0.7))
+        session.commit()
+    get_response_cache().clear()
+
+    for route in (" WS", "WS", "WS "):
+        features = test_client.get("/api/heatmap", params={"window": "60m", "route_id": route}).json()["features"]
+        assert [f["properties"]["stop_id"] for f in features] == ["WS1N"]
@@ -0,0 +1,76 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy.orm import sessionmaker
+
+
+STOPS = [
+    {"stop_id": f"D{i}N", "stop_name": f"Dash {i}", "lat": 40.7 + i / 100, "lon": -73.9, "routes": ["D7"]} for i in range(4)
+]
+
+
+def _seed(now):
+    from api.app.models import Score
+    from api.app.storage.session import get_engine
+
+    SessionLocal = sessionmaker(bind=get_engine(), autoflush=False, autocommit=False, future=True)
+    with SessionLocal() as session:
+        for i in range(24):
+            session.add(
+                Score(
+                    observed_ts=now - timedelta(seconds=30 * i),
+                    event_ts=now if i % 3 else None,
+                    route_id="D7" if i % 4 else "D8",
+                    stop_id=f"D{i % 4}N",
+                    anomaly_score=(i % 10) / 10.0 + 0.05,
+                    residual=float(i) if i % 2 else None,
+                    headway_sec=300.0 if i % 5 else None,
+                )
+            )
+        session.commit()
+
+
+def test_dashboard_parts_agree(test_client, monkeypatch):
+    import api.app.routers.dashboard as dashboard
+    import api.app.routers.heatmap as heatmap
+    from api.app.core.cache import get_response_cache
+    from api.app.storage.watermark import compute_watermark
+
+    monkeypatch.setattr(heatmap, "_load_stops", lambda: STOPS)
+    monkeypatch.setattr(dashboard, "_load_stops", lambda: STOPS)
+    now = datetime.now(timezone.utc)
+    _seed(now)
+    get_response_cache().clear()
+
+    r = test_client.get("/api/dashboard?window=60m&route_id=D7&limit=5")
+    assert r.status_code == 200
+    body = r.json()
+    assert body["watermark"] == compute_watermark()
+    assert body["heatmap"]["watermark"].startswith(body["watermark"].split(".")[0] + ".")
+
+    s = body["summary"]
+    assert s["window"] == "60m" and s["anomalies_count"] >= 1
+    features = {f["properties"]["stop_id"]: f["properties"] for f in body["heatmap"]["features"]}
+    assert set(features) == {"D1N", "D2N", "D3N"}  # D0N only has D8 rows
+    assert s["stations_total"] == 3
+    items = body["anomalies"]
+    assert len(items) == 5 and {it["route_id"] for it in items} == {"D7"}
+    assert [it["observed_ts_epoch_ms"] for it in items] == sorted((it["observed_ts_epoch_ms"] for it in items), reverse=True)
+    assert body["next_cursor"]
+    assert test_client.get("/api/dashboard?window=60m&route_id=D7&limit=5", headers={"If-None-Match": r.headers["ETag"]}).status_code == 304
+
+
+def test_db_fallback_matches_hot_store():
+    from api.app.routers.dashboard import _query_window
+    from api.app.storage.hotstore import HotStore
+
+    now = datetime.now(timezone.utc)
+    _seed(now)
+    store = HotStore(capacity=100000, window_sec=3600)
+    store.refresh()
+    since = now - timedelta(minutes=30)
+    for routes in (["D7"], ["D7", "D8"]):
+        counts, heat_rows = _query_window(since, now, routes)
+        hot = store.dashboard(since, now, routes, 10)
+        assert counts == hot["counts"]
+        want = sorted((r[0], round(r[1], 9), r[2] and round(r[2], 9), r[5]) for r in hot["heatmap"])
+        assert sorted((r[0], round(r[1], 9), r[2] and round(r[2], 9), r[5]) for r in heat_rows) == want
@@ -0,0 +1,25 @@
+def test_drift_bank_evicts_cold_keys():
+    from worker.drift import DriftBank
+
+    bank = DriftBank(max_keys=2)
+    bank.update(("A", "1"), 10.0)
+    bank.update(("A", "2"), 10.0)
+    bank.update(("A", "1"), 12.0)  # touch: ("A", "2") is now the coldest
+    bank.update(("A", "3"), 10.0)
+    assert len(bank) == 2
+    assert ("A", "2") not in bank
+    assert ("A", "1") in bank and ("A", "3") in bank
+    assert bank.evictions == 1
+
+
+def test_drift_bank_detects_per_key_shift():
+    from worker.drift import DriftBank
+
+    bank = DriftBank(max_keys=16)
+    detected = False
+    for i in range(400):
+        bank.update(("B", "quiet"), 5.0)
+        v = 5.0 if i < 200 else 400.0
+        detected = bank.update(("B", "noisy"), v) or detected
+    assert detected
+    assert bank.get(("B", "quiet")).n_detections == 0
@@ -0,0 +1,105 @@
+from datetime import datetime, timezone
+
+from sqlalchemy.orm import sessionmaker
+
+
+def test_etag_matches_weak_lists_and_star():
+    from starlette.requests import Request
+
+    from api.app.core.etag import etag_matches, make_etag
+
+    def req(value):
+        headers = [] if value is None else [(b"if-none-match", value.encode())]
+        return Request({"type": "http", "headers": headers})
+
+    tag = make_etag("heatmap", "1.2.3")
+    assert tag.startswith('W/"') and tag == make_etag("heatmap", "1.2.3")
+    assert tag != make_etag("heatmap", "1.2.4")
+    assert etag_matches(req(f'"other", {tag}'), tag)
+    assert etag_matches(req(tag[2:]), tag)  # strong form of the same tag
+    assert etag_matches(req("*"), tag)
+    assert not etag_matches(req('W/"other"'), tag)
+    assert not etag_matches(req(None), tag)
+
+
+def test_data_endpoints_answer_304_until_scores_change(test_client):
+    from api.app.core.cache import get_response_cache
+    from api.app.models import Score
+    from api.app.storage.session import get_engine
+
+    for path in ("/api/heatmap?window=60m", "/api/anomalies?window=60m", "/api/routes"):
+        first = test_client.get(path)
+        assert first.status_code == 200
+        etag = first.headers["ETag"]
+        again = test_client.get(path, headers={"If-None-Match": etag})
+        assert again.status_code == 304
+        assert again.content == b""
+        assert again.headers["ETag"] == etag
+
+    etag = test_client.get("/api/heatmap?window=60m").headers["ETag"]
+    SessionLocal = sessionmaker(bind=get_engine(), autoflush=False, autocommit=False, future=True)
+    with SessionLocal() as session:
+        session.add(Score(observed_ts=datetime.now(timezone.utc), route_id="E", stop_id="E1", anomaly_score=0.1))
+        session.commit()
+    # No NOTIFY on SQLite: drop the cached watermark by hand
+    get_response_cache().clear()
+    changed = test_client.get("/api/heatmap?window=60m", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+
+
+def test_gtfs_reload_changes_tags_of_bodies_with_stop_data(test_client, monkeypatch):
+    import api.app.routers.anomalies as anomalies
+    import api.app.routers.dashboard as dashboard
+    import api.app.routers.heatmap as heatmap
+    from api.app.gtfs import GtfsSnapshot
+
+    old = GtfsSnapshot(key="a" * 40, stops=[], routes=[])
+    new = GtfsSnapshot(key="b" * 40, stops=[], routes=[])
+    modules = (heatmap, anomalies, dashboard)
+    paths = ("/api/heatmap?window=60m", "/api/anomalies?window=60m", "/api/anomalies/top", "/api/dashboard")
+    for m in modules:
+        monkeypatch.setattr(m, "get_gtfs", lambda: old)
+    tags = {p: test_client.get(p).headers["ETag"] for p in paths}
+    assert all(test_client.get(p, headers={"If-None-Match": t}).status_code == 304 for p, t in tags.items())
+
+    # Same data watermark, new static feed: stop names and coordinates may have moved
+    for m in modules:
+        monkeypatch.setattr(m, "get_gtfs", lambda: new)
+    for p, t in tags.items():
+        r = test_client.get(p, headers={"If-None-Match": t})
+        assert r.status_code == 200 and r.headers["ETag"] != t
+
+
+def test_entry_computed_before_a_reload_is_not_served_after_it(test_client, monkeypatch):
+    from datetime import datetime, timedelta, timezone
+
+    from sqlalchemy.orm import sessionmaker
+
+    import api.app.routers.heatmap as heatmap
+    from api.app.core.cache import get_response_cache
+    from api.app.gtfs import GtfsSnapshot
+    from api.app.models import Score
+    from api.app.storage.session import get_engine
+
+    SessionLocal = sessionmaker(bind=get_engine(), autoflush=False, autocommit=False, future=True)
+    with SessionLocal() as session:
+        ts = datetime.now(timezone.utc) - timedelta(seconds=5)
+        session.add(Score(observed_ts=ts, route_id="GK", stop_id="GK1N", anomaly_score=0.4))
+        session.commit()
+    get_response_cache().clear()
+
+    def stop(name):
+        return [{"stop_id": "GK1N", "stop_name": name, "lat": 40.7, "lon": -73.9, "routes": ["GK"]}]
+
+    def names():
+        body = test_client.get("/api/heatmap?window=60m&route_id=GK").json()
+        return [f["properties"]["stop_name"] for f in body["features"]]
+
+    monkeypatch.setattr(heatmap, "get_gtfs", lambda: GtfsSnapshot(key="c" * 40, stops=[], routes=[]))
+    monkeypatch.setattr(heatmap, "_load_stops", lambda: stop("Old Name"))
+    assert names() == ["Old Name"]
+    # A computation that was in flight during the reload stored its result after clear()
+    monkeypatch.setattr(heatmap, "get_gtfs", lambda: GtfsSnapshot(key="d" * 40, stops=[], routes=[]))
+    monkeypatch.setattr(heatmap, "_load_stops", lambda: stop("New Name"))
+    assert names() == ["New Name"]
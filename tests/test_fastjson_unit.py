@@ -0,0 +1,84 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy.orm import sessionmaker
+
+
+def _reference_pack(prefix, dt):
+    # The packer as it was before timestamp fields were memoized
+    if dt is None:
+        return {f"{prefix}_ts_utc": None, f"{prefix}_ts_epoch_ms": None, f"{prefix}_ts_ny": None}
+    from api.app.deps import NY
+
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    dt_utc = dt.astimezone(timezone.utc)
+    return {
+        f"{prefix}_ts_utc": dt_utc.isoformat(timespec="seconds").replace("+00:00", "Z"),
+        f"{prefix}_ts_epoch_ms": int(dt_utc.timestamp() * 1000),
+        f"{prefix}_ts_ny": dt.astimezone(NY).isoformat(timespec="seconds"),
+    }
+
+
+def test_pack_with_prefix_matches_reference():
+    from api.app.deps import pack_with_prefix
+
+    winter = datetime(2025, 1, 10, 5, 0, 1, 999000, tzinfo=timezone.utc)
+    cases = [
+        None,
+        winter,
+        winter.replace(tzinfo=None),
+        winter.astimezone(timezone(timedelta(hours=3))),
+        datetime(2025, 9, 10, 20, 30, 55, tzinfo=timezone.utc),
+    ]
+    for dt in cases:
+        for prefix in ("observed", "event"):
+            # Twice: the second call is served from the memo
+            assert pack_with_prefix(prefix, dt) == _reference_pack(prefix, dt)
+            assert pack_with_prefix(prefix, dt) == _reference_pack(prefix, dt)
+
+
+def test_stops_body_matches_model_output(test_client, monkeypatch):
+    import api.app.routers.stops as stops
+    from api.app.core.config import get_settings
+
+    data = [
+        {"stop_id": "101N", "stop_name": "Van Cortlandt Park", "lat": 40.889, "lon": -73.898, "routes": ["1"], "parent_station": "101"},
+        {"stop_id": "A12S", "stop_name": "145 St", "lat": 40.824, "lon": -73.944, "routes": []},
+    ]
+    monkeypatch.setattr(stops, "_load_stops", lambda: data)
+    fast = test_client.get("/api/stops")
+    assert fast.status_code == 200
+    assert fast.headers["content-type"] == "application/json"
+    assert fast.headers["Cache-Control"] == stops.STOPS_CACHE_CONTROL
+    assert stops.encoded_stops(data) is stops.encoded_stops(data)
+
+    monkeypatch.setattr(get_settings(), "API_FAST_JSON", False)
+    validated = test_client.get("/api/stops")
+    assert validated.json() == fast.json()
+    assert validated.headers["ETag"] == fast.headers["ETag"]
+    assert "parent_station" not in fast.json()[0]
+
+
+def test_anomalies_served_from_cached_bytes(test_client):
+    from api.app.core.cache import get_response_cache, make_key
+    from api.app.gtfs import get_gtfs
+    from api.app.models import Score
+    from api.app.storage.session import get_engine
+    from api.app.storage.watermark import compute_watermark
+
+    SessionLocal = sessionmaker(bind=get_engine(), autoflush=False, autocommit=False, future=True)
+    with SessionLocal() as session:
+        session.add(Score(observed_ts=datetime.now(timezone.utc), route_id="G", stop_id="G22N", anomaly_score=0.4, residual=12.0))
+        session.commit()
+    get_response_cache().clear()
+
+    first = test_client.get("/api/anomalies?window=15m&route_id=G")
+    assert first.status_code == 200
+    items = first.json()
+    assert any(it["stop_id"] == "G22N" and it["anomaly_score"] == 0.4 for it in items)
+    assert items[0]["observed_ts_utc"].endswith("Z")
+
+    page_args = ((), None, 200, None)  # stops, min_score, limit, cursor
+    body = get_response_cache().get(make_key("anomalies", 900, "G") + (compute_watermark(), get_gtfs().key) + page_args + ("json",))
+    assert body == first.content
+    assert test_client.get("/api/anomalies?window=15m&route_id=G", headers={"If-None-Match": first.headers["ETag"]}).status_code == 304
@@ -0,0 +1,109 @@
+import zipfile
+
+
+FEED = {
+    "stops.txt": (
+        "stop_id,stop_name,stop_lat,stop_lon,location_type,parent_station\n"
+        "101,Van Cortlandt Park-242 St,40.889248,-73.898583,1,\n"
+        "101N,Van Cortlandt Park-242 St,40.889248,-73.898583,,101\n"
+        "101S,Van Cortlandt Park-242 St,40.889248,-73.898583,,101\n"
+        "A02,Inwood-207 St,40.868072,-73.919899,1,\n"
+        "A02S,Inwood-207 St,40.868072,-73.919899,,A02\n"
+    ),
+    "routes.txt": "route_id,route_short_name\n1,1\nA,A\nGS,S\n",
+    "trips.txt": "route_id,service_id,trip_id\n1,WKD,t1\n1,WKD,t2\nA,WKD,t3\n",
+    "stop_times.txt": (
+        "trip_id,arrival_time,departure_time,stop_id,stop_sequence\n"
+        "t1,05:00:00,05:00:00,101S,1\n"
+        "t2,05:10:00,05:10:00,101N,9\n"
+        "t3,05:00:00,05:00:00,A02S,1\n"
+    ),
+}
+
+
+def _write_zip(path):
+    with zipfile.ZipFile(path, "w") as zf:
+        for name, body in FEED.items():
+            zf.writestr(name, body)
+
+
+def test_compile_routes_per_stop_and_parents(tmp_path):
+    from api.app.gtfs import build_snapshot
+
+    zpath = tmp_path / "feed.zip"
+    _write_zip(zpath)
+    snap = build_snapshot(str(zpath), str(tmp_path / "cache"))
+    assert not snap.from_cache
+    by_id = {st["stop_id"]: st for st in snap.stops}
+    assert by_id["101S"]["routes"] == ["1"]
+    assert by_id["101"]["routes"] == ["1"]  # station = union of its platforms
+    assert by_id["A02"]["routes"] == ["A"]
+    assert snap.routes == ["1", "A", "GS"]
+    assert snap.station_of("101N") == "101" and snap.children_of["101"] == ["101N", "101S"]
+
+
+def test_compiled_cache_roundtrip_and_invalidation(tmp_path):
+    from api.app.gtfs import build_snapshot, cache_path
+
+    zpath, cache = tmp_path / "feed.zip", tmp_path / "cache"
+    _write_zip(zpath)
+    first = build_snapshot(str(zpath), str(cache))
+    assert (cache / cache_path("", first.key)).exists()
+    again = build_snapshot(str(zpath), str(cache))
+    assert again.from_cache and again.key == first.key
+    assert again.stops == first.stops and again.routes == first.routes
+    assert again.parent_of == first.parent_of
+
+    FEED["routes.txt"] += "Z,Z\n"
+    try:
+        _write_zip(zpath)
+        changed = build_snapshot(str(zpath), str(cache))
+    finally:
+        FEED["routes.txt"] = FEED["routes.txt"].replace("Z,Z\n", "")
+    assert not changed.from_cache and changed.key != first.key and "Z" in changed.routes
+
+
+def test_directory_source_and_missing_feed(tmp_path):
+    from api.app.gtfs import EMPTY, build_snapshot, resolve_source
+
+    for name, body in FEED.items():
+        (tmp_path / name).write_text(body)
+    source = resolve_source(str(tmp_path / "missing.zip"), str(tmp_path))
+    assert source == str(tmp_path)
+    assert len(build_snapshot(source, None).stops) == 5
+    assert resolve_source(None, str(tmp_path / "nope")) is None
+    assert build_snapshot(None, None) is EMPTY
+
+
+def test_watcher_swaps_in_changed_feed_after_it_settles(tmp_path):
+    from api.app import gtfs
+    from api.app.core.config import get_settings
+
+    s = get_settings()
+    saved = (s.MTA_GTFS_STATIC_PATH, s.GTFS_STATIC_DIR, s.GTFS_CACHE_DIR)
+    zpath = tmp_path / "feed.zip"
+    _write_zip(zpath)
+    seen = []
+    try:
+        s.MTA_GTFS_STATIC_PATH, s.GTFS_STATIC_DIR, s.GTFS_CACHE_DIR = str(zpath), str(tmp_path), str(tmp_path / "cache")
+        gtfs.add_reload_listener(seen.append)
+        before = gtfs.load_gtfs()
+        watcher = gtfs.GtfsWatcher(interval_sec=0)
+        assert watcher.check_once() is False
+
+        FEED["routes.txt"] += "Z,Z\n"
+        try:
+            _write_zip(zpath)
+        finally:
+            FEED["routes.txt"] = FEED["routes.txt"].replace("Z,Z\n", "")
+        assert watcher.check_once() is False  # first sighting: wait for the file to settle
+        assert gtfs.get_gtfs() is before
+        assert watcher.check_once() is True
+        after = gtfs.get_gtfs()
+        assert after is not before and "Z" in after.routes
+        assert seen and seen[-1] is after
+        assert watcher.check_once() is False
+    finally:
+        gtfs._reload_callbacks.remove(seen.append)
+        s.MTA_GTFS_STATIC_PATH, s.GTFS_STATIC_DIR, s.GTFS_CACHE_DIR = saved
+        gtfs.load_gtfs()
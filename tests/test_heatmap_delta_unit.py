@@ -0,0 +1,94 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy.orm import sessionmaker
+
+
+def test_heatmap_since_returns_only_changed_and_removed_stops(test_client, monkeypatch):
+    from api.app.core.cache import get_response_cache
+    from api.app.models import Score
+    from api.app.routers import heatmap
+    from api.app.storage.session import get_engine
+
+    monkeypatch.setattr(
+        heatmap,
+        "_load_stops",
+        lambda: [{"stop_id": sid, "stop_name": sid, "lat": 40.7, "lon": -74.0} for sid in ("D1", "D2", "D3")],
+    )
+    SessionLocal = sessionmaker(bind=get_engine(), autoflush=False, autocommit=False, future=True)
+    now = datetime.now(timezone.utc)
+    with SessionLocal() as session:
+        session.add_all(
+            [
+                Score(observed_ts=now - timedelta(seconds=30), route_id="DL", stop_id="D1", anomaly_score=0.2),
+                Score(observed_ts=now - timedelta(seconds=30), route_id="DL", stop_id="D2", anomaly_score=0.4),
+                # Ages out of a 60s window before the next request
+                Score(observed_ts=now - timedelta(seconds=59), route_id="DL", stop_id="D3", anomaly_score=0.6),
+            ]
+        )
+        session.commit()
+    get_response_cache().clear()
+
+    full = test_client.get("/api/heatmap?window=1m&route_id=DL").json()
+    assert "delta" not in full
+    assert {f["properties"]["stop_id"] for f in full["features"]} == {"D1", "D2", "D3"}
+    token = full["watermark"]
+
+    with SessionLocal() as session:
+        session.add(Score(observed_ts=datetime.now(timezone.utc), route_id="DL", stop_id="D2", anomaly_score=1.0))
+        session.commit()
+    get_response_cache().clear()
+    monkeypatch.setattr(heatmap, "_parse_ts", lambda _ts: now + timedelta(seconds=2))
+
+    patch = test_client.get(f"/api/heatmap?window=1m&route_id=DL&since={token}").json()
+    assert patch["delta"] is True
+    assert [f["properties"]["stop_id"] for f in patch["features"]] == ["D2"]
+    assert abs(patch["features"][0]["properties"]["anomaly_score"] - 0.7) < 1e-9
+    assert patch["removed"] == ["D3"]
+    assert patch["watermark"] != token
+
+    # A token for another window size is ignored: full collection
+    other = test_client.get(f"/api/heatmap?window=2m&route_id=DL&since={token}").json()
+    assert "delta" not in other
+
+
+def test_heatmap_since_resends_rows_committed_with_an_older_scored_at(test_client, monkeypatch):
+    from api.app.core.cache import get_response_cache
+    from api.app.models import SCORING_DONE, Score
+    from api.app.routers import heatmap
+    from api.app.storage.session import get_engine
+
+    monkeypatch.setattr(
+        heatmap,
+        "_load_stops",
+        lambda: [{"stop_id": sid, "stop_name": sid, "lat": 40.7, "lon": -74.0} for sid in ("L1", "L2")],
+    )
+    SessionLocal = sessionmaker(bind=get_engine(), autoflush=False, autocommit=False, future=True)
+    now = datetime.now(timezone.utc)
+    with SessionLocal() as session:
+        late = Score(observed_ts=now - timedelta(seconds=20), route_id="LT", stop_id="L1", anomaly_score=0.0)
+        session.add_all(
+            [
+                late,
+                Score(
+                    observed_ts=now - timedelta(seconds=20), route_id="LT", stop_id="L2", anomaly_score=0.3,
+                    scoring_state=SCORING_DONE, scored_at=now,
+                ),
+            ]
+        )
+        session.commit()
+        late_id = late.id
+    get_response_cache().clear()
+    token = test_client.get("/api/heatmap?window=1m&route_id=LT").json()["watermark"]
+
+    # A writer that stamped scored_at before the token was issued commits only now
+    with SessionLocal() as session:
+        row = session.get(Score, late_id)
+        row.anomaly_score, row.scoring_state, row.scored_at = 0.9, SCORING_DONE, now - timedelta(seconds=2)
+        session.commit()
+    get_response_cache().clear()
+    monkeypatch.setattr(heatmap, "_parse_ts", lambda _ts: now + timedelta(seconds=1))
+
+    patch = test_client.get(f"/api/heatmap?window=1m&route_id=LT&since={token}").json()
+    assert patch["delta"] is True
+    by_stop = {f["properties"]["stop_id"]: f["properties"] for f in patch["features"]}
+    assert abs(by_stop["L1"]["anomaly_score"] - 0.9) < 1e-9
@@ -0,0 +1,90 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy.orm import sessionmaker
+
+
+STOPS = [
+    {"stop_id": "P1", "stop_name": "Plaza", "lat": 40.75, "lon": -73.98, "routes": ["P", "Q"], "parent_station": None},
+    {"stop_id": "P1N", "stop_name": "Plaza", "lat": 40.75, "lon": -73.98, "routes": ["P"], "parent_station": "P1"},
+    {"stop_id": "P1S", "stop_name": "Plaza", "lat": 40.75, "lon": -73.98, "routes": ["P", "Q"], "parent_station": "P1"},
+    {"stop_id": "P2", "stop_name": "Park", "lat": 40.76, "lon": -73.97, "routes": ["P"], "parent_station": None},
+    {"stop_id": "P2N", "stop_name": "Park", "lat": 40.76, "lon": -73.97, "routes": ["P"], "parent_station": "P2"},
+]
+# (stop, route, score)
+ROWS = [("P1N", "P", 0.2), ("P1N", "P", 0.4), ("P1S", "P", 0.6), ("P1S", "Q", 0.9), ("P2N", "P", 0.1)]
+
+
+def _seed(now):
+    from api.app.models import Score
+    from api.app.storage.session import get_engine
+
+    SessionLocal = sessionmaker(bind=get_engine(), autoflush=False, autocommit=False, future=True)
+    with SessionLocal() as session:
+        for i, (sid, rid, score) in enumerate(ROWS):
+            session.add(Score(observed_ts=now - timedelta(seconds=10 * i), route_id=rid, stop_id=sid, anomaly_score=score, residual=float(i)))
+        session.commit()
+
+
+def _patch(monkeypatch):
+    import api.app.routers.heatmap as heatmap
+    from api.app.gtfs import GtfsSnapshot
+
+    snap = GtfsSnapshot(
+        key="station-test", stops=STOPS, routes=["P", "Q"], parent_of={s["stop_id"]: s["parent_station"] for s in STOPS if s["parent_station"]}
+    )
+    monkeypatch.setattr(heatmap, "_load_stops", lambda: STOPS)
+    monkeypatch.setattr(heatmap, "get_gtfs", lambda: snap)
+    return snap
+
+
+def test_station_level_folds_platforms(test_client, monkeypatch):
+    import api.app.routers.heatmap as heatmap
+    from api.app.core.cache import get_response_cache
+
+    _patch(monkeypatch)
+    _seed(datetime.now(timezone.utc))
+    get_response_cache().clear()
+
+    for use_hot in (True, False):
+        if not use_hot:
+            monkeypatch.setattr(heatmap, "get_hot_store", lambda: None)
+            get_response_cache().clear()
+        r = test_client.get("/api/heatmap?window=60m&level=station")
+        assert r.status_code == 200
+        body = r.json()
+        assert body["level"] == "station"
+        by_id = {f["properties"]["stop_id"]: f["properties"] for f in body["features"] if f["properties"]["stop_id"] in ("P1", "P2")}
+        assert not {"P1N", "P1S"} & {f["properties"]["stop_id"] for f in body["features"]}
+        p1 = by_id["P1"]
+        assert round(p1["anomaly_score"], 6) == round((0.2 + 0.4 + 0.6 + 0.9) / 4, 6)
+        assert p1["routes"] == ["P", "Q"] and p1["route_counts"][0] >= 3 and p1["route_counts"][1] >= 1
+        assert p1["route_id"] == "Q"  # worst-scoring route at the station
+        assert by_id["P2"]["routes"] == ["P"]
+
+    stops = test_client.get("/api/heatmap?window=60m").json()
+    assert {"P1N", "P1S"} <= {f["properties"]["stop_id"] for f in stops["features"]}
+    assert test_client.get("/api/heatmap?level=platform").status_code == 422
+
+
+def test_db_groups_by_station_like_the_hot_store_fold(monkeypatch):
+    from api.app.models import Base
+    from api.app.routers.heatmap import _fold_stations, _query_station_routes
+    from api.app.storage.hotstore import HotStore
+    from api.app.storage.session import get_engine
+
+    Base.metadata.create_all(bind=get_engine())
+    snap = _patch(monkeypatch)
+    now = datetime.now(timezone.utc)
+    _seed(now)
+    store = HotStore(capacity=100000, window_sec=3600)
+    store.refresh()
+    since = now - timedelta(minutes=5)
+
+    def norm(rows):
+        return sorted((r[0], r[1], r[2], round(r[3], 9), r[4], round(r[5], 9)) for r in rows if r[0].startswith("P"))
+
+    for route in ("All", "Q"):
+        hot = _fold_stations(store.stop_route_rows(since, now, [] if route == "All" else [route]), snap.station_of)
+        db = _query_station_routes(since, now, route)
+        assert {r[0] for r in db if r[0].startswith("P")} <= {"P1", "P2"}
+        assert norm(hot) == norm(db)
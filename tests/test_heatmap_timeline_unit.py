@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy.orm import sessionmaker
+
+
+STOPS = [
+    {"stop_id": f"T{i}N", "stop_name": f"Time {i}", "lat": 40.6 + i / 100, "lon": -73.8, "routes": ["T1"]} for i in range(3)
+]
+
+
+def _seed(now):
+    from api.app.models import Score
+    from api.app.storage.session import get_engine
+
+    SessionLocal = sessionmaker(bind=get_engine(), autoflush=False, autocommit=False, future=True)
+    with SessionLocal() as session:
+        for i in range(30):
+            session.add(
+                Score(
+                    observed_ts=now - timedelta(seconds=50 * i),
+                    route_id="T1" if i % 3 else "T2",
+                    stop_id=f"T{i % 3}N",
+                    anomaly_score=(i % 7) / 7.0,
+                )
+            )
+        session.commit()
+
+
+def test_timeline_frames_and_columns(test_client, monkeypatch):
+    import api.app.routers.heatmap as heatmap
+    from api.app.core.cache import get_response_cache
+
+    monkeypatch.setattr(heatmap, "_load_stops", lambda: STOPS)
+    now = datetime.now(timezone.utc)
+    _seed(now)
+    get_response_cache().clear()
+
+    start = (now - timedelta(minutes=30)).isoformat()
+    r = test_client.get("/api/heatmap/timeline", params={"start": start, "end": now.isoformat(), "step": "5m", "route_id": "T1"})
+    assert r.status_code == 200
+    body = r.json()
+    assert body["step_sec"] == 300
+    frames = body["frames"]
+    assert all(f % 300000 == 0 for f in frames) and frames == sorted(frames)
+    assert frames[0] <= (now - timedelta(minutes=30)).timestamp() * 1000 < frames[0] + 300000
+    assert frames[-1] <= now.timestamp() * 1000 < frames[-1] + 300000
+    assert set(body["stops"]) == {"T1N", "T2N"}  # T0N only has T2 rows
+    assert len(body["lon"]) == len(body["lat"]) == len(body["stops"])
+    assert len(body["values"]) == len(frames) and all(len(row) == len(body["stops"]) for row in body["values"])
+    assert any(v is not None for row in body["values"] for v in row)
+
+    again = test_client.get(
+        "/api/heatmap/timeline",
+        params={"start": start, "end": now.isoformat(), "step": "5m", "route_id": "T1"},
+        headers={"If-None-Match": r.headers["ETag"]},
+    )
+    assert again.status_code == 304
+    assert test_client.get("/api/heatmap/timeline", params={"start": start, "end": now.isoformat(), "step": "1m", "route_id": "T1"}).status_code == 200
+    too_many = test_client.get("/api/heatmap/timeline", params={"start": (now - timedelta(days=2)).isoformat(), "step": "1m"})
+    assert too_many.status_code == 400
+    assert test_client.get("/api/heatmap/timeline", params={"start": start, "step": "120s"}).json()["step_sec"] == 120
+    for bad in ({"step": "30s"}, {"step": "xm"}, {"step": "5"}, {"step": "5d"}, {"start": "yesterday"}, {"end": "2025-13-01"}):
+        assert test_client.get("/api/heatmap/timeline", params={"start": start, **bad}).status_code == 400, bad
+
+
+def test_db_query_matches_hot_store():
+    from api.app.routers.heatmap import _query_timeline
+    from api.app.storage.hotstore import HotStore
+
+    now = datetime.now(timezone.utc)
+    _seed(now)
+    store = HotStore(capacity=100000, window_sec=3600)
+    store.refresh()
+    since = datetime.fromtimestamp(int((now - timedelta(minutes=20)).timestamp()) // 300 * 300, tz=timezone.utc)
+    until = since + timedelta(minutes=25)
+    for routes in ([], ["T1"]):
+        hot = store.timeline_rows(since, until, 300, routes)
+        db = _query_timeline(since, until, 300, routes[0] if routes else "All")
+        assert hot
+        assert sorted((int(b), s, round(v, 9)) for b, s, v in db) == sorted((b, s, round(v, 9)) for b, s, v in hot)
@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy.orm import sessionmaker
+
+
+def test_sketch_error_is_bounded_and_merge_is_union():
+    from api.app.core.hll import HyperLogLog, merged_count
+
+    for n in (10, 800, 3000, 50000):
+        sk = HyperLogLog().update(f"stop-{i}" for i in range(n))
+        assert abs(sk.count() - n) <= max(1, 0.04 * n), (n, sk.count())
+
+    # Overlapping minutes: the union counts shared values once
+    a = HyperLogLog().update(f"A{i}" for i in range(600))
+    b = HyperLogLog().update(f"A{i}" for i in range(300, 900))
+    assert abs(merged_count([a.to_bytes(), None, b.to_bytes()]) - 900) <= 20
+    assert HyperLogLog.from_bytes(a.to_bytes()).count() == a.count()
+    assert len(a.to_bytes()) < 4096
+    assert merged_count([]) == 0
+
+
+def test_summary_uses_rollups_unless_exact(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from api.app.main import app
+    from api.app.core.cache import get_response_cache
+    from api.app.core.config import get_settings
+    from api.app.models import Base, Score
+    from api.app.storage.rollup import record_rollup, rollup_distinct
+    from api.app.storage.session import get_engine
+
+    monkeypatch.setattr(get_settings(), "HOT_STORE_ROWS", 0)
+    now = datetime.now(timezone.utc)
+    rows = [(now - timedelta(minutes=m), f"R{m % 2}", f"U{m % 5}N", m % 3 != 0) for m in range(12)]
+    # A rollup older than the window, so the window is covered
+    rows.append((now - timedelta(hours=3), "R0", "OLD", True))
+    Base.metadata.create_all(bind=get_engine())
+    SessionLocal = sessionmaker(bind=get_engine(), autoflush=False, autocommit=False, future=True)
+    with SessionLocal() as session:
+        for ts, r, sid, moving in rows:
+            session.add(Score(observed_ts=ts, route_id=r, stop_id=sid, anomaly_score=0.1, headway_sec=60.0 if moving else None))
+        assert record_rollup(session, rows[:6]) == 6
+        # Merges into the buckets already written in this transaction
+        record_rollup(session, rows[6:])
+        session.commit()
+        # Rollups start after this window: count exactly
+        assert rollup_distinct(session, now - timedelta(hours=4), now) is None
+        since = now - timedelta(minutes=30)
+        got = rollup_distinct(session, since, now)
+    window = [r for r in rows if r[0] >= since.replace(second=0, microsecond=0)]
+    assert got["stations_total"] >= len({r[2] for r in window})
+    assert got["trains_active"] == len({(r[1], r[2]) for r in window if r[3]})
+    get_response_cache().clear()
+
+    # Started after the writes, with the hot store off, so nothing else uses the connection meanwhile
+    with TestClient(app) as client:
+        body = client.get("/api/summary?window=30m").json()
+    assert body["approximate"] is True
+    assert body["stations_total"] == got["stations_total"]
@@ -0,0 +1,170 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy.orm import sessionmaker
+
+
+def _session():
+    from api.app.models import Base
+    from api.app.storage.session import get_engine
+
+    Base.metadata.create_all(bind=get_engine())
+    return sessionmaker(bind=get_engine(), autoflush=False, autocommit=False, future=True)()
+
+
+def _add(rows):
+    from api.app.models import Score
+
+    with _session() as session:
+        objs = [Score(**r) for r in rows]
+        session.add_all(objs)
+        session.commit()
+        return [o.id for o in objs]
+
+
+def test_reader_maps_published_segment(tmp_path, monkeypatch):
+    from api.app.core.cache import get_response_cache
+    from api.app.storage.hotstore import SEGMENT_NAME, HotStore, SharedHotStore
+    from api.app.storage.watermark import WATERMARK_KEY
+
+    now = datetime.now(timezone.utc)
+    _add(
+        [
+            {
+                "observed_ts": now - timedelta(seconds=7 * i),
+                "event_ts": now if i % 2 else None,
+                "route_id": "S1" if i % 3 else "S2",
+                "stop_id": f"S{i % 5}N",
+                "anomaly_score": (i % 9) / 9.0,
+                "residual": float(i) if i % 4 else None,
+                "headway_sec": 90.0,
+            }
+            for i in range(50)
+        ]
+    )
+    writer = HotStore(capacity=100000, window_sec=3600)
+    writer.refresh()
+    path = str(tmp_path / SEGMENT_NAME)
+    writer.publish(path)
+
+    reader = SharedHotStore(path, capacity=100000, window_sec=3600)
+    since = now - timedelta(minutes=10)
+    assert reader.anomaly_rows(since, ["S1", "S2"], [], 0.3, None, 9) == writer.anomaly_rows(since, ["S1", "S2"], [], 0.3, None, 9)
+    assert reader.heatmap_rows(since, now, ["S2"]) == writer.heatmap_rows(since, now, ["S2"])
+    assert reader.summary_counts(since) == writer.summary_counts(since)
+    # Views of the mapping, not copies
+    assert not reader.cols["score"].flags.writeable and reader.cols["score"].base is not None
+    assert reader.stats()["memory_bytes"] >= reader.n * 64
+
+    # A new segment is picked up on the next query
+    (new_id,) = _add([{"observed_ts": now, "route_id": "S3", "stop_id": "S9N", "anomaly_score": 0.99}])
+    assert reader.anomaly_rows(since, ["S3"], [], None, None, 5) == []
+    writer.refresh()
+    writer.publish(path)
+    assert [r[0] for r in reader.anomaly_rows(since, ["S3"], [], None, None, 5)] == [new_id]
+    assert reader.remaps == 2
+
+    # A watermark ahead of a segment that never catches up sends queries to the DB
+    from api.app.core.config import get_settings
+
+    monkeypatch.setattr(get_settings(), "HOT_STORE_CATCHUP_SEC", 0.05)
+    cache = get_response_cache()
+    cache.set(WATERMARK_KEY, f"{new_id + 1}.0.0")
+    try:
+        assert reader.anomaly_rows(since, ["S3"], [], None, None, 5) is None
+    finally:
+        cache.clear()
+
+
+def test_reader_waits_for_the_leader_to_catch_up(tmp_path, monkeypatch):
+    import threading
+
+    from api.app.core.cache import get_response_cache
+    from api.app.core.config import get_settings
+    from api.app.storage.hotstore import SEGMENT_NAME, HotStore, SharedHotStore
+    from api.app.storage.watermark import WATERMARK_KEY, compute_watermark
+
+    monkeypatch.setattr(get_settings(), "HOT_STORE_CATCHUP_SEC", 5.0)
+    now = datetime.now(timezone.utc)
+    _add([{"observed_ts": now, "route_id": "C1", "stop_id": "C1N", "anomaly_score": 0.5}])
+    writer = HotStore(capacity=100000, window_sec=3600)
+    writer.refresh()
+    path = str(tmp_path / SEGMENT_NAME)
+    writer.publish(path)
+    reader = SharedHotStore(path, capacity=100000, window_sec=3600)
+    since = now - timedelta(minutes=10)
+    assert len(reader.anomaly_rows(since, ["C1"], [], None, None, 5)) == 1
+
+    # NOTIFY: a new row commits and the watermark moves before the leader has republished
+    (new_id,) = _add([{"observed_ts": now, "route_id": "C1", "stop_id": "C2N", "anomaly_score": 0.7}])
+    cache = get_response_cache()
+    cache.set(WATERMARK_KEY, compute_watermark())
+
+    def leader():
+        time.sleep(0.2)
+        writer.refresh()
+        writer.publish(path)
+
+    t = threading.Thread(target=leader)
+    t.start()
+    try:
+        rows = reader.anomaly_rows(since, ["C1"], [], None, None, 5)
+    finally:
+        t.join()
+        cache.clear()
+    assert rows is not None and rows[0][0] == new_id
+    assert reader.catchups == 1 and reader.fallbacks == 0
+
+
+def test_one_refresher_is_elected(tmp_path, monkeypatch):
+    import api.app.storage.hotstore as hotstore
+
+    monkeypatch.setattr(hotstore, "ELECTION_SEC", 0.05)
+    first = hotstore.HotStoreRefresher(hotstore.HotStore(100000, 3600), str(tmp_path), poll_sec=0.05)
+    second = hotstore.HotStoreRefresher(hotstore.HotStore(100000, 3600), str(tmp_path), poll_sec=0.05)
+    first.start()
+    second.start()
+    try:
+        deadline = time.monotonic() + 10
+        while not (first.publishes or second.publishes) and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert (tmp_path / hotstore.SEGMENT_NAME).exists()
+        assert first.leader != second.leader
+        leader, follower = (first, second) if first.leader else (second, first)
+
+        # The follower takes over once the leader exits
+        leader.stop()
+        leader.join(5)
+        while not follower.leader and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert follower.leader
+    finally:
+        first.stop()
+        second.stop()
+        first.join(5)
+        second.join(5)
+
+
+def test_shutdown_releases_the_leader_lock(tmp_path, monkeypatch):
+    import os
+
+    from fastapi.testclient import TestClient
+
+    import api.app.storage.hotstore as hotstore
+    from api.app.core.config import get_settings
+    from api.app.core.filelock import try_lock, unlock
+    from api.app.main import app
+
+    monkeypatch.setattr(get_settings(), "HOT_STORE_SHM_DIR", str(tmp_path))
+    monkeypatch.setattr(hotstore, "_store", None)
+    lock = os.path.join(str(tmp_path), hotstore.LEADER_LOCK)
+    with TestClient(app):
+        refresher = hotstore._refresher
+        deadline = time.monotonic() + 10
+        while not refresher.leader and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert refresher.leader and try_lock(lock) is None
+    assert hotstore._refresher is None and not refresher.is_alive()
+    fd = try_lock(lock)
+    assert fd is not None
+    unlock(fd)
@@ -0,0 +1,116 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import update
+from sqlalchemy.orm import sessionmaker
+
+
+def _session():
+    from api.app.models import Base
+    from api.app.storage.session import get_engine
+
+    Base.metadata.create_all(bind=get_engine())
+    return sessionmaker(bind=get_engine(), autoflush=False, autocommit=False, future=True)()
+
+
+def _add(session, rows):
+    from api.app.models import Score
+
+    objs = [Score(**r) for r in rows]
+    session.add_all(objs)
+    session.commit()
+    return [o.id for o in objs]
+
+
+def _rounded(rows):
+    return sorted(tuple(round(v, 9) if isinstance(v, float) else v for v in r) for r in rows)
+
+
+def test_store_matches_db_and_catches_up_incrementally():
+    from api.app.routers.anomalies import _query_feed
+    from api.app.routers.heatmap import _query_heatmap
+    from api.app.storage.hotstore import HotStore, to_us
+
+    now = datetime.now(timezone.utc)
+    with _session() as session:
+        _add(
+            session,
+            [
+                {
+                    "observed_ts": now - timedelta(seconds=10 * i),
+                    "event_ts": now + timedelta(seconds=i) if i % 2 else None,
+                    "route_id": "H1" if i % 3 else "H2",
+                    "stop_id": f"H{i % 4}N",
+                    "anomaly_score": (i % 7) / 7.0,
+                    "residual": float(i) if i % 5 else None,
+                    "headway_sec": 120.0 if i % 2 else None,
+                }
+                for i in range(40)
+            ],
+        )
+
+    store = HotStore(capacity=100000, window_sec=3600)
+    store.refresh()
+    assert store.ready and store.stats()["rows"] >= 40
+
+    since = now - timedelta(minutes=15)
+    for routes, stops, min_score in ((["H1"], [], None), (["H1", "H2"], ["H1N", "H2N"], 0.4), (["H2"], [], 0.85)):
+        got = store.anomaly_rows(since, routes, stops, min_score, None, 7)
+        want = _query_feed(since, routes, stops, min_score, None, 7)
+        assert [r[0] for r in got] == [r[0] for r in want]
+        # The next page from the last row's keyset
+        after = (want[-1][1], want[-1][0]) if want else None
+        assert [r[0] for r in store.anomaly_rows(since, routes, stops, min_score, after, 7)] == [
+            r[0] for r in _query_feed(since, routes, stops, min_score, after, 7)
+        ]
+
+    def heat(routes):
+        got = store.heatmap_rows(since, now, routes)
+        want = _query_heatmap(since, now, routes[0] if routes else "All", None)
+        assert {r[0] for r in got} >= {r[0] for r in want}
+        mine = [r for r in got if r[0] in {w[0] for w in want}]
+        assert _rounded((r[0], r[1], r[2], to_us(r[3]), to_us(r[4]), r[5]) for r in mine) == _rounded(
+            (r[0], r[1], r[2], to_us(r[3]), to_us(r[4]), r[5]) for r in want
+        )
+
+    heat(["H1"])
+    heat(["H2"])
+
+    counts = store.summary_counts(since)
+    assert counts["total_rows"] >= 16 and counts["trains_active"] >= 1
+
+    # New rows are appended and re-scored rows patched on the next query
+    from api.app.models import Score
+
+    with _session() as session:
+        (new_id,) = _add(session, [{"observed_ts": now, "route_id": "H3", "stop_id": "H9N", "anomaly_score": 0.0}])
+        session.execute(
+            update(Score).where(Score.id == new_id).values(anomaly_score=0.95, residual=42.0, scored_at=datetime.now(timezone.utc))
+        )
+        session.commit()
+    rows = store.anomaly_rows(since, ["H3"], [], 0.9, None, 10)
+    assert [(r[0], r[5], r[6]) for r in rows] == [(new_id, 0.95, 42.0)]
+
+    st = store.stats()
+    assert st["memory_bytes"] == st["allocated_rows"] * 64
+    assert st["hits"] >= 1
+
+
+def test_store_falls_back_outside_covered_window():
+    from api.app.storage.hotstore import HotStore
+
+    now = datetime.now(timezone.utc)
+    with _session() as session:
+        _add(session, [{"observed_ts": now - timedelta(seconds=i), "route_id": "C9", "stop_id": "C9N", "anomaly_score": 0.1} for i in range(30)])
+
+    store = HotStore(capacity=100000, window_sec=600)
+    assert store.anomaly_rows(now - timedelta(minutes=5), [], [], None, None, 5) is None  # not loaded yet
+    store.refresh()
+    assert store.anomaly_rows(now - timedelta(minutes=5), [], [], None, None, 5) is not None
+    assert store.heatmap_rows(now - timedelta(hours=1), now, []) is None
+
+    # A full buffer evicts its oldest rows; windows reaching back past them go to the DB
+    small = HotStore(capacity=8, window_sec=600)
+    small.refresh()
+    assert small.n <= 8
+    assert small.anomaly_rows(now - timedelta(minutes=5), [], [], None, None, 5) is None
+    assert small.anomaly_rows(datetime.now(timezone.utc) + timedelta(seconds=1), [], [], None, None, 5) == []
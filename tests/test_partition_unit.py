@@ -0,0 +1,111 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy.orm import sessionmaker
+
+
+def test_partition_for_is_stable_and_in_range():
+    from worker.ml_online import partition_for
+
+    parts = {r: partition_for(r, 4) for r in ("A", "C", "E", "1", "7X", "GS")}
+    assert all(0 <= p < 4 for p in parts.values())
+    assert parts == {r: partition_for(r, 4) for r in parts}
+
+
+def test_score_partition_range_scores_each_row_once():
+    from api.app.models import Base, Score
+    from api.app.storage.session import get_engine
+    from worker.baseline import BaselineCache
+    from worker.ml_online import _new_models, score_partition_range
+
+    engine = get_engine()
+    Base.metadata.create_all(bind=engine)
+    SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+    now = datetime.now(timezone.utc)
+    with SessionLocal() as session:
+        rows = [
+            Score(observed_ts=now - timedelta(seconds=k), route_id=r, stop_id="P1", anomaly_score=0.0, residual=240.0 + k)
+            for k in range(6)
+            for r in ("PA", "PB")
+        ]
+        session.add_all(rows)
+        session.commit()
+        lo = min(r.id for r in rows) - 1
+        hi = max(r.id for r in rows)
+
+    models, baselines = _new_models(), BaselineCache()
+    with SessionLocal() as session:
+        assert score_partition_range(session, models, baselines, 0, 2, lo, hi, ["PA"]) == 6
+    with SessionLocal() as session:
+        # Same range again: the committed checkpoint makes it a no-op
+        assert score_partition_range(session, models, baselines, 0, 2, lo, hi, ["PA"]) == 0
+        pending = session.query(Score).filter(Score.stop_id == "P1", Score.anomaly_score == 0).all()
+    assert {r.route_id for r in pending} == {"PB"}
+
+
+def test_rows_committed_after_their_range_are_swept_up():
+    from api.app.models import SCORING_DONE, SCORING_PENDING, Base, Score
+    from api.app.storage.session import get_engine
+    from worker.baseline import BaselineCache
+    from worker.ml_online import _new_models, partition_for, score_partition_range, sweep_stragglers
+
+    engine = get_engine()
+    Base.metadata.create_all(bind=engine)
+    SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+    now = datetime.now(timezone.utc)
+    with SessionLocal() as session:
+        rows = [Score(observed_ts=now - timedelta(seconds=k), route_id="PS", stop_id="P2", anomaly_score=0.0, residual=200.0 + k) for k in range(4)]
+        session.add_all(rows)
+        session.commit()
+        ids = [r.id for r in rows]
+    lo, hi, part = min(ids) - 1, max(ids), partition_for("PS", 3)
+    models, baselines = _new_models(), BaselineCache()
+    with SessionLocal() as session:
+        assert score_partition_range(session, models, baselines, part, 3, lo, hi, ["PS"]) == 4
+        # One of them was still in flight when the range was scored: it commits pending afterwards
+        session.get(Score, ids[1]).scoring_state = SCORING_PENDING
+        session.commit()
+
+    with SessionLocal() as session:
+        swept = sweep_stragglers(session, hi, 3, skip=set())
+        assert ids[1] in swept[part] and ids[1] not in sum((swept[i] for i in range(3) if i != part), [])
+        assert ids[1] not in sweep_stragglers(session, hi, 3, skip={ids[1]})[part]
+        assert ids[1] not in sweep_stragglers(session, ids[1] - 1, 3, skip=set())[part]
+        # The checkpoint is already past hi; only the stray is scored
+        assert score_partition_range(session, models, baselines, part, 3, lo, hi, ["PS"], stray_ids=[ids[1]]) == 1
+    with SessionLocal() as session:
+        assert session.get(Score, ids[1]).scoring_state == SCORING_DONE
+        assert score_partition_range(session, models, baselines, part, 3, lo, hi, ["PS"], stray_ids=[ids[1]]) == 0
+
+
+def test_scored_at_is_stamped_after_scoring(monkeypatch):
+    import time
+
+    import worker.ml_online as ml_online
+    from api.app.models import Base, Score
+    from api.app.storage.session import get_engine
+    from worker.baseline import BaselineCache
+
+    engine = get_engine()
+    Base.metadata.create_all(bind=engine)
+    SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+    now = datetime.now(timezone.utc)
+    with SessionLocal() as session:
+        rows = [Score(observed_ts=now - timedelta(seconds=k), route_id="PT", stop_id="PT1", anomaly_score=0.0, residual=200.0 + k) for k in range(3)]
+        session.add_all(rows)
+        session.commit()
+        lo, hi = min(r.id for r in rows) - 1, max(r.id for r in rows)
+
+    # Slow scoring must not push scored_at back past the readers' overlap window
+    real_score_row = ml_online._score_row
+    last_scored = []
+
+    def slow_score_row(*args):
+        time.sleep(0.05)
+        last_scored.append(datetime.now(timezone.utc))
+        return real_score_row(*args)
+
+    monkeypatch.setattr(ml_online, "_score_row", slow_score_row)
+    with SessionLocal() as session:
+        assert ml_online.score_partition_range(session, ml_online._new_models(), BaselineCache(), 0, 1, lo, hi, ["PT"]) == 3
+        stamps = [r.scored_at for r in session.query(Score).filter(Score.route_id == "PT").all()]
+    assert all((s if s.tzinfo else s.replace(tzinfo=timezone.utc)) >= last_scored[-1] for s in stamps)
@@ -0,0 +1,72 @@
+import math
+
+
+def _wiggly_line(n=400):
+    # A straight run north with a ~1 m wobble and one real 300 m detour in the middle
+    pts = []
+    for i in range(n):
+        lat = 40.70 + i * 0.0002
+        lon = -73.95 + (0.00001 if i % 2 else 0.0) + (0.003 * math.sin(math.pi * (i - 150) / 100) if 150 <= i < 250 else 0.0)
+        pts.append((lon, lat))
+    return pts
+
+
+def _feed(tmp_path):
+    shapes = "shape_id,shape_pt_lat,shape_pt_lon,shape_pt_sequence\n" + "".join(
+        f"A..N,{lat},{lon},{i}\n" for i, (lon, lat) in reversed(list(enumerate(_wiggly_line())))
+    ) + "".join(f"A..S,{lat},{lon},{i}\n" for i, (lon, lat) in enumerate(reversed(_wiggly_line())))
+    files = {
+        "stops.txt": "stop_id,stop_name,stop_lat,stop_lon,parent_station\nA02,Inwood,40.868,-73.919,\n",
+        "routes.txt": "route_id\nA\nB\n",
+        "trips.txt": "route_id,service_id,trip_id,shape_id\nA,WKD,t1,A..N\nA,WKD,t2,A..S\nA,WKD,t3,A..N\nB,WKD,t4,\n",
+        "stop_times.txt": "trip_id,stop_id,stop_sequence\nt1,A02,1\n",
+        "shapes.txt": shapes,
+    }
+    for name, body in files.items():
+        (tmp_path / name).write_text(body)
+    return str(tmp_path)
+
+
+def test_simplify_keeps_shape_and_drops_noise():
+    from api.app.core.tiles import simplify_line
+
+    pts = _wiggly_line()
+    coarse, fine = simplify_line(pts, 11), simplify_line(pts, 18)
+    assert coarse[0] == pts[0] and coarse[-1] == pts[-1]
+    assert 3 < len(coarse) < 60 < len(fine)
+    # The detour survives at low zoom
+    assert max(lon for lon, _lat in coarse) > -73.948
+    assert simplify_line(pts[:2], 11) == pts[:2]
+
+
+def test_shapes_compiled_per_zoom_and_cached(tmp_path):
+    from api.app.gtfs import SHAPE_ZOOMS, build_snapshot
+
+    source, cache = _feed(tmp_path), str(tmp_path / "cache")
+    snap = build_snapshot(source, cache)
+    assert set(snap.shapes) == {"A"}
+    levels = snap.shapes["A"]
+    assert sorted(levels) == list(SHAPE_ZOOMS)
+    sizes = [sum(len(line) for line in levels[z]) for z in SHAPE_ZOOMS]
+    assert sizes == sorted(sizes) and sizes[0] < 400
+    assert all(len(levels[z]) == 1 for z in SHAPE_ZOOMS)  # southbound is northbound reversed
+    assert snap.shape("A", 12)[0] == 11 and snap.shape("A", 3)[0] == SHAPE_ZOOMS[0] and snap.shape("B", 12) is None
+
+    cached = build_snapshot(source, cache)
+    assert cached.from_cache and cached.shapes == snap.shapes
+
+
+def test_route_shape_endpoint(test_client, tmp_path, monkeypatch):
+    import api.app.routers.routes as routes
+    from api.app.gtfs import build_snapshot
+
+    snap = build_snapshot(_feed(tmp_path), None)
+    monkeypatch.setattr(routes, "get_gtfs", lambda: snap)
+    r = test_client.get("/api/routes/A/shape?zoom=14.5")
+    assert r.status_code == 200
+    body = r.json()
+    assert body["geometry"]["type"] == "MultiLineString" and body["properties"]["zoom"] == 13
+    assert body["properties"]["points"] == sum(len(line) for line in body["geometry"]["coordinates"])
+    assert len(r.content) < 8000
+    assert test_client.get("/api/routes/A/shape?zoom=14.5", headers={"If-None-Match": r.headers["ETag"]}).status_code == 304
+    assert test_client.get("/api/routes/B/shape").status_code == 404
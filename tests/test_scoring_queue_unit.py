@@ -0,0 +1,38 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy.orm import sessionmaker
+
+
+def test_process_once_drains_pending_queue():
+    from api.app.models import SCORING_DONE, SCORING_PENDING, SCORING_SKIPPED, Base, Score
+    from api.app.storage.session import get_engine
+    from worker.ml_online import process_once
+
+    engine = get_engine()
+    Base.metadata.create_all(bind=engine)
+    SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+    # The in-memory DB is shared across tests: start from an empty queue
+    while process_once(batch_size=500):
+        pass
+    now = datetime.now(timezone.utc)
+    with SessionLocal() as session:
+        session.add_all(
+            [
+                Score(observed_ts=now - timedelta(seconds=k), route_id="Q", stop_id="Q1", anomaly_score=0.0, headway_sec=300.0 + k)
+                for k in range(5)
+            ]
+            + [Score(observed_ts=now, route_id="Q", stop_id="Q2", anomaly_score=0.0, headway_sec=None)]
+        )
+        session.commit()
+
+    assert process_once(batch_size=100) == 5
+    assert process_once(batch_size=100) == 0
+
+    with SessionLocal() as session:
+        rows = session.query(Score).filter(Score.route_id == "Q").all()
+    assert not [r for r in rows if r.scoring_state == SCORING_PENDING]
+    done = [r for r in rows if r.stop_id == "Q1"]
+    assert all(r.scoring_state == SCORING_DONE and r.scored_at is not None for r in done)
+    # The ingested headway is kept next to the model residual
+    assert sorted(r.headway_sec for r in done) == [300.0, 301.0, 302.0, 303.0, 304.0]
+    assert [r.scoring_state for r in rows if r.stop_id == "Q2"] == [SCORING_SKIPPED]
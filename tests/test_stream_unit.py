@@ -0,0 +1,72 @@
+import asyncio
+import json
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy.orm import sessionmaker
+
+
+def _events(messages):
+    out = []
+    for topic, raw in messages:
+        head, data = raw.decode().strip().split("\n")
+        out.append((topic, head[len("event: "):], json.loads(data[len("data: "):])))
+    return out
+
+
+def test_broadcaster_fans_out_by_topic_and_drops_slow_subscribers():
+    from api.app.core.broadcast import Broadcaster
+
+    async def run():
+        b = Broadcaster(queue_size=1)
+        everyone, a_only = b.subscribe("All"), b.subscribe(" A ")
+        assert b.topics() == {"all", "A"}
+        assert b.publish("A", b"x") == 1
+        assert a_only.queue.get_nowait() == b"x"
+        assert b.publish("all", b"1") == 1
+        assert b.publish("all", b"2") == 0  # queue of one is still full
+        assert everyone.overflowed and b.topics() == {"A"}
+        return b.stats()
+
+    stats = asyncio.run(run())
+    assert stats["subscribers"] == 1 and stats["dropped"] == 1
+
+
+def test_stream_feed_collects_new_scores_once(monkeypatch):
+    from api.app.models import SCORING_DONE, Base, Score
+    from api.app.routers import stream
+    from api.app.storage.session import get_engine
+
+    monkeypatch.setattr(
+        stream, "_load_stops", lambda: [{"stop_id": "T1", "stop_name": "Test St", "lat": 40.7, "lon": -74.0}]
+    )
+    engine = get_engine()
+    Base.metadata.create_all(bind=engine)
+    SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+    now = datetime.now(timezone.utc)
+    feed = stream.StreamFeed()
+    feed.cursor = now - timedelta(seconds=1)
+    # The in-memory DB is shared across tests: absorb rows other tests just scored
+    feed.collect({"all"})
+    with SessionLocal() as session:
+        session.add_all(
+            [
+                Score(observed_ts=now, route_id="T", stop_id="T1", anomaly_score=0.9, residual=10.0,
+                      scoring_state=SCORING_DONE, scored_at=now),
+                Score(observed_ts=now, route_id="U", stop_id="T1", anomaly_score=0.1, residual=-4.0,
+                      scoring_state=SCORING_DONE, scored_at=now),
+            ]
+        )
+        session.commit()
+
+    events = _events(feed.collect({"all", "T", "X"}))
+    kinds = {(topic, kind) for topic, kind, _ in events}
+    assert kinds == {("all", "anomalies"), ("all", "heatmap"), ("T", "anomalies"), ("T", "heatmap")}
+    by = {(topic, kind): data for topic, kind, data in events}
+    assert [i["route_id"] for i in by[("all", "anomalies")]["items"]] == ["T"]
+    all_props = by[("all", "heatmap")]["features"][0]["properties"]
+    t_props = by[("T", "heatmap")]["features"][0]["properties"]
+    assert all_props["stop_id"] == "T1" and t_props["route_id"] == "T"
+    assert abs(t_props["anomaly_score"] - 0.9) < 1e-9
+    assert abs(all_props["residual"] - 3.0) < 1e-9
+    # Already delivered rows are not repeated
+    assert feed.collect({"all"}) == []
@@ -0,0 +1,56 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy.orm import sessionmaker
+
+
+def test_stats_come_from_id_range_and_rollups(test_client):
+    from api.app.core.cache import get_response_cache
+    from api.app.models import Score
+    from api.app.storage.rollup import record_rollup
+    from api.app.storage.session import get_engine
+    from api.app.storage.tablestats import table_stats
+
+    now = datetime.now(timezone.utc)
+    rows = [(now - timedelta(minutes=m, seconds=1), "Q1", f"Q{m}N", True) for m in range(1, 7)]
+    rows.append((now - timedelta(hours=2), "Q1", "Q0N", False))
+    SessionLocal = sessionmaker(bind=get_engine(), autoflush=False, autocommit=False, future=True)
+    with SessionLocal() as session:
+        for ts, r, sid, _moving in rows:
+            session.add(Score(observed_ts=ts, route_id=r, stop_id=sid, anomaly_score=0.2))
+        record_rollup(session, rows)
+        session.commit()
+
+    st = table_stats()
+    assert st["row_count_source"] == "id_range" and st["total_rows_estimate"] >= len(rows)
+    assert st["recent_source"] == "score_rollups" and st["recent_scores"] >= 6
+    # The five full minutes before the current one hold at least our five rows
+    assert st["ingest_rows_per_sec"] >= 5 / 300.0
+    assert st["oldest_observed_ts"] <= (now - timedelta(hours=2)).isoformat() <= st["newest_observed_ts"]
+
+    get_response_cache().clear()
+    body = test_client.get("/api/debug/stats").json()
+    assert body["table"]["row_count_source"] == "id_range"
+    assert body["recent_scores"] == body["table"]["recent_scores"]
+
+
+def test_recent_scores_falls_back_to_a_bounded_count(monkeypatch):
+    import api.app.storage.tablestats as tablestats
+    from api.app.models import Base, Score
+    from api.app.storage.session import get_engine
+
+    engine = get_engine()
+    Base.metadata.create_all(bind=engine)
+    now = datetime.now(timezone.utc) - timedelta(days=400)  # before any rollup other tests wrote
+    SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+    with SessionLocal() as session:
+        for s in range(3):
+            session.add(Score(observed_ts=now - timedelta(seconds=10 * s), route_id="Q9", stop_id="Q9N", anomaly_score=0.1))
+        session.commit()
+    monkeypatch.setattr(tablestats, "get_hot_store", lambda: None)
+
+    with SessionLocal() as session:
+        recent = tablestats._recent(session, now)
+        assert recent["recent_scores"] >= 3 and recent["recent_source"] == "observed_ts_index"
+        monkeypatch.setattr(tablestats, "RECENT_COUNT_CAP", 2)
+        capped = tablestats._recent(session, now)
+    assert capped["recent_scores"] == 2 and capped["recent_source"] == "observed_ts_index_capped"
@@ -0,0 +1,114 @@
+from datetime import datetime, timezone
+
+from sqlalchemy.orm import sessionmaker
+
+
+def _fields(buf):
+    """Tiny protobuf reader: yields (field, wire, value) with bytes for wire 2."""
+    i = 0
+    while i < len(buf):
+        key, i = _varint(buf, i)
+        field, wire = key >> 3, key & 7
+        if wire == 0:
+            val, i = _varint(buf, i)
+        elif wire == 1:
+            val, i = buf[i : i + 8], i + 8
+        else:
+            n, i = _varint(buf, i)
+            val, i = buf[i : i + n], i + n
+        yield field, wire, val
+
+
+def _varint(buf, i):
+    shift = out = 0
+    while True:
+        b = buf[i]
+        i += 1
+        out |= (b & 0x7F) << shift
+        shift += 7
+        if not b & 0x80:
+            return out, i
+
+
+def _decode_layer(tile):
+    (field, _, layer), = list(_fields(tile))
+    assert field == 3
+    name, keys, values, feats = None, [], [], []
+    for f, _, v in _fields(layer):
+        if f == 1:
+            name = v.decode()
+        elif f == 3:
+            keys.append(v.decode())
+        elif f == 4:
+            (vf, _, vv), = list(_fields(v))
+            values.append(vv.decode() if vf == 1 else vv)
+        elif f == 2:
+            feats.append({ff: vv for ff, _, vv in _fields(v)})
+    out = []
+    for feat in feats:
+        tags, pos = [], 0
+        while pos < len(feat[2]):
+            t, pos = _varint(feat[2], pos)
+            tags.append(t)
+        geom, pos = [], 0
+        while pos < len(feat[4]):
+            g, pos = _varint(feat[4], pos)
+            geom.append(g)
+        cmd, zx, zy = geom
+        assert cmd == 9 and feat[3] == 1  # one MoveTo, POINT
+        props = {keys[tags[k]]: values[tags[k + 1]] for k in range(0, len(tags), 2)}
+        out.append(((zx >> 1) ^ -(zx & 1), (zy >> 1) ^ -(zy & 1), props))
+    return name, out
+
+
+def test_stop_index_tile_lookup_and_clustering():
+    from api.app.core.tiles import StopIndex, cluster_points, lonlat_to_unit
+
+    stops = [
+        {"stop_id": "A", "lon": -73.99, "lat": 40.75},
+        {"stop_id": "B", "lon": -73.9901, "lat": 40.7501},
+        {"stop_id": "C", "lon": -73.80, "lat": 40.70},
+    ]
+    idx = StopIndex(stops)
+    ux, uy = lonlat_to_unit(-73.99, 40.75)
+    z = 15
+    tx, ty = int(ux * (1 << z)), int(uy * (1 << z))
+    hits = {idx.ids[i] for i in idx.query_tile(z, tx, ty)}
+    assert hits == {"A", "B"}
+    px, py = idx.tile_point(idx.position["A"], z, tx, ty)
+    assert 0 <= px < 4096 and 0 <= py < 4096
+    pts = [(i, idx.tile_point(i, 10, tx >> 5, ty >> 5), {"anomaly_score": s}) for i, s in zip(range(3), (0.2, 0.8, 0.5))]
+    merged = cluster_points([p for p in pts if idx.ids[p[0]] in ("A", "B")], cell=384)
+    assert len(merged) == 1 and merged[0][2]["point_count"] == 2 and merged[0][2]["anomaly_score"] == 0.8
+
+
+def test_heatmap_tile_endpoint_encodes_points(test_client, monkeypatch):
+    from api.app.core.cache import get_response_cache
+    from api.app.core.tiles import lonlat_to_unit
+    from api.app.models import Score
+    from api.app.routers import heatmap
+    from api.app.storage.session import get_engine
+
+    stops = [{"stop_id": "M1", "stop_name": "Tile St", "lon": -73.95, "lat": 40.78}]
+    monkeypatch.setattr(heatmap, "_load_stops", lambda: stops)
+    SessionLocal = sessionmaker(bind=get_engine(), autoflush=False, autocommit=False, future=True)
+    with SessionLocal() as session:
+        session.add(Score(observed_ts=datetime.now(timezone.utc), route_id="MT", stop_id="M1", anomaly_score=0.75, residual=42.0))
+        session.commit()
+    get_response_cache().clear()
+
+    ux, uy = lonlat_to_unit(-73.95, 40.78)
+    z = 14
+    tx, ty = int(ux * (1 << z)), int(uy * (1 << z))
+    r = test_client.get(f"/api/heatmap/tiles/{z}/{tx}/{ty}.mvt?route_id=MT")
+    assert r.status_code == 200
+    assert r.headers["content-type"] == "application/vnd.mapbox-vector-tile"
+    name, feats = _decode_layer(r.content)
+    assert name == "anomalies" and len(feats) == 1
+    x, y, props = feats[0]
+    assert abs(x - (ux * (1 << z) - tx) * 4096) <= 1 and abs(y - (uy * (1 << z) - ty) * 4096) <= 1
+    assert props["stop_id"] == "M1" and props["route_id"] == "MT"
+
+    assert test_client.get(f"/api/heatmap/tiles/{z}/{tx}/{ty}.mvt?route_id=MT", headers={"If-None-Match": r.headers["ETag"]}).status_code == 304
+    assert test_client.get(f"/api/heatmap/tiles/{z}/{tx + 1}/{ty}.mvt?route_id=MT").content == b""
+    assert test_client.get("/api/heatmap/tiles/2/9/0.mvt").status_code == 404
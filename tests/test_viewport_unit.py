@@ -0,0 +1,61 @@
+from datetime import datetime, timezone
+
+from sqlalchemy.orm import sessionmaker
+
+
+STOPS = [
+    {"stop_id": "V1", "stop_name": "One", "lat": 40.7500, "lon": -73.9900, "routes": []},
+    {"stop_id": "V2", "stop_name": "Two", "lat": 40.7502, "lon": -73.9902, "routes": []},
+    {"stop_id": "V3", "stop_name": "Three", "lat": 40.6000, "lon": -73.8000, "routes": []},
+]
+
+
+def test_stop_index_bbox_and_clusters():
+    from api.app.core.tiles import StopIndex, parse_bbox
+
+    idx = StopIndex(STOPS)
+    assert idx.ids_in_bbox(parse_bbox("-74.0,40.74,-73.98,40.76")) == {"V1", "V2"}
+    assert idx.clusters(["V1", "V2", "V3"], zoom=10) == [["V1", "V2"], ["V3"]]
+    assert len(idx.clusters(["V1", "V2", "V3"], zoom=18)) == 3
+    lon, lat = idx.centroid(["V1", "V2"])
+    assert abs(lon + 73.9901) < 1e-6 and abs(lat - 40.7501) < 1e-6
+
+
+def test_heatmap_and_stops_viewport(test_client, monkeypatch):
+    from api.app.core.cache import get_response_cache
+    from api.app.models import Score
+    from api.app.routers import heatmap, stops
+    from api.app.storage.session import get_engine
+
+    monkeypatch.setattr(heatmap, "_load_stops", lambda: STOPS)
+    monkeypatch.setattr(stops, "_load_stops", lambda: STOPS)
+    SessionLocal = sessionmaker(bind=get_engine(), autoflush=False, autocommit=False, future=True)
+    now = datetime.now(timezone.utc)
+    with SessionLocal() as session:
+        session.add_all(
+            [
+                Score(observed_ts=now, route_id="VW", stop_id="V1", anomaly_score=0.2, residual=10.0),
+                Score(observed_ts=now, route_id="VW", stop_id="V2", anomaly_score=0.8, residual=30.0),
+                Score(observed_ts=now, route_id="VW", stop_id="V3", anomaly_score=0.5, residual=0.0),
+            ]
+        )
+        session.commit()
+    get_response_cache().clear()
+
+    boxed = test_client.get("/api/heatmap?route_id=VW&bbox=-74.0,40.74,-73.98,40.76").json()
+    assert sorted(f["properties"]["stop_id"] for f in boxed["features"]) == ["V1", "V2"]
+
+    far = test_client.get("/api/heatmap?route_id=VW&zoom=9").json()["features"]
+    assert len(far) == 2
+    cluster = next(f["properties"] for f in far if f["properties"].get("cluster"))
+    assert cluster["point_count"] == 2 and cluster["stop_id"] == "V2"
+    assert abs(cluster["anomaly_score"] - 0.5) < 1e-9 and abs(cluster["anomaly_score_sum"] - 1.0) < 1e-9
+    assert cluster["anomaly_score_max"] == 0.8 and abs(cluster["residual"] - 20.0) < 1e-9
+
+    assert test_client.get("/api/heatmap?bbox=1,2,3").status_code == 400
+
+    assert len(test_client.get("/api/stops").json()) == 3
+    in_box = test_client.get("/api/stops?bbox=-74.0,40.74,-73.98,40.76").json()
+    assert [s["stop_id"] for s in in_box] == ["V1", "V2"] and "point_count" not in in_box[0]
+    clustered = test_client.get("/api/stops?zoom=9").json()
+    assert sorted(s.get("point_count", 1) for s in clustered) == [1, 2]
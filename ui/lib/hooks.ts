@@ -1,4 +1,4 @@
-import { useEffect, useState } from 'react';
+import { useEffect, useRef, useState } from 'react';
 
 export function useRoutes() {
   const [routes, setRoutes] = useState<string[]>([]);
@@ -41,12 +41,78 @@ export function useStops() {
   return stops;
 }
 
+// Subscribe to /api/stream (Server-Sent Events). Handlers get parsed event payloads;
+// 'hello' fires on every (re)connect, which is the cue to refetch a snapshot.
+export function useStream(
+  route: string,
+  handlers: Record<string, (data: any) => void>,
+  enabled = true,
+) {
+  const ref = useRef(handlers);
+  ref.current = handlers;
+  useEffect(() => {
+    if (!enabled || typeof window === 'undefined' || typeof EventSource === 'undefined') return;
+    const url = new URL('/api/stream', window.location.origin);
+    url.searchParams.set('route_id', route || 'All');
+    const es = new EventSource(url.toString());
+    const names = ['hello', 'anomalies', 'heatmap'];
+    const listeners = names.map((name) => {
+      const fn = (ev: MessageEvent) => {
+        const h = ref.current[name];
+        if (!h) return;
+        try {
+          h(JSON.parse(ev.data));
+        } catch {}
+      };
+      es.addEventListener(name, fn as EventListener);
+      return [name, fn] as const;
+    });
+    return () => {
+      listeners.forEach(([name, fn]) => es.removeEventListener(name, fn as EventListener));
+      es.close();
+    };
+  }, [route, enabled]);
+}
+
+// Replace/insert features by stop_id
+function mergeFeatures(fc: any, features: any[]) {
+  const byId = new Map<string, any>();
+  for (const f of fc.features || []) byId.set(f.properties?.stop_id, f);
+  for (const f of features) byId.set(f.properties?.stop_id, f);
+  return { ...fc, features: Array.from(byId.values()) };
+}
+
+// Apply a `since` delta from /api/heatmap: upsert changed features, drop removed stops
+function applyHeatmapDelta(fc: any, d: any) {
+  const removed = new Set<string>(d.removed || []);
+  const merged = mergeFeatures(fc, d.features || []);
+  return {
+    ...merged,
+    timestamp: d.timestamp,
+    watermark: d.watermark,
+    features: merged.features.filter((f: any) => !removed.has(f.properties?.stop_id)),
+  };
+}
+
 export function useHeatmap(route = 'All', win = '60m', tickMs?: number) {
   const [data, setData] = useState<any>({ type: 'FeatureCollection', features: [] });
+  const resync = useRef<() => void>(() => {});
+  const live = !!(tickMs && tickMs > 0);
+  useStream(
+    route,
+    {
+      hello: () => resync.current(),
+      heatmap: (d) => {
+        if (d.window === win) setData((prev: any) => mergeFeatures(prev, d.features || []));
+      },
+    },
+    live,
+  );
   useEffect(() => {
     let aborted = false;
     let interval: any;
     let inFlight = false;
+    let since: string | undefined; // watermark of the collection we hold; polls fetch only changes
     const run = async () => {
       if (inFlight) return; // debounce: skip if request in flight
       if (typeof document !== 'undefined' && document.hidden) return; // skip in background tab
@@ -56,16 +122,25 @@ export function useHeatmap(route = 'All', win = '60m', tickMs?: number) {
         url.searchParams.set('ts', 'now');
         url.searchParams.set('window', win);
         url.searchParams.set('route_id', route || 'All');
+        if (since) url.searchParams.set('since', since);
         const r = await fetch(url.toString());
         if (!r.ok) return;
         const d = await r.json();
-        if (!aborted) setData(d);
+        if (aborted) return;
+        since = d.watermark;
+        setData((prev: any) => (d.delta ? applyHeatmapDelta(prev, d) : d));
       } finally {
         inFlight = false;
       }
     };
+    resync.current = () => {
+      since = undefined;
+      run();
+    };
     run();
-    if (tickMs && tickMs > 0) interval = setInterval(run, tickMs);
+    // With the stream pushing deltas, `since` polls only need to catch stops aging out of the window
+    const streaming = typeof EventSource !== 'undefined';
+    if (tickMs && tickMs > 0) interval = setInterval(run, streaming ? tickMs * 4 : tickMs);
     return () => {
       aborted = true;
       if (interval) clearInterval(interval);
@@ -0,0 +1,185 @@
+"""Long-horizon seasonal headway baselines.
+
+Baselines are keyed by ``(route_id, stop_id, day_type, slot)`` where
+``day_type`` is weekday/saturday/sunday and ``slot`` is the 15-minute slot of
+the New York local day. Each entry keeps exponentially decayed robust
+statistics (a winsorized location estimate and mean absolute deviation) so
+one noisy arrival cannot drag the baseline far.
+
+The trainer reads baselines through ``BaselineCache``, which loads all slots
+for a (route, stop) pair on first use and keeps them in memory; updates are
+written back in bulk with ``flush``.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Optional, Set, Tuple
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import insert, select, tuple_, update
+from sqlalchemy.orm import Session
+
+from api.app.models import SeasonalBaseline
+from .util import get_logger
+
+
+log = get_logger(__name__)
+
+NY = ZoneInfo("America/New_York")
+
+SLOT_MINUTES = 15
+# Observations older than this count half as much as fresh ones
+HALF_LIFE_SEC = 28 * 24 * 3600
+# Below this decayed weight a baseline is considered cold and not used for scoring
+MIN_WEIGHT = 5.0
+# Values further than CLIP_K * scale from the location are winsorized
+CLIP_K = 3.0
+# Scale floor relative to the location, so a fresh entry (mad=0) can still move
+MIN_SCALE_FRAC = 0.1
+# Learning-rate floor so long-lived entries keep adapting
+MIN_ETA = 0.02
+# Weight an entry is cut back to after drift, so new observations dominate quickly
+REWARM_WEIGHT = MIN_WEIGHT
+
+PREFETCH_CHUNK = 500
+
+BaselineKey = Tuple[str, str, str, int]
+
+
+def slot_for(ts: datetime) -> Tuple[str, int]:
+    """Return (day_type, slot) for a timestamp in New York local time."""
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    local = ts.astimezone(NY)
+    wd = local.weekday()
+    day_type = "sat" if wd == 5 else "sun" if wd == 6 else "wkd"
+    slot = (local.hour * 60 + local.minute) // SLOT_MINUTES
+    return day_type, int(slot)
+
+
+@dataclass
+class BaselineStat:
+    weight: float
+    median: float
+    mad: float
+    updated_ts: datetime
+
+    @property
+    def warm(self) -> bool:
+        return self.weight >= MIN_WEIGHT
+
+    @property
+    def scale(self) -> float:
+        return max(self.mad, abs(self.median) * MIN_SCALE_FRAC, 1.0)
+
+    def update(self, x: float, ts: datetime, half_life_sec: float = HALF_LIFE_SEC) -> None:
+        if self.weight <= 0:
+            self.weight = 1.0
+            self.median = float(x)
+            self.mad = 0.0
+            self.updated_ts = ts
+            return
+        dt = max(0.0, (ts - self.updated_ts).total_seconds())
+        self.weight = self.weight * 0.5 ** (dt / half_life_sec) + 1.0
+        eta = max(1.0 / self.weight, MIN_ETA)
+        bound = CLIP_K * self.scale
+        clipped = min(max(float(x), self.median - bound), self.median + bound)
+        self.median += eta * (clipped - self.median)
+        self.mad += eta * (min(abs(float(x) - self.median), bound) - self.mad)
+        if ts > self.updated_ts:
+            self.updated_ts = ts
+
+
+class BaselineCache:
+    """In-memory view over ``seasonal_baselines`` with write-back."""
+
+    def __init__(self, half_life_sec: float = HALF_LIFE_SEC) -> None:
+        self.half_life_sec = half_life_sec
+        self._stats: Dict[BaselineKey, BaselineStat] = {}
+        self._loaded: Set[Tuple[str, str]] = set()
+        self._persisted: Set[BaselineKey] = set()
+        self._dirty: Set[BaselineKey] = set()
+
+    def __len__(self) -> int:
+        return len(self._stats)
+
+    def prefetch(self, session: Session, pairs: Iterable[Tuple[str, str]]) -> None:
+        """Load every slot for the given (route_id, stop_id) pairs not seen yet."""
+        missing = [p for p in {(str(r), str(s)) for r, s in pairs} if p not in self._loaded]
+        for i in range(0, len(missing), PREFETCH_CHUNK):
+            chunk = missing[i : i + PREFETCH_CHUNK]
+            stmt = select(SeasonalBaseline).where(
+                tuple_(SeasonalBaseline.route_id, SeasonalBaseline.stop_id).in_(chunk)
+            )
+            for row in session.execute(stmt).scalars():
+                key = (row.route_id, row.stop_id, row.day_type, int(row.slot))
+                updated = row.updated_ts if row.updated_ts.tzinfo else row.updated_ts.replace(tzinfo=timezone.utc)
+                self._stats[key] = BaselineStat(float(row.weight), float(row.median), float(row.mad), updated)
+                self._persisted.add(key)
+            self._loaded.update(chunk)
+
+    def get(self, route_id: str, stop_id: str, ts: datetime) -> Optional[BaselineStat]:
+        day_type, slot = slot_for(ts)
+        return self._stats.get((route_id, stop_id, day_type, slot))
+
+    def update(self, route_id: str, stop_id: str, ts: datetime, headway_sec: float) -> None:
+        if ts.tzinfo is None:
+            ts = ts.replace(tzinfo=timezone.utc)
+        day_type, slot = slot_for(ts)
+        key = (route_id, stop_id, day_type, slot)
+        stat = self._stats.get(key)
+        if stat is None:
+            stat = BaselineStat(weight=0.0, median=0.0, mad=0.0, updated_ts=ts)
+            self._stats[key] = stat
+        stat.update(headway_sec, ts, self.half_life_sec)
+        self._dirty.add(key)
+
+    def rewarm(self, route_id: str, stop_id: str, weight: float = REWARM_WEIGHT) -> int:
+        """Shrink the weight of every slot for a (route, stop) after drift. Returns entries touched."""
+        touched = 0
+        for key, stat in self._stats.items():
+            if key[0] == route_id and key[1] == stop_id and stat.weight > weight:
+                stat.weight = weight
+                self._dirty.add(key)
+                touched += 1
+        return touched
+
+    def flush(self, session: Session) -> int:
+        """Write dirty entries back in bulk; caller commits. Returns rows written."""
+        if not self._dirty:
+            return 0
+        inserts, updates = [], []
+        for key in self._dirty:
+            stat = self._stats[key]
+            route_id, stop_id, day_type, slot = key
+            row = {
+                "route_id": route_id,
+                "stop_id": stop_id,
+                "day_type": day_type,
+                "slot": slot,
+                "weight": stat.weight,
+                "median": stat.median,
+                "mad": stat.mad,
+                "updated_ts": stat.updated_ts,
+            }
+            (updates if key in self._persisted else inserts).append(row)
+        if inserts:
+            session.execute(insert(SeasonalBaseline), inserts)
+        if updates:
+            session.execute(update(SeasonalBaseline), updates)
+        self._persisted.update(self._dirty)
+        written = len(self._dirty)
+        self._dirty.clear()
+        log.bind(inserted=len(inserts), updated=len(updates)).debug("flushed baselines")
+        return written
+
+
+_cache: Optional[BaselineCache] = None
+
+
+def get_baseline_cache() -> BaselineCache:
+    global _cache
+    if _cache is None:
+        _cache = BaselineCache()
+    return _cache
@@ -32,7 +32,9 @@ from google.transit import gtfs_realtime_pb2  # type: ignore
 from sqlalchemy.orm import Session, sessionmaker
 
 from api.app.core.logging import get_logger
-from api.app.models import Base, Score
+from api.app.models import SCORING_PENDING, SCORING_SKIPPED, Base, Score
+from api.app.storage.notify import notify_scores_changed
+from api.app.storage.rollup import RollupRow, record_rollup
 from api.app.storage.session import get_engine
 
 
@@ -108,7 +110,10 @@ def _upsert_scores(session: Session, events: Iterable[Tuple[str, str, int]], las
 
     For each (route, stop), keep earliest upcoming arrival for this cycle,
     compute naive headway against previous arrival, and insert a Score row
-    (residual=0, anomaly_score=0) with ts set to arrival time.
+    (headway_sec, anomaly_score=0) with ts set to arrival time. Rows with a
+    headway are queued for the trainer (scoring_state pending); the rest are
+    marked skipped. The rows are folded into their per-minute rollups in the
+    same transaction.
     """
     # Keep earliest arrival per (route, stop) for this batch
     agg: Dict[Tuple[str, str], int] = {}
@@ -122,6 +127,7 @@ def _upsert_scores(session: Session, events: Iterable[Tuple[str, str, int]], las
             agg[key] = t
 
     count = 0
+    rollup: List[RollupRow] = []
     for (route_id, stop_id), arr in agg.items():
         # naive headway calc
         prev = last_seen.get((route_id, stop_id))
@@ -140,13 +146,18 @@ def _upsert_scores(session: Session, events: Iterable[Tuple[str, str, int]], las
                 route_id=route_id,
                 stop_id=stop_id,
                 anomaly_score=0.0,
-                residual=0.0 if headway is None else float(headway),
+                residual=None,
+                headway_sec=None if headway is None else float(headway),
+                scoring_state=SCORING_SKIPPED if headway is None else SCORING_PENDING,
                 window_sec=window_sec,
             )
         )
+        rollup.append((observed_ts, route_id, stop_id, headway is not None))
         count += 1
 
     if count:
+        record_rollup(session, rollup)
+        notify_scores_changed(session, "collector")
         session.commit()
     return count
 
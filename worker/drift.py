@@ -1,11 +1,17 @@
-"""Drift detection utilities using ADWIN over absolute residuals."""
+"""Drift detection utilities using ADWIN over absolute residuals.
+
+``DriftMonitor`` wraps a single detector; ``DriftBank`` keeps one detector per
+(route_id, stop_id), created lazily on first residual and evicted
+least-recently-used once the bank exceeds its key budget.
+"""
 from __future__ import annotations
 
 import os
 import pickle
+from collections import OrderedDict
 from dataclasses import dataclass
 from datetime import datetime
-from typing import Optional
+from typing import Hashable, Optional
 
 from river.drift import ADWIN
 
@@ -21,7 +27,7 @@ class DriftMonitor:
 
     def update(self, value: float) -> bool:
         self.adwin.update(value)
-        if self.adwin.change_detected:
+        if self.adwin.drift_detected:
             log.warning("ADWIN change detected: width={} est={}", self.adwin.width, self.adwin.estimation)
             return True
         return False
@@ -30,6 +36,60 @@ class DriftMonitor:
         self.adwin = ADWIN()
 
 
+# Default number of per-key detectors kept in memory (~a few KB each)
+DRIFT_MAX_KEYS = 4096
+# Per-key streams are sparse, so check for change more often than ADWIN's default of 32
+DRIFT_CLOCK = 8
+
+
+class DriftBank:
+    """Per-key ADWIN detectors with lazy creation and LRU eviction of cold keys."""
+
+    def __init__(self, max_keys: int = DRIFT_MAX_KEYS, delta: float = 0.002, clock: int = DRIFT_CLOCK) -> None:
+        self.max_keys = max(1, int(max_keys))
+        self.delta = delta
+        self.clock = clock
+        self.evictions = 0
+        self._detectors: "OrderedDict[Hashable, ADWIN]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._detectors)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._detectors
+
+    def get(self, key: Hashable) -> Optional[ADWIN]:
+        return self._detectors.get(key)
+
+    def update(self, key: Hashable, value: float) -> bool:
+        """Feed |residual| for key; True when ADWIN detects a change."""
+        det = self._detectors.get(key)
+        if det is None:
+            det = ADWIN(delta=self.delta, clock=self.clock)
+            self._detectors[key] = det
+            while len(self._detectors) > self.max_keys:
+                self._detectors.popitem(last=False)
+                self.evictions += 1
+        else:
+            self._detectors.move_to_end(key)
+        det.update(abs(float(value)))
+        return bool(det.drift_detected)
+
+    def reset(self, key: Hashable) -> None:
+        self._detectors.pop(key, None)
+
+
+_bank: Optional[DriftBank] = None
+
+
+def get_drift_bank(max_keys: int = DRIFT_MAX_KEYS) -> DriftBank:
+    """Process-wide drift bank; max_keys applies on first call."""
+    global _bank
+    if _bank is None:
+        _bank = DriftBank(max_keys=max_keys)
+    return _bank
+
+
 def save_model(models_dir: str, obj: object, prefix: str = "model") -> Optional[str]:
     try:
         os.makedirs(models_dir, exist_ok=True)
@@ -16,17 +16,22 @@ from typing import Dict, Iterator, Tuple
 
 import numpy as np
 import pandas as pd
-from sqlalchemy import select
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session, sessionmaker
 
 from api.app.core.logging import get_logger
-from api.app.models import Score
+from api.app.models import SCORING_PENDING, Score
 from api.app.storage.session import get_engine
 
 
 log = get_logger(__name__)
 
 
+def _headway_expr():
+    # Pending rows written before headway_sec existed carry the headway in residual
+    return func.coalesce(Score.headway_sec, Score.residual).label("headway_sec")
+
+
 def _fetch_headways(window_sec: int) -> pd.DataFrame:
     engine = get_engine()
     SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
@@ -34,18 +39,18 @@ def _fetch_headways(window_sec: int) -> pd.DataFrame:
 
     with SessionLocal() as session:
         stmt = (
-            select(Score.route_id, Score.stop_id, Score.observed_ts, Score.residual)
+            select(Score.route_id, Score.stop_id, Score.observed_ts, _headway_expr())
             .where(Score.observed_ts >= cutoff)
-            .where(Score.anomaly_score == 0)
+            .where(Score.scoring_state == SCORING_PENDING)
         )
         rows = session.execute(stmt).all()
 
     if not rows:
         return pd.DataFrame(columns=["route_id", "stop_id", "observed_ts", "headway_sec", "hour"])
 
-    df = pd.DataFrame(rows, columns=["route_id", "stop_id", "observed_ts", "residual"])  # type: ignore[arg-type]
+    df = pd.DataFrame(rows, columns=["route_id", "stop_id", "observed_ts", "headway_sec"])  # type: ignore[arg-type]
     # Keep positive headways only
-    df["headway_sec"] = pd.to_numeric(df["residual"], errors="coerce")
+    df["headway_sec"] = pd.to_numeric(df["headway_sec"], errors="coerce")
     df = df[df["headway_sec"].notna() & (df["headway_sec"] > 0)]
     if df.empty:
         return pd.DataFrame(columns=["route_id", "stop_id", "observed_ts", "headway_sec", "hour"])
@@ -122,42 +127,32 @@ def get_features_batch(window_sec: int = 300, return_df: bool = True) -> pd.Data
     return _gen()
 
 
-def latest_batch_for_training(limit: int = 128) -> list[Dict]:
-    """
-    Query newest 'limit' rows from scores ordered by observed_ts desc, and produce feature rows:
-    {route_id, stop_id, headway_sec, hour, residual}.
-    If insufficient rows found, generate a tiny synthetic batch.
-    """
-    engine = get_engine()
-    SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+def claim_pending_batch(session: Session, limit: int = 128) -> list[Dict]:
+    """Lock and return the oldest pending rows as feature rows.
 
+    Uses ``FOR UPDATE SKIP LOCKED`` over the ``ix_scores_pending`` partial
+    index, so concurrent trainers each claim a disjoint batch. The locks are
+    held until the caller commits (after marking the rows scored/skipped).
+    Row dicts are {id, route_id, stop_id, observed_ts, headway_sec, hour,
+    residual}.
+    """
+    stmt = (
+        select(Score.id, Score.route_id, Score.stop_id, Score.observed_ts, _headway_expr())
+        .where(Score.scoring_state == SCORING_PENDING)
+        .order_by(Score.observed_ts, Score.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
     rows: list[Dict] = []
-    with SessionLocal() as session:
-        stmt = (
-            select(Score.route_id, Score.stop_id, Score.observed_ts, Score.residual)
-            .order_by(Score.observed_ts.desc())
-            .limit(limit)
-        )
-        data = session.execute(stmt).all()
-        for route_id, stop_id, ts, residual in data:
-            hour = (pd.Timestamp(ts).tz_convert("UTC") if hasattr(ts, 'tzinfo') and ts.tzinfo else pd.Timestamp(ts, tz='UTC')).hour
-            headway_sec = float(residual) if residual is not None else float('nan')
-            rows.append({
-                "route_id": route_id,
-                "stop_id": stop_id,
-                "hour": int(hour),
-                "headway_sec": headway_sec if headway_sec == headway_sec else 0.0,
-                "residual": float(residual) if residual is not None else 0.0,
-            })
-
-    if not rows:
-        # Minimal synthetic fallback
-        for i in range(min(10, limit)):
-            rows.append({
-                "route_id": f"SYN{i%3}",
-                "stop_id": f"SS{i%5}",
-                "hour": int(pd.Timestamp.utcnow().hour),
-                "headway_sec": float(300 + (i * 5) % 120),
-                "residual": 0.0,
-            })
+    for score_id, route_id, stop_id, ts, headway in session.execute(stmt).all():
+        hour = (pd.Timestamp(ts).tz_convert("UTC") if ts.tzinfo else pd.Timestamp(ts, tz="UTC")).hour
+        rows.append({
+            "id": int(score_id),
+            "route_id": route_id,
+            "stop_id": stop_id,
+            "observed_ts": ts,
+            "hour": int(hour),
+            "headway_sec": float(headway) if headway is not None else 0.0,
+            "residual": 0.0,
+        })
     return rows
@@ -4,30 +4,42 @@ Pipeline (one-shot process):
 - Regressor: StandardScaler -> PassiveAggressiveRegressor to predict headway_sec.
 - Residual: actual - predicted.
 - Anomaly score: 0.6 * normalized |residual| (MAD) + 0.4 * HalfSpaceTrees score.
+- Seasonal baseline: when a warm (route, stop, day-type, slot) baseline exists,
+  the residual is taken against its median and normalized by its MAD; scored
+  rows are folded back into the baseline store.
+- Drift: a per-(route, stop) ADWIN bank watches |residual|; a change is written
+  to drift_events and only that key's baselines are re-warmed.
 - Optionally persist model state to models_dir.
 
 Also includes continuous loop CLI, but exposes process_once(models_dir) for integration tests.
+`--backfill` re-scores the whole history instead (see backfill()), and
+`--workers N` runs N partitioned worker processes (see run_partitioned()).
 """
 from __future__ import annotations
 
 import argparse
+import multiprocessing as mp
 import os
 import pickle
+import queue
 import time
+import zlib
 from dataclasses import dataclass
-from datetime import datetime, timezone
-from typing import Optional
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Sequence, Set, Tuple
 import numpy as np
 
 from river import anomaly, linear_model, preprocessing
-from sqlalchemy import select
+from sqlalchemy import and_, func, or_, select, update
 from sqlalchemy.orm import sessionmaker
 
 from api.app.core.logging import get_logger
-from api.app.models import Score
+from api.app.models import SCORING_DONE, SCORING_PENDING, SCORING_SKIPPED, BackfillCheckpoint, Base, DriftEvent, Score, TrainerCheckpoint
+from api.app.storage.notify import notify_scores_changed
 from api.app.storage.session import get_engine
-from .drift import DriftMonitor, save_model
-from .features import latest_batch_for_training
+from .baseline import BaselineCache, BaselineStat, get_baseline_cache
+from .drift import DRIFT_MAX_KEYS, DriftBank, DriftMonitor, get_drift_bank, save_model
+from .features import claim_pending_batch
 
 
 log = get_logger(__name__)
@@ -68,81 +80,142 @@ def load_latest_bundle(models_dir: str) -> Optional[ModelBundle]:
         return None
 
 
-def _latest_score_id_for(session, route_id: str, stop_id: str, cutoff_ts: datetime) -> Optional[int]:
-    stmt = (
-        select(Score.id)
-        .where(Score.route_id == route_id, Score.stop_id == stop_id, Score.observed_ts >= cutoff_ts)
-        .order_by(Score.observed_ts.desc())
-        .limit(1)
+def _batch_mad(ys: List[float]) -> float:
+    """Median absolute deviation of a batch's headways: the score scale for cold baselines."""
+    if not ys:
+        return 1.0
+    arr = np.asarray(ys, dtype=float)
+    mad = float(np.median(np.abs(arr - float(np.median(arr)))))
+    if mad <= 0:
+        std = float(np.std(arr))
+        mad = std if std > 0 else 1.0
+    return mad
+
+
+def _write_scores(session, updates: List[Dict]) -> None:
+    """Bulk-UPDATE scored rows, stamping scored_at just before the statement.
+
+    Readers pick up newly scored rows by ``scored_at`` with a fixed overlap
+    (``OVERLAP_SEC`` in the stream, ``DELTA_OVERLAP_SEC`` for heatmap deltas),
+    so the stamp must not trail the commit by the time spent scoring; callers
+    flush everything else first and commit right after.
+    """
+    now = datetime.now(timezone.utc)
+    for u in updates:
+        u["scored_at"] = now
+    session.execute(update(Score), updates)
+
+
+def _score_row(reg, hst, base: Optional[BaselineStat], hour: int, y: float, fallback_scale: float) -> Tuple[float, float]:
+    """Predict, score and learn one headway. Returns (residual, anomaly_score)."""
+    x = {"hour": hour}
+    try:
+        y_hat = float(reg.predict_one(x) or 0.0)
+    except Exception:
+        y_hat = 0.0
+    scale = fallback_scale
+    if base is not None and base.warm and y > 0:
+        # Long-horizon expectation for this stop at this time of week
+        y_hat = base.median
+        scale = base.scale
+    residual = y - y_hat
+    # anomaly score
+    norm = min(abs(residual) / scale, 10.0) / 10.0
+    try:
+        hst_score = float(hst.score_one({"residual": residual}))
+        hst.learn_one({"residual": residual})
+    except Exception:
+        hst_score = 0.0
+    anomaly_score = 0.6 * norm + 0.4 * max(0.0, min(hst_score, 1.0))
+
+    # learn after scoring
+    try:
+        reg.learn_one(x, y)
+    except Exception:
+        pass
+    return residual, anomaly_score
+
+
+def _track_row(
+    baselines: BaselineCache,
+    bank: DriftBank,
+    route_id: str,
+    stop_id: str,
+    observed_ts: datetime,
+    y: float,
+    residual: float,
+    detected_ts: datetime,
+) -> Optional[DriftEvent]:
+    """Fold a scored headway into its baseline and drift detector; returns a DriftEvent on change."""
+    baselines.update(route_id, stop_id, observed_ts, y)
+    if not bank.update((route_id, stop_id), residual):
+        return None
+    det = bank.get((route_id, stop_id))
+    rewarmed = baselines.rewarm(route_id, stop_id)
+    log.bind(route_id=route_id, stop_id=stop_id, rewarmed=rewarmed).warning("drift detected")
+    return DriftEvent(
+        detected_ts=detected_ts,
+        route_id=route_id,
+        stop_id=stop_id,
+        width=int(det.width) if det is not None else None,
+        estimation=float(det.estimation) if det is not None else None,
     )
-    row = session.execute(stmt).first()
-    return int(row[0]) if row else None
 
 
-def process_once(models_dir: Optional[str] = None) -> int:
+def process_once(models_dir: Optional[str] = None, batch_size: int = 128) -> int:
     """
-    Train/predict on the latest small batch and write residual/anomaly_score.
-    Returns number of updated rows.
+    Claim a batch of pending rows, train/predict on it and write residual/anomaly_score.
+    Rows are claimed with FOR UPDATE SKIP LOCKED, so several trainer replicas can
+    drain the queue concurrently. Returns number of updated rows.
     """
-    batch = latest_batch_for_training(limit=128)
-    if not batch:
-        return 0
-
     # Regressor & anomaly model
     reg = preprocessing.StandardScaler() | linear_model.PARegressor()
     hst = anomaly.HalfSpaceTrees(seed=42)
 
-    # Robust MAD across batch
-    ys = [float(b.get("headway_sec", 0.0)) for b in batch]
-    if not ys:
-        return 0
-    med = float(np.median(ys))
-    mad = float(np.median(np.abs(np.array(ys, dtype=float) - med)))
-    if mad <= 0:
-        std = float(np.std(ys))
-        mad = std if std > 0 else 1.0
-
     engine = get_engine()
     SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+    baselines = get_baseline_cache()
+    bank = get_drift_bank()
     updated = 0
     with SessionLocal() as session:
-        for b in batch:
-            route_id = str(b.get("route_id", ""))
-            stop_id = str(b.get("stop_id", ""))
-            hour = int(b.get("hour", 0))
-            y = float(b.get("headway_sec", 0.0))
-            x = {"hour": hour}
-            try:
-                y_hat = float(reg.predict_one(x) or 0.0)
-            except Exception:
-                y_hat = 0.0
-            residual = y - y_hat
-            # anomaly score
-            norm = min(abs(residual) / mad, 10.0) / 10.0
-            try:
-                hst_score = float(hst.score_one({"residual": residual}))
-                hst.learn_one({"residual": residual})
-            except Exception:
-                hst_score = 0.0
-            anomaly_score = 0.6 * norm + 0.4 * max(0.0, min(hst_score, 1.0))
+        batch = claim_pending_batch(session, limit=batch_size)
+        if not batch:
+            return 0
 
-            # learn after scoring
-            try:
-                reg.learn_one(x, y)
-            except Exception:
-                pass
+        # Robust MAD across batch
+        mad = _batch_mad([float(b["headway_sec"]) for b in batch if b["headway_sec"] > 0])
 
-            # Update latest row for this (route_id, stop_id)
-            sid = _latest_score_id_for(session, route_id, stop_id, datetime.min.replace(tzinfo=timezone.utc))
-            if sid is None:
-                continue
-            obj = session.get(Score, sid)
-            if obj is None:
+        baselines.prefetch(session, [(b["route_id"], b["stop_id"]) for b in batch])
+        now = datetime.now(timezone.utc)
+        updates: List[Dict] = []
+        for b in batch:
+            route_id = str(b["route_id"])
+            stop_id = str(b["stop_id"])
+            y = float(b["headway_sec"])
+            if y <= 0:
+                # Nothing to compare against; take it off the queue
+                updates.append({"id": b["id"], "scoring_state": SCORING_SKIPPED})
                 continue
-            obj.residual = float(residual)
-            obj.anomaly_score = float(anomaly_score)
-            obj.window_sec = obj.window_sec or 300
+            observed_ts = b["observed_ts"]
+            base = baselines.get(route_id, stop_id, observed_ts)
+            residual, anomaly_score = _score_row(reg, hst, base, int(b["hour"]), y, mad)
+            updates.append(
+                {
+                    "id": b["id"],
+                    "residual": float(residual),
+                    "anomaly_score": float(anomaly_score),
+                    "scoring_state": SCORING_DONE,
+                }
+            )
             updated += 1
+            event = _track_row(baselines, bank, route_id, stop_id, observed_ts, y, residual, now)
+            if event is not None:
+                session.add(event)
+        baselines.flush(session)
+        session.flush()
+        _write_scores(session, updates)
+        if updated:
+            notify_scores_changed(session, "trainer")
         session.commit()
 
     # Best-effort model persist
@@ -156,14 +229,436 @@ def process_once(models_dir: Optional[str] = None) -> int:
     return updated
 
 
+def _new_models() -> dict:
+    """Long-lived model state for backfill and partition workers."""
+    return {
+        "reg": preprocessing.StandardScaler() | linear_model.PARegressor(),
+        "hst": anomaly.HalfSpaceTrees(seed=42),
+        "bank": DriftBank(),
+    }
+
+
+# Backfill: rows ingested before headway_sec existed only kept a model residual once scored,
+# so missing headways are rebuilt from event_ts the same way the collector derives them.
+BACKFILL_CHUNK = 5000
+
+
+def backfill(
+    name: str = "default",
+    chunk_size: int = BACKFILL_CHUNK,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+) -> int:
+    """Re-train and re-score the full `scores` history in observed_ts order.
+
+    Rows are streamed with a server-side cursor (`yield_per`) so memory stays
+    bounded by chunk_size; each chunk is written back with one bulk UPDATE,
+    baselines and drift events are flushed, and the run's checkpoint row
+    (``backfill_checkpoints``: last (observed_ts, id) plus model state) is
+    committed in the same transaction, so a rerun under the same name resumes
+    exactly after the last committed chunk and never folds a chunk into the
+    baselines twice. Run it with the live trainer stopped: both maintain the
+    same baseline rows. Returns the number of rows scored in this run.
+    """
+    chunk_size = max(1, int(chunk_size))
+    until = until or datetime.now(timezone.utc)
+    engine = get_engine()
+    SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+    with SessionLocal() as session:
+        ckpt = session.get(BackfillCheckpoint, name)
+        resume = (ckpt.observed_ts, int(ckpt.last_id), pickle.loads(ckpt.models)) if ckpt is not None else None
+    if resume is not None:
+        last_ts, last_id, models = resume
+        last_ts = last_ts if last_ts.tzinfo else last_ts.replace(tzinfo=timezone.utc)
+        log.info("resuming backfill {} after observed_ts={} id={}", name, last_ts.isoformat(), last_id)
+    else:
+        models = _new_models()
+        models["last_event"] = {}
+    reg, hst, bank = models["reg"], models["hst"], models["bank"]
+    last_event: Dict[Tuple[str, str], float] = models["last_event"]
+    baselines = BaselineCache()
+
+    stmt = (
+        select(Score.id, Score.route_id, Score.stop_id, Score.observed_ts, Score.event_ts, Score.headway_sec)
+        .where(Score.observed_ts <= until)
+        .order_by(Score.observed_ts, Score.id)
+    )
+    if since is not None:
+        stmt = stmt.where(Score.observed_ts >= since)
+    if resume is not None:
+        stmt = stmt.where(or_(Score.observed_ts > last_ts, and_(Score.observed_ts == last_ts, Score.id > last_id)))
+
+    started = time.monotonic()
+    scored_run = 0
+    rows_run = 0
+    with SessionLocal() as reader, SessionLocal() as writer:
+        result = reader.execute(stmt.execution_options(yield_per=chunk_size))
+        for part in result.partitions():
+            baselines.prefetch(writer, {(r.route_id, r.stop_id) for r in part})
+            updates: List[Dict] = []
+            events: List[DriftEvent] = []
+            # Headways first, so cold baselines are scaled by the chunk's MAD as in live scoring
+            todo: List[Tuple[int, str, str, datetime, float]] = []
+            for sid, route_id, stop_id, observed_ts, event_ts, headway in part:
+                if observed_ts.tzinfo is None:
+                    observed_ts = observed_ts.replace(tzinfo=timezone.utc)
+                if event_ts is None:
+                    continue
+                arr = event_ts.replace(tzinfo=timezone.utc).timestamp() if event_ts.tzinfo is None else event_ts.timestamp()
+                key = (route_id, stop_id)
+                prev = last_event.get(key)
+                last_event[key] = arr
+                if headway is not None and headway > 0:
+                    todo.append((sid, route_id, stop_id, observed_ts, float(headway)))
+                elif prev is not None and arr > prev:
+                    todo.append((sid, route_id, stop_id, observed_ts, float(arr - prev)))
+            mad = _batch_mad([t[4] for t in todo])
+            for sid, route_id, stop_id, observed_ts, y in todo:
+                base = baselines.get(route_id, stop_id, observed_ts)
+                residual, anomaly_score = _score_row(reg, hst, base, observed_ts.astimezone(timezone.utc).hour, y, mad)
+                updates.append(
+                    {
+                        "id": sid,
+                        "residual": float(residual),
+                        "anomaly_score": float(anomaly_score),
+                        "scoring_state": SCORING_DONE,
+                    }
+                )
+                event = _track_row(baselines, bank, route_id, stop_id, observed_ts, y, residual, observed_ts)
+                if event is not None:
+                    events.append(event)
+            if events:
+                writer.add_all(events)
+            baselines.flush(writer)
+
+            last = part[-1]
+            last_ts = last.observed_ts if last.observed_ts.tzinfo else last.observed_ts.replace(tzinfo=timezone.utc)
+            ckpt = writer.get(BackfillCheckpoint, name)
+            if ckpt is None:
+                ckpt = BackfillCheckpoint(name=name, rows=0, scored=0)
+                writer.add(ckpt)
+            ckpt.observed_ts = last_ts
+            ckpt.last_id = int(last.id)
+            ckpt.rows = int(ckpt.rows) + len(part)
+            ckpt.scored = int(ckpt.scored) + len(updates)
+            ckpt.models = pickle.dumps(models)
+            writer.flush()
+            if updates:
+                _write_scores(writer, updates)
+                notify_scores_changed(writer, "backfill")
+            writer.commit()
+
+            rows_run += len(part)
+            scored_run += len(updates)
+            elapsed = max(time.monotonic() - started, 1e-9)
+            log.bind(rows=ckpt.rows, scored=ckpt.scored, observed_ts=last_ts.isoformat()).info(
+                "backfill progress: {:.0f} rows/s", rows_run / elapsed
+            )
+
+    elapsed = max(time.monotonic() - started, 1e-9)
+    log.info("backfill done: {} rows read, {} scored in {:.1f}s ({:.0f} rows/s)", rows_run, scored_run, elapsed, rows_run / elapsed)
+    return scored_run
+
+
+# Partitioned mode: a coordinator hands out (lo, hi] scores.id ranges; each worker process
+# scores only the routes that hash to its partition, so every (route, stop) key and its
+# baselines/drift state live in exactly one process.
+PARTITION_MAX_RANGE = 20000
+# Only hand out ids older than this, so rows from transactions still in flight are not skipped
+PARTITION_SETTLE_SEC = 5
+# Ranges a partition may have queued before the coordinator stops handing out new ones,
+# so a slow route does not pace every other partition range by range
+PARTITION_MAX_INFLIGHT = 4
+# Rows at or below a handed-out range that are still pending (committed after the settle
+# delay) are swept into later tasks while they are this recent
+PARTITION_SWEEP_SEC = 3600
+
+
+def partition_for(route_id: str, partitions: int) -> int:
+    """Stable partition of a route (crc32, identical across processes and restarts)."""
+    return zlib.crc32(route_id.encode("utf-8")) % max(1, int(partitions))
+
+
+def _partition_dir(models_dir: str, partition: int, partitions: int) -> str:
+    return os.path.join(models_dir, f"part-{partition}-of-{partitions}")
+
+
+def _load_partition_models(path: str) -> dict:
+    try:
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    except FileNotFoundError:
+        return _new_models()
+    except Exception as e:
+        log.warning("failed to load partition models, starting fresh: {}", repr(e))
+        return _new_models()
+
+
+def _save_partition_models(path: str, models: dict) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        pickle.dump(models, f)
+    os.replace(tmp, path)
+
+
+def score_partition_range(
+    session,
+    models: dict,
+    baselines: BaselineCache,
+    partition: int,
+    partitions: int,
+    lo: int,
+    hi: int,
+    routes: List[str],
+    stray_ids: Sequence[int] = (),
+) -> int:
+    """Score pending rows with lo < id <= hi for the given routes, plus stray_ids, and advance the checkpoint.
+
+    Score updates, drift events, baselines and the partition checkpoint are
+    committed in one transaction, so a range is never scored twice. stray_ids
+    are rows below earlier ranges that committed after those were handed out;
+    only the ones still pending are scored.
+    """
+    ckpt = session.get(TrainerCheckpoint, (partition, partitions))
+    if ckpt is None:
+        ckpt = TrainerCheckpoint(partition=partition, partitions=partitions, last_id=lo)
+        session.add(ckpt)
+    lo = max(lo, int(ckpt.last_id))
+    if hi <= lo and not stray_ids:
+        return 0
+    wanted = []
+    if routes and hi > lo:
+        wanted.append(and_(Score.id > lo, Score.id <= hi, Score.route_id.in_(routes)))
+    if stray_ids:
+        wanted.append(Score.id.in_(sorted(stray_ids)))
+    rows = []
+    if wanted:
+        stmt = (
+            select(Score.id, Score.route_id, Score.stop_id, Score.observed_ts, func.coalesce(Score.headway_sec, Score.residual))
+            .where(or_(*wanted), Score.scoring_state == SCORING_PENDING)
+            .order_by(Score.id)
+        )
+        rows = session.execute(stmt).all()
+
+    reg, hst, bank = models["reg"], models["hst"], models["bank"]
+    fallback = _batch_mad([float(r[4]) for r in rows if r[4] is not None and r[4] > 0])
+    baselines.prefetch(session, {(r.route_id, r.stop_id) for r in rows})
+    updates: List[Dict] = []
+    scored = 0
+    now = datetime.now(timezone.utc)
+    for sid, route_id, stop_id, observed_ts, headway in rows:
+        if observed_ts.tzinfo is None:
+            observed_ts = observed_ts.replace(tzinfo=timezone.utc)
+        y = float(headway) if headway is not None else 0.0
+        if y <= 0:
+            updates.append({"id": sid, "scoring_state": SCORING_SKIPPED})
+            continue
+        base = baselines.get(route_id, stop_id, observed_ts)
+        residual, anomaly_score = _score_row(reg, hst, base, observed_ts.astimezone(timezone.utc).hour, y, fallback)
+        updates.append(
+            {
+                "id": sid,
+                "residual": float(residual),
+                "anomaly_score": float(anomaly_score),
+                "scoring_state": SCORING_DONE,
+            }
+        )
+        scored += 1
+        event = _track_row(baselines, bank, route_id, stop_id, observed_ts, y, residual, now)
+        if event is not None:
+            session.add(event)
+    baselines.flush(session)
+    ckpt.last_id = max(hi, int(ckpt.last_id))
+    ckpt.updated_ts = now
+    session.flush()
+    if updates:
+        _write_scores(session, updates)
+    if scored:
+        notify_scores_changed(session, "trainer")
+    session.commit()
+    return scored
+
+
+def _partition_worker(partition: int, partitions: int, models_dir: str, tasks, done) -> None:
+    models_path = os.path.join(_partition_dir(models_dir, partition, partitions), "models.pkl")
+    models = _load_partition_models(models_path)
+    baselines = BaselineCache()
+    SessionLocal = sessionmaker(bind=get_engine(), autoflush=False, autocommit=False, future=True)
+    plog = log.bind(partition=partition, partitions=partitions)
+    plog.info("partition worker started")
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        seq, lo, hi, routes, stray_ids = task
+        with SessionLocal() as session:
+            scored = score_partition_range(session, models, baselines, partition, partitions, lo, hi, routes, stray_ids)
+        if scored:
+            _save_partition_models(models_path, models)
+        done.put((partition, seq, scored))
+    plog.info("partition worker stopped")
+
+
+def _partition_start_id(session, partitions: int) -> int:
+    """Resume from the slowest partition's checkpoint, else just before the oldest recent pending row."""
+    last = session.execute(
+        select(func.min(TrainerCheckpoint.last_id)).where(TrainerCheckpoint.partitions == partitions)
+    ).scalar()
+    if last is not None:
+        return int(last)
+    recent = datetime.now(timezone.utc) - timedelta(hours=1)
+    first_pending = session.execute(
+        select(func.min(Score.id)).where(Score.observed_ts >= recent, Score.scoring_state == SCORING_PENDING)
+    ).scalar()
+    if first_pending is not None:
+        return int(first_pending) - 1
+    return int(session.execute(select(func.max(Score.id))).scalar() or 0)
+
+
+def sweep_stragglers(session, upto: int, partitions: int, skip: Set[int]) -> Dict[int, List[int]]:
+    """Still-pending rows with id <= upto, by partition: they committed after their range was scored."""
+    since = datetime.now(timezone.utc) - timedelta(seconds=PARTITION_SWEEP_SEC)
+    rows = session.execute(
+        select(Score.id, Score.route_id)
+        .where(Score.scoring_state == SCORING_PENDING, Score.observed_ts >= since, Score.id <= upto)
+        .order_by(Score.id)
+        .limit(PARTITION_MAX_RANGE)
+    ).all()
+    out: Dict[int, List[int]] = {i: [] for i in range(partitions)}
+    for sid, route_id in rows:
+        if sid not in skip and route_id:
+            out[partition_for(route_id, partitions)].append(int(sid))
+    return out
+
+
+def run_partitioned(partitions: int, models_dir: str, tick: int = 30) -> None:
+    """Coordinator: hand out id ranges to `partitions` worker processes until interrupted.
+
+    Each partition may have up to PARTITION_MAX_INFLIGHT tasks queued, so fast
+    partitions keep going while a slow one works through its backlog.
+    """
+    ctx = mp.get_context("spawn")
+    done = ctx.Queue()
+    tasks = [ctx.Queue() for _ in range(partitions)]
+    procs = [
+        ctx.Process(target=_partition_worker, args=(i, partitions, models_dir, tasks[i], done), daemon=True)
+        for i in range(partitions)
+    ]
+    for p in procs:
+        p.start()
+
+    SessionLocal = sessionmaker(bind=get_engine(), autoflush=False, autocommit=False, future=True)
+    with SessionLocal() as session:
+        watermark = _partition_start_id(session, partitions)
+    seq = 0
+    # Tasks put on / acknowledged by each partition's queue (a partition works through its queue in order)
+    sent = {i: 0 for i in range(partitions)}
+    acked = {i: 0 for i in range(partitions)}
+    # Highest range end each partition has acknowledged
+    acked_hi = {i: watermark for i in range(partitions)}
+    task_hi: Dict[int, int] = {}
+    # Stray id -> (partition, sent count once the task carrying it was queued), until acknowledged
+    strays: Dict[int, Tuple[int, int]] = {}
+    scored = 0
+    started = time.monotonic()
+    log.info("partitioned trainer starting: partitions={} watermark={}", partitions, watermark)
+    try:
+        while True:
+            if not all(p.is_alive() for p in procs):
+                raise RuntimeError("partition worker exited")
+            handed = False
+            if max(sent[i] - acked[i] for i in range(partitions)) < PARTITION_MAX_INFLIGHT:
+                settle = datetime.now(timezone.utc) - timedelta(seconds=PARTITION_SETTLE_SEC)
+                with SessionLocal() as session:
+                    newest = session.execute(
+                        select(func.max(Score.id)).where(Score.id > watermark, Score.observed_ts <= settle)
+                    ).scalar()
+                    hi = min(int(newest), watermark + PARTITION_MAX_RANGE) if newest is not None else watermark
+                    routes: List[str] = []
+                    if hi > watermark:
+                        routes = [
+                            r for (r,) in session.execute(
+                                select(Score.route_id).where(Score.id > watermark, Score.id <= hi).distinct()
+                            ).all() if r
+                        ]
+                    for sid in [sid for sid, (i, n) in strays.items() if acked[i] >= n]:
+                        del strays[sid]
+                    swept = sweep_stragglers(session, min(acked_hi.values()), partitions, set(strays))
+                assigned: Dict[int, List[str]] = {i: [] for i in range(partitions)}
+                for r in routes:
+                    assigned[partition_for(r, partitions)].append(r)
+                for i in range(partitions):
+                    # Every partition gets each new range (to advance its checkpoint); stray-only tasks go where needed
+                    if hi > watermark or swept[i]:
+                        seq += 1
+                        tasks[i].put((seq, watermark, hi, assigned[i], swept[i]))
+                        sent[i] += 1
+                        task_hi[seq] = hi
+                        strays.update((sid, (i, sent[i])) for sid in swept[i])
+                        handed = True
+                watermark = hi
+
+            busy = any(sent[i] > acked[i] for i in range(partitions))
+            try:
+                partition, n_seq, n = done.get(timeout=0.01 if handed else 1.0 if busy else max(1, int(tick)))
+            except queue.Empty:
+                continue
+            acked[partition] += 1
+            acked_hi[partition] = max(acked_hi[partition], task_hi.pop(n_seq, watermark))
+            scored += n
+            if all(acked[i] >= sent[i] for i in range(partitions)):
+                if scored:
+                    elapsed = max(time.monotonic() - started, 1e-9)
+                    log.bind(watermark=watermark, scored=scored).info("partitions caught up: {:.0f} rows/s", scored / elapsed)
+                scored, started = 0, time.monotonic()
+    finally:
+        for q in tasks:
+            q.put(None)
+        for p in procs:
+            p.join(timeout=10)
+
+
+def _parse_cli_ts(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
 def main(argv: Optional[list[str]] = None) -> None:
     parser = argparse.ArgumentParser(description="Online anomaly learner for headways")
     parser.add_argument("--tick", type=int, default=30, help="Seconds between batches")
     parser.add_argument("--window", type=int, default=300, help="Window seconds to fetch features")
     parser.add_argument("--models-dir", type=str, default="/data/gtfs/models", help="Directory to store rotated models")
+    parser.add_argument("--drift-max-keys", type=int, default=DRIFT_MAX_KEYS, help="Per-key drift detectors kept in memory")
+    parser.add_argument("--backfill", action="store_true", help="Re-score the full history once and exit")
+    parser.add_argument("--chunk-size", type=int, default=BACKFILL_CHUNK, help="Rows per backfill chunk")
+    parser.add_argument("--checkpoint", type=str, default="default", help="Backfill checkpoint name; reruns resume it")
+    parser.add_argument("--since", type=str, default=None, help="Backfill start (ISO timestamp)")
+    parser.add_argument("--until", type=str, default=None, help="Backfill end (ISO timestamp, default now)")
+    parser.add_argument("--workers", type=int, default=1, help="Trainer processes, each owning a route hash partition")
     args = parser.parse_args(argv)
+    get_drift_bank(max_keys=args.drift_max_keys)
 
     os.makedirs(args.models_dir, exist_ok=True)
+    try:
+        Base.metadata.create_all(bind=get_engine())
+    except Exception as e:
+        log.warning("could not ensure tables: {}", repr(e))
+
+    if args.backfill:
+        backfill(
+            name=args.checkpoint,
+            chunk_size=args.chunk_size,
+            since=_parse_cli_ts(args.since),
+            until=_parse_cli_ts(args.until),
+        )
+        return
+
+    if args.workers > 1:
+        run_partitioned(args.workers, args.models_dir, tick=args.tick)
+        return
 
     log.info("ml_online starting: tick={}s window={}s", args.tick, args.window)
     while True: